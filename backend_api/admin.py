@@ -7,6 +7,8 @@ from backend_api.database import get_db, User, SessionToken, PasswordResetToken,
 from pydantic import BaseModel
 from backend_api.schemas import UserInDB, UserCreate
 from backend_api.auth import get_current_user, has_role, get_password_hash, UserRole
+from backend_api.ip_blacklist import BLACKLIST_CHANNEL
+from backend_api.message_bus import publish_message
 
 class BlacklistRequest(BaseModel):
     ip_address: str
@@ -30,6 +32,7 @@ async def add_to_blacklist(
     )
     db.add(new_blacklisted_ip)
     db.commit()
+    publish_message(BLACKLIST_CHANNEL, {"action": "add", "ip_address": blacklist_request.ip_address})
     return {"message": f"IP address {blacklist_request.ip_address} has been blacklisted"}
 
 @router.post("/admin/blacklist/remove")
@@ -44,6 +47,7 @@ async def remove_from_blacklist(
 
     db.delete(blacklisted_ip)
     db.commit()
+    publish_message(BLACKLIST_CHANNEL, {"action": "remove", "ip_address": blacklist_request.ip_address})
     return {"message": f"IP address {blacklist_request.ip_address} has been removed from the blacklist"}
 
 @router.get("/admin/users", response_model=List[UserInDB])
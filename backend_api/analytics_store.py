@@ -0,0 +1,241 @@
+"""
+Append-only columnar store of analyzed attack events, for analytics that would
+be too slow as GROUP BY queries on the OLTP database.
+
+The analyzer appends every committed result to an AttackEventWriter, which
+buffers rows and writes them as Parquet files partitioned by hour:
+
+    ANALYTICS_STORE_DIR/date=2024-05-01/hour=13/part-<pid>-<uuid>.parquet
+
+Timestamps are naive UTC, like AttackLog.timestamp: the collector stamps logs
+with utcnow() and the query windows are computed with utcnow().
+
+Each flush adds a new file, so writers in several analyzer processes never
+touch each other's files. Files are written under a temporary name and renamed,
+so readers only ever see complete files. AnalyticsStore queries the directory
+with DuckDB, which reads only the hour partitions in the requested time range
+and only the columns a query uses. The directory has to be shared between the
+analyzer and the gateway (a volume in Docker).
+
+pyarrow and duckdb are listed in backend_api/requirements.txt; a service
+installed without them still runs, but the writer is a no-op and
+AnalyticsStore.available is False.
+
+    python -m backend_api.analytics_store compact --before-hours 2
+        Merges the files of each closed hour into one file.
+"""
+import argparse
+import glob
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # The analytics store is optional
+    pa = pq = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+ANALYTICS_STORE_DIR = os.getenv("ANALYTICS_STORE_DIR", "./analytics_store")
+ANALYTICS_FLUSH_ROWS = int(os.getenv("ANALYTICS_FLUSH_ROWS", "5000"))
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "10")) # seconds
+ANALYTICS_AVAILABLE_RECHECK = float(os.getenv("ANALYTICS_AVAILABLE_RECHECK", "30")) # seconds between looks at an empty store
+
+COLUMNS = ["id", "timestamp", "ip", "port", "attack_type", "confidence_score", "is_anomaly", "anomaly_score"]
+
+
+def _schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("timestamp", pa.timestamp("us")),
+        ("ip", pa.string()),
+        ("port", pa.int32()),
+        ("attack_type", pa.string()),
+        ("confidence_score", pa.float64()),
+        ("is_anomaly", pa.bool_()),
+        ("anomaly_score", pa.float64()),
+    ])
+
+
+def _parse_timestamp(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.utcnow()
+
+
+def _partition_dir(root: str, hour: datetime) -> str:
+    return os.path.join(root, f"date={hour:%Y-%m-%d}", f"hour={hour:%H}")
+
+
+def _write_parquet(table, directory: str, prefix: str = "part") -> str:
+    os.makedirs(directory, exist_ok=True)
+    name = f"{prefix}-{os.getpid()}-{uuid.uuid4().hex}.parquet"
+    tmp_path = os.path.join(directory, f".{name}.tmp") # hidden from the *.parquet glob
+    pq.write_table(table, tmp_path, compression="zstd")
+    path = os.path.join(directory, name)
+    os.replace(tmp_path, path)
+    return path
+
+
+class AttackEventWriter:
+    """Buffers analyzed attack events and flushes them to hourly Parquet partitions."""
+
+    def __init__(self, root: str = ANALYTICS_STORE_DIR, flush_rows: int = ANALYTICS_FLUSH_ROWS,
+                 flush_interval: float = ANALYTICS_FLUSH_INTERVAL):
+        self.root = root
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.enabled = pa is not None
+        self._rows = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def append(self, results: list[dict]):
+        """Adds analyzer results (dicts with at least the COLUMNS keys) and flushes if due."""
+        if not self.enabled or not results:
+            return
+        with self._lock:
+            for result in results:
+                row = {column: result.get(column) for column in COLUMNS}
+                row["timestamp"] = _parse_timestamp(row["timestamp"])
+                self._rows.append(row)
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if len(self._rows) >= self.flush_rows or (self._rows and time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self) -> list[str]:
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._last_flush = time.monotonic()
+        if not rows:
+            return []
+        by_hour = {}
+        for row in rows:
+            by_hour.setdefault(row["timestamp"].replace(minute=0, second=0, microsecond=0), []).append(row)
+        paths = []
+        try:
+            for hour, hour_rows in by_hour.items():
+                table = pa.Table.from_pylist(hour_rows, schema=_schema())
+                paths.append(_write_parquet(table, _partition_dir(self.root, hour)))
+        except Exception as e:
+            print(f" [Analyzer] Error writing {len(rows)} events to the analytics store: {e}")
+        return paths
+
+
+class AnalyticsStore:
+    """Read side of the store: aggregate queries over the Parquet files."""
+
+    def __init__(self, root: str = ANALYTICS_STORE_DIR, recheck_interval: float = ANALYTICS_AVAILABLE_RECHECK):
+        self.root = root
+        self.recheck_interval = recheck_interval
+        self._available = False
+        self._checked_at = None
+
+    @property
+    def available(self) -> bool:
+        """Whether there is any data to query. Files are only ever added or merged, so once true it stays true."""
+        if self._available or duckdb is None:
+            return self._available
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.recheck_interval:
+            self._checked_at = now
+            # Stops at the first file instead of listing every partition
+            self._available = next(glob.iglob(os.path.join(self.root, "date=*", "hour=*", "*.parquet")), None) is not None
+        return self._available
+
+    def _query(self, sql: str, since: datetime, until: datetime, params: list = ()):
+        # The date/hour predicates only touch partition columns, so DuckDB skips
+        # every directory outside the range without opening its files.
+        source = f"read_parquet('{os.path.join(self.root, '*', '*', '*.parquet')}', hive_partitioning = true, hive_types_autocast = false)"
+        where = (
+            "date BETWEEN ? AND ? "
+            "AND (date || ' ' || hour) BETWEEN ? AND ? "
+            "AND timestamp >= ? AND timestamp < ?"
+        )
+        range_params = [
+            f"{since:%Y-%m-%d}", f"{until:%Y-%m-%d}",
+            f"{since:%Y-%m-%d %H}", f"{until:%Y-%m-%d %H}",
+            since, until,
+        ]
+        connection = duckdb.connect()
+        try:
+            return connection.execute(sql.format(source=source, where=where), range_params + list(params)).fetchall()
+        finally:
+            connection.close()
+
+    def threat_summary(self, since: datetime, until: datetime, top_n: int = 10) -> dict:
+        totals = self._query(
+            "SELECT count(*), count(*) FILTER (WHERE is_anomaly), avg(confidence_score), count(DISTINCT ip) "
+            "FROM {source} WHERE {where}", since, until,
+        )[0]
+        top_ips = self._query(
+            "SELECT ip, count(*) AS attacks FROM {source} WHERE {where} GROUP BY ip ORDER BY attacks DESC, ip LIMIT ?",
+            since, until, [top_n],
+        )
+        attack_types = self._query(
+            "SELECT attack_type, count(*) AS attacks FROM {source} WHERE {where} GROUP BY attack_type ORDER BY attacks DESC",
+            since, until,
+        )
+        return {
+            "total_attacks": totals[0],
+            "anomalies": totals[1],
+            "average_confidence": round(totals[2], 4) if totals[2] is not None else None,
+            "unique_ips": totals[3],
+            "top_ips": [{"ip": ip, "attacks": attacks} for ip, attacks in top_ips],
+            "attack_types": {attack_type: attacks for attack_type, attacks in attack_types},
+        }
+
+    def hourly_trend(self, since: datetime, until: datetime) -> list[dict]:
+        rows = self._query(
+            "SELECT date_trunc('hour', timestamp) AS bucket, count(*), count(*) FILTER (WHERE is_anomaly) "
+            "FROM {source} WHERE {where} GROUP BY bucket ORDER BY bucket", since, until,
+        )
+        return [{"hour": bucket.isoformat(), "attacks": attacks, "anomalies": anomalies} for bucket, attacks, anomalies in rows]
+
+
+def compact(root: str = ANALYTICS_STORE_DIR, before: Optional[datetime] = None) -> int:
+    """Merges the files of every hour partition older than `before` into one file. Returns partitions compacted."""
+    before = before or datetime.utcnow() - timedelta(hours=2)
+    compacted = 0
+    for directory in sorted(glob.glob(os.path.join(root, "date=*", "hour=*"))):
+        date = os.path.basename(os.path.dirname(directory))[len("date="):]
+        hour = os.path.basename(directory)[len("hour="):]
+        if datetime.strptime(f"{date} {hour}", "%Y-%m-%d %H") + timedelta(hours=1) > before:
+            continue
+        files = sorted(glob.glob(os.path.join(directory, "*.parquet")))
+        if len(files) < 2:
+            continue
+        table = pa.concat_tables([pq.read_table(path, schema=_schema()) for path in files])
+        _write_parquet(table, directory, prefix="compacted")
+        for path in files:
+            os.remove(path)
+        compacted += 1
+    return compacted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the attack analytics store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="Merge the files of closed hour partitions")
+    compact_parser.add_argument("--root", default=ANALYTICS_STORE_DIR)
+    compact_parser.add_argument("--before-hours", type=float, default=2, help="Only compact hours older than this")
+    args = parser.parse_args()
+    count = compact(args.root, datetime.utcnow() - timedelta(hours=args.before_hours))
+    print(f"Compacted {count} hour partitions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import os
+import queue
+import threading
+from typing import Callable, Optional
+
+import httpx
+
+from backend_api.database import get_db, AttackLog
+from backend_api.ttl_cache import TTLCache
+
+ABUSEIPDB_API_KEY = os.getenv("ABUSEIPDB_API_KEY")
+API_GATEWAY_URL = "http://api_gateway:8000"
+ABUSEIPDB_WORKERS = int(os.getenv("ABUSEIPDB_WORKERS", "4"))
+ABUSEIPDB_QUEUE_SIZE = int(os.getenv("ABUSEIPDB_QUEUE_SIZE", "10000")) # distinct IPs waiting for a check
+# Reports cover the last 90 days (maxAgeInDays=90), so a verdict stays meaningful for hours
+ABUSEIPDB_VERDICT_TTL = int(os.getenv("ABUSEIPDB_VERDICT_TTL", "86400")) # seconds
+ABUSEIPDB_THRESHOLD = 50 # abuseConfidenceScore above which an IP is a verified threat
+
+
+def fetch_abuse_confidence(ip_address: str) -> int:
+    url = f"https://api.abuseipdb.com/api/v2/check?ipAddress={ip_address}&maxAgeInDays=90"
+    headers = {
+        'Accept': 'application/json',
+        'Key': ABUSEIPDB_API_KEY
+    }
+    response = httpx.get(url, headers=headers, timeout=5)
+    response.raise_for_status()
+    return response.json()['data']['abuseConfidenceScore']
+
+
+def apply_verdict(ip_address: str, log_ids: list[int], is_verified_threat: bool, alert: bool):
+    """Marks every pending log of the IP in one UPDATE and alerts the gateway once per fresh verdict."""
+    db = next(get_db())
+    try:
+        db.query(AttackLog).filter(AttackLog.id.in_(log_ids)).update(
+            {"is_verified_threat": is_verified_threat}, synchronize_session=False
+        )
+        db.commit()
+        print(f" [Analyzer] Updated {len(log_ids)} AttackLog entries from {ip_address} with AbuseIPDB verification status.")
+    except Exception as e:
+        db.rollback()
+        print(f" [Analyzer] Error updating AbuseIPDB status for {ip_address}: {e}")
+        return
+    finally:
+        db.close()
+
+    if alert and is_verified_threat:
+        try:
+            httpx.post(f"{API_GATEWAY_URL}/alerts/threat_verified", json={
+                "log_id": log_ids[0],
+                "ip": ip_address,
+                "message": f"Verified threat detected from IP: {ip_address}"
+            })
+        except httpx.RequestError as e:
+            print(f" [Analyzer] Failed to send verified threat alert to API Gateway: {e}")
+
+
+class AbuseIPDBVerifier:
+    """
+    Checks attacking IPs against AbuseIPDB with a fixed pool of worker threads.
+
+    Submissions are deduplicated by IP: while an IP is waiting, further log IDs
+    are attached to its pending entry instead of queueing another check. Verdicts
+    are cached for `verdict_ttl`, so a flood from one scanner costs one API call,
+    and each batch of pending logs is written with a single UPDATE.
+    """
+
+    def __init__(self, checker: Callable[[str], int] = fetch_abuse_confidence,
+                 apply: Callable[[str, list, bool, bool], None] = apply_verdict,
+                 workers: int = ABUSEIPDB_WORKERS, queue_size: int = ABUSEIPDB_QUEUE_SIZE,
+                 verdict_ttl: int = ABUSEIPDB_VERDICT_TTL, threshold: int = ABUSEIPDB_THRESHOLD,
+                 enabled: Optional[bool] = None):
+        self.checker = checker
+        self.apply = apply
+        self.workers = workers
+        self.threshold = threshold
+        self.enabled = bool(ABUSEIPDB_API_KEY) if enabled is None else enabled
+        if not self.enabled:
+            print(" [Analyzer] ABUSEIPDB_API_KEY not set. Skipping AbuseIPDB checks.")
+        self.verdicts = TTLCache(100000, verdict_ttl)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = {} # ip -> log IDs waiting for a verdict
+        self._lock = threading.Lock()
+        self._threads = []
+        self.api_calls = 0
+        self.dropped = 0
+
+    def _ensure_workers(self):
+        # Started lazily so forked analyzer workers each get their own threads
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"abuseipdb-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, ip_address: str, log_id: int):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._ensure_workers()
+            log_ids = self._pending.get(ip_address)
+            if log_ids is not None:
+                log_ids.append(log_id)
+                return
+            try:
+                self._queue.put_nowait(ip_address)
+            except queue.Full:
+                self.dropped += 1
+                print(f" [Analyzer] AbuseIPDB queue full, skipping verification of log {log_id} from {ip_address}")
+                return
+            self._pending[ip_address] = [log_id]
+
+    def join(self):
+        """Blocks until every queued IP has been processed."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            ip_address = self._queue.get()
+            try:
+                self._process(ip_address)
+            except Exception as e:
+                print(f" [Analyzer] Unexpected error during AbuseIPDB check for {ip_address}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _process(self, ip_address: str):
+        try:
+            verdict = self.verdicts.get(ip_address, None)
+            fresh = verdict is None
+            if fresh:
+                try:
+                    self.api_calls += 1
+                    score = self.checker(ip_address)
+                except httpx.HTTPError as e:
+                    print(f" [Analyzer] Error checking AbuseIPDB for {ip_address}: {e}")
+                    return
+                verdict = score > self.threshold
+                if verdict:
+                    print(f" [Analyzer] IP {ip_address} is a verified threat (AbuseIPDB score: {score})")
+                self.verdicts.set(ip_address, verdict)
+        finally:
+            # Take the log IDs only now, so logs that arrived during the API call
+            # are included in the same UPDATE. Always taken, even when the check
+            # failed, or later submissions for the IP would never be queued again.
+            with self._lock:
+                log_ids = self._pending.pop(ip_address, [])
+        if log_ids:
+            self.apply(ip_address, log_ids, verdict, fresh)
+
+
+abuseipdb_verifier = AbuseIPDBVerifier()
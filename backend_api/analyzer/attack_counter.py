@@ -0,0 +1,129 @@
+import os
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+import redis
+
+from backend_api.ttl_cache import TTLCache
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REPEATED_ATTACK_THRESHOLD = int(os.getenv("REPEATED_ATTACK_THRESHOLD", "3")) # attacks per window that trigger a blacklist
+REPEATED_ATTACK_CLEAR_THRESHOLD = int(os.getenv("REPEATED_ATTACK_CLEAR_THRESHOLD", "0")) # an IP re-arms once its count falls to this
+REPEATED_ATTACK_WINDOW = int(os.getenv("REPEATED_ATTACK_WINDOW", "300")) # seconds
+LOCAL_COUNTER_IPS = 100000
+
+
+class _SecondBuckets:
+    """Per-second attack counts of one IP over the last `window` seconds."""
+
+    def __init__(self):
+        self.buckets = deque() # [second, count], oldest first
+        self.total = 0
+        self.flagged = False
+
+    def prune(self, second: int, window: int) -> int:
+        while self.buckets and self.buckets[0][0] <= second - window:
+            self.total -= self.buckets.popleft()[1]
+        return self.total
+
+    def add(self, second: int, count: int) -> int:
+        if self.buckets and self.buckets[-1][0] == second:
+            self.buckets[-1][1] += count
+        else:
+            self.buckets.append([second, count])
+        self.total += count
+        return self.total
+
+
+class AttackCounter:
+    """
+    Sliding-window attack counts per IP, replacing the per-event COUNT(*) over
+    attack_logs.
+
+    With Redis, each IP has a sorted set of log IDs scored by arrival time,
+    shared by all analyzer workers. Without Redis, each worker counts in a ring
+    of per-second buckets.
+
+    record() returns the IPs that just crossed `threshold`. An IP then stays
+    flagged, and produces no further decisions, until its count drops to
+    `clear_threshold` (hysteresis). In Redis the flag is a SET NX key, so
+    concurrent workers emit a single decision per IP per window.
+    """
+
+    def __init__(self, redis_client=None, threshold: int = REPEATED_ATTACK_THRESHOLD,
+                 clear_threshold: int = REPEATED_ATTACK_CLEAR_THRESHOLD, window: int = REPEATED_ATTACK_WINDOW):
+        self.redis_client = redis_client
+        self.threshold = threshold
+        self.clear_threshold = min(clear_threshold, threshold - 1)
+        self.window = window
+        self._local = TTLCache(LOCAL_COUNTER_IPS, ttl=window)
+
+    def record(self, events: Iterable[tuple[str, int]], now: Optional[float] = None) -> list[str]:
+        """Counts (ip, log_id) events. Returns the IPs that should be blacklisted now."""
+        now = time.time() if now is None else now
+        counts = {}
+        for ip, log_id in events:
+            if ip:
+                counts.setdefault(ip, []).append(log_id)
+        if not counts:
+            return []
+        if self.redis_client is not None:
+            try:
+                return self._record_redis(counts, now)
+            except redis.RedisError as e:
+                print(f" [Analyzer] Attack counter Redis unavailable, counting locally: {e}")
+        return self._record_local(counts, now)
+
+    def unflag(self, ip: str):
+        """Re-arms an IP whose decision could not be carried out, so its next event decides again."""
+        if self.redis_client is not None:
+            try:
+                self.redis_client.delete(f"attacks:flagged:{ip}")
+            except redis.RedisError as e:
+                print(f" [Analyzer] Attack counter Redis unavailable, could not re-arm {ip}: {e}")
+        buckets = self._local.get(ip, None)
+        if buckets is not None:
+            buckets.flagged = False
+
+    def _record_redis(self, counts: dict, now: float) -> list[str]:
+        ips = list(counts)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for ip in ips:
+            key = f"attacks:{ip}"
+            # Log IDs as members make redelivered messages count once
+            pipe.zadd(key, {str(log_id): now for log_id in counts[ip]})
+            pipe.zremrangebyscore(key, "-inf", now - self.window)
+            pipe.zcard(key)
+            pipe.expire(key, self.window)
+        replies = pipe.execute()
+        totals = {ip: replies[i * 4 + 2] for i, ip in enumerate(ips)}
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        crossing = [ip for ip in ips if totals[ip] >= self.threshold]
+        for ip in crossing:
+            pipe.set(f"attacks:flagged:{ip}", 1, nx=True, ex=self.window)
+        for ip in ips:
+            if totals[ip] - len(counts[ip]) > self.clear_threshold:
+                # Keep flagged IPs flagged while they are still active
+                pipe.expire(f"attacks:flagged:{ip}", self.window)
+        replies = pipe.execute()
+        return [ip for ip, created in zip(crossing, replies) if created]
+
+    def _record_local(self, counts: dict, now: float) -> list[str]:
+        decisions = []
+        second = int(now)
+        for ip, log_ids in counts.items():
+            buckets = self._local.get(ip, None) or _SecondBuckets()
+            # Drop the seconds that left the window before counting the new events
+            if buckets.prune(second, self.window) <= self.clear_threshold:
+                buckets.flagged = False
+            total = buckets.add(second, len(log_ids))
+            self._local.set(ip, buckets)
+            if not buckets.flagged and total >= self.threshold:
+                buckets.flagged = True
+                decisions.append(ip)
+        return decisions
+
+
+attack_counter = AttackCounter(redis_client=redis.Redis.from_url(REDIS_URL))
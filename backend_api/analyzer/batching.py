@@ -0,0 +1,26 @@
+from typing import Callable
+
+
+def commit_isolating_failures(batch: list, commit: Callable[[list], list]) -> tuple[list, list]:
+    """
+    Runs commit() over the messages of a batch of (method, message) pairs. If
+    the batch fails, each message is committed on its own, so a single poison
+    message (e.g. a non-numeric port) does not take the valid ones down with it.
+
+    Returns the combined results and the (method, message) pairs that still failed.
+    """
+    try:
+        return commit([message for _, message in batch]), []
+    except Exception as e:
+        if len(batch) == 1:
+            print(f" [Analyzer] Error analyzing log entry: {e}")
+            return [], list(batch)
+        print(f" [Analyzer] Error analyzing batch of {len(batch)}, retrying its entries one by one: {e}")
+    results, failed = [], []
+    for method, message in batch:
+        try:
+            results.extend(commit([message]))
+        except Exception as e:
+            print(f" [Analyzer] Error analyzing log entry {message.get('id')}: {e}")
+            failed.append((method, message))
+    return results, failed
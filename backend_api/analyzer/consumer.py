@@ -1,83 +1,271 @@
 import pika
 import json
 import os
-import threading
 import time
 import pandas as pd
 import httpx
 from datetime import datetime, timedelta
+from sqlalchemy import select, update
 
 from backend_api.database import get_db, AttackLog
 from backend_api.message_bus import publish_message
-from .model import load_classifier_model, load_anomaly_model, extract_features
+from backend_api.geolocation import geolocation_service
+from backend_api.analytics_store import AttackEventWriter
+from backend_api.rollups import apply_rollups
+from .model import load_classifier_model, load_anomaly_model
+from .features import extract_features, extract_features_batch
+from .abuseipdb import abuseipdb_verifier
+from .attack_counter import attack_counter
+from .batching import commit_isolating_failures
 
 rabbitmq_host = os.getenv("RABBITMQ_HOST", "localhost")
 API_GATEWAY_URL = "http://api_gateway:8000" # Assuming api_gateway is accessible via this hostname
-ABUSEIPDB_API_KEY = os.getenv("ABUSEIPDB_API_KEY")
+# A batch size above 1 switches main() to the micro-batching consumer
+ANALYZER_BATCH_SIZE = int(os.getenv("ANALYZER_BATCH_SIZE", "1"))
+ANALYZER_BATCH_TIMEOUT = float(os.getenv("ANALYZER_BATCH_TIMEOUT", "0.5")) # seconds
+# "r" memory-maps the joblib models read-only so forked workers share their pages
+ANALYZER_MODEL_MMAP = os.getenv("ANALYZER_MODEL_MMAP") or None
 
-# Load the ML models once when the consumer starts
-classifier_model = load_classifier_model()
-anomaly_model = load_anomaly_model()
+# Load the ML models once when the consumer starts. The supervisor imports this
+# module before forking, so every worker inherits the same loaded models.
+classifier_model = load_classifier_model(mmap_mode=ANALYZER_MODEL_MMAP)
+anomaly_model = load_anomaly_model(mmap_mode=ANALYZER_MODEL_MMAP)
 
-def check_abuseipdb_sync(ip_address: str, log_id: int):
-    is_verified_threat = False
-    if not ABUSEIPDB_API_KEY:
-        print(" [Analyzer] ABUSEIPDB_API_KEY not set. Skipping AbuseIPDB check.")
-        return
+# Committed results are also appended to the columnar analytics store
+analytics_writer = AttackEventWriter()
+
+def get_geolocation(ip_address: str):
+    geo = geolocation_service.lookup(ip_address)
+    if geo:
+        return geo.get('lat'), geo.get('lon')
+    return None, None
+
+def analyze_batch(messages: list[dict]) -> list[dict]:
+    """
+    Runs both models once over the whole batch instead of four predict calls per log.
+    RandomForest.predict is argmax(predict_proba) and IsolationForest.predict is
+    decision_function < 0, so one call per model yields everything we need.
+    """
+    features_df = extract_features_batch(messages)
+    probabilities = classifier_model.predict_proba(features_df)
+    predictions = classifier_model.classes_[probabilities.argmax(axis=1)]
+    confidence_scores = probabilities.max(axis=1)
+    anomaly_scores = anomaly_model.decision_function(features_df)
+
+    geolocations = {ip: geolocation_service.lookup(ip) or {} for ip in {message.get("ip") for message in messages} if ip}
+
+    results = []
+    for message, prediction, confidence_score, anomaly_score in zip(messages, predictions, confidence_scores, anomaly_scores):
+        geo = geolocations.get(message.get("ip"), {})
+        results.append({
+            "id": message.get("id"),
+            "ip": message.get("ip"),
+            "port": message.get("port"),
+            "data": message.get("data"),
+            "timestamp": message.get("timestamp"),
+            "attack_type": str(prediction),
+            "confidence_score": round(float(confidence_score), 2),
+            "is_anomaly": bool(anomaly_score < 0),
+            "anomaly_score": float(anomaly_score),
+            "lat": geo.get("lat"),
+            "lon": geo.get("lon"),
+            "country": geo.get("country"),
+            "honeypot": message.get("honeypot"),
+        })
+    return results
 
-    url = f"https://api.abuseipdb.com/api/v2/check?ipAddress={ip_address}&maxAgeInDays=90"
-    headers = {
-        'Accept': 'application/json',
-        'Key': ABUSEIPDB_API_KEY
-    }
+def persist_batch(results: list[dict]) -> list[dict]:
+    """
+    Writes every analyzed log in one transaction. Returns the results whose
+    AttackLog row exists (and was therefore updated).
+
+    The rollup counters are updated in the same transaction, with only the logs
+    that had not been analyzed yet, so a redelivered batch is not counted twice.
+    """
+    db = next(get_db())
     try:
-        response = httpx.get(url, headers=headers, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        if data['data']['abuseConfidenceScore'] > 50: # Threshold for considering it a verified threat
-            print(f" [Analyzer] IP {ip_address} is a verified threat (AbuseIPDB score: {data['data']['abuseConfidenceScore']})")
-            is_verified_threat = True
+        ids = [result["id"] for result in results]
+        existing = dict(db.execute(select(AttackLog.id, AttackLog.attack_type).where(AttackLog.id.in_(ids))).all())
+        updated = [result for result in results if result["id"] in existing]
+        if updated:
+            db.execute(update(AttackLog), [
+                {
+                    "id": result["id"],
+                    "attack_type": result["attack_type"],
+                    "confidence_score": result["confidence_score"],
+                    "is_anomaly": result["is_anomaly"],
+                    "anomaly_score": result["anomaly_score"],
+                    "lat": result["lat"],
+                    "lon": result["lon"],
+                }
+                for result in updated
+            ])
+            apply_rollups(db, [result for result in updated if existing[result["id"]] is None])
+        db.commit()
+        missing = len(results) - len(updated)
+        if missing:
+            print(f" [Analyzer] {missing} AttackLog entries in batch not found.")
+        return updated
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
 
-        db = next(get_db())
-        try:
-            attack_log_entry = db.query(AttackLog).filter(AttackLog.id == log_id).first()
-            if attack_log_entry:
-                attack_log_entry.is_verified_threat = is_verified_threat
-                db.commit()
-                db.refresh(attack_log_entry)
-                print(f" [Analyzer] Updated AttackLog ID {log_id} with AbuseIPDB verification status.")
-                if is_verified_threat:
-                    # Trigger admin alert for verified threat
-                    httpx.post(f"{API_GATEWAY_URL}/alerts/threat_verified", json={
-                        "log_id": log_id,
-                        "ip": ip_address,
-                        "message": f"Verified threat detected from IP: {ip_address}"
+def dispatch_batch_side_effects(results: list[dict]):
+    """Alerts, map events, AbuseIPDB checks and blacklisting for a committed batch."""
+    with httpx.Client(timeout=5) as client:
+        for result in results:
+            if result["is_anomaly"]:
+                try:
+                    client.post(f"{API_GATEWAY_URL}/alerts/anomaly", json={
+                        "log_id": result["id"],
+                        "ip": result["ip"],
+                        "port": result["port"],
+                        "data": result["data"],
+                        "timestamp": result["timestamp"],
+                        "anomaly_score": result["anomaly_score"],
+                        "attack_type": result["attack_type"],
+                        "confidence_score": result["confidence_score"]
                     })
-        except Exception as e:
-            db.rollback()
-            print(f" [Analyzer] Error updating AbuseIPDB status for log {log_id}: {e}")
-        finally:
-            db.close()
+                except httpx.RequestError as e:
+                    print(f" [Analyzer] Failed to send anomaly alert to API Gateway: {e}")
 
-    except httpx.RequestError as e:
-        print(f" [Analyzer] Error checking AbuseIPDB for {ip_address}: {e}")
-    except Exception as e:
-        print(f" [Analyzer] Unexpected error during AbuseIPDB check for {ip_address}: {e}")
+            # Publish to agent-events for real-time map
+            publish_message("agent-events", {
+                "id": result["id"],
+                "ip": result["ip"],
+                "lat": result["lat"],
+                "lon": result["lon"],
+                "attack_type": result["attack_type"],
+                "confidence_score": result["confidence_score"],
+                "is_anomaly": result["is_anomaly"],
+                "anomaly_score": result["anomaly_score"],
+                "timestamp": result["timestamp"]
+            })
 
-def get_geolocation(ip_address: str):
+            if result["ip"]:
+                abuseipdb_verifier.submit(result["ip"], result["id"])
+
+    check_repeated_attacks([(result["ip"], result["id"]) for result in results])
+
+def check_repeated_attacks(events: list[tuple[str, int]]):
+    """
+    Counts (ip, log_id) events in the sliding window of attack_counter and
+    blacklists the IPs that cross the threshold, once per IP per window. The
+    database is only touched for those decisions.
+    """
+    ips = attack_counter.record(events)
+    if not ips:
+        return
+    db = next(get_db())
     try:
-        response = httpx.get(f"http://ip-api.com/json/{ip_address}", timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        if data['status'] == 'success':
-            return data.get('lat'), data.get('lon')
-    except httpx.RequestError as e:
-        print(f" [Analyzer] Error getting geolocation for {ip_address}: {e}")
-    except Exception as e:
-        print(f" [Analyzer] Unexpected error during geolocation for {ip_address}: {e}")
-    return None, None
+        window_start = datetime.utcnow() - timedelta(seconds=attack_counter.window)
+        for ip in ips:
+            # One IP failing must not cost the others their decision
+            try:
+                print(f" [Analyzer] Repeated attacks from {ip}. Mock blacklisting.")
+                db.query(AttackLog).filter(AttackLog.ip == ip, AttackLog.timestamp >= window_start).update({"is_blacklisted": True})
+                db.commit()
+                httpx.post(f"{API_GATEWAY_URL}/alerts/blacklisted", json={
+                    "ip": ip,
+                    "message": f"IP {ip} has been blacklisted due to repeated attacks."
+                })
+            except Exception as e:
+                db.rollback()
+                attack_counter.unflag(ip) # decide again on the IP's next event instead of after the window
+                print(f" [Analyzer] Error blacklisting {ip}: {e}")
+    finally:
+        db.close()
+
+def schedule_analytics_flush(connection):
+    """Writes buffered analytics events once they are ANALYTICS_FLUSH_INTERVAL old, even when no messages arrive."""
+    def flush_analytics():
+        analytics_writer.maybe_flush()
+        connection.call_later(1, flush_analytics)
+    connection.call_later(1, flush_analytics)
+
+def main_batched(batch_size: int = ANALYZER_BATCH_SIZE, batch_timeout: float = ANALYZER_BATCH_TIMEOUT,
+                 should_stop=None, on_batch_committed=None):
+    """
+    Micro-batching consumer: prefetches up to batch_size messages, analyzes them
+    with one model pass, commits them in one transaction and only then acks the
+    whole batch. A partial batch is flushed after batch_timeout seconds. A batch
+    that fails is retried message by message, and only the failing ones are nacked.
+
+    should_stop is polled twice a second; once it returns True the pending batch
+    is flushed and consumption stops, so unacked prefetched messages go back to
+    the queue. on_batch_committed(count) is called after every committed batch.
+    """
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbitmq_host))
+    channel = connection.channel()
+    channel.queue_declare(queue='attack_logs')
+    channel.basic_qos(prefetch_count=batch_size)
+
+    pending = [] # (method, message_data)
+
+    def flush():
+        if not pending:
+            return
+        batch = list(pending)
+        pending.clear()
+        results, failed = commit_isolating_failures(batch, lambda messages: persist_batch(analyze_batch(messages)))
+        # Give each failed message one redelivery so a transient DB error does not
+        # lose it, but do not loop forever on a poison message.
+        for method, _ in failed:
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=not method.redelivered)
+        if not failed:
+            channel.basic_ack(delivery_tag=batch[-1][0].delivery_tag, multiple=True)
+        else:
+            failed_tags = {method.delivery_tag for method, _ in failed}
+            for method, _ in batch:
+                if method.delivery_tag not in failed_tags:
+                    channel.basic_ack(delivery_tag=method.delivery_tag)
+        committed = len(batch) - len(failed)
+        if not committed:
+            return
+        print(f" [Analyzer] Analyzed and committed batch of {committed} log entries.")
+        if on_batch_committed:
+            on_batch_committed(committed)
+        analytics_writer.append(results)
+        dispatch_batch_side_effects(results)
+
+    def check_stop():
+        if should_stop():
+            print(" [Analyzer] Stop requested, draining pending batch.")
+            flush()
+            channel.stop_consuming()
+        else:
+            connection.call_later(0.5, check_stop)
+
+    def callback(ch, method, properties, body):
+        try:
+            message_data = json.loads(body.decode())
+        except ValueError as e:
+            print(f" [Analyzer] Dropping undecodable message: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+        if not pending:
+            connection.call_later(batch_timeout, flush)
+        pending.append((method, message_data))
+        if len(pending) >= batch_size:
+            flush()
+
+    channel.basic_consume(queue='attack_logs', on_message_callback=callback, auto_ack=False)
+    if should_stop:
+        connection.call_later(0.5, check_stop)
+    schedule_analytics_flush(connection)
+
+    print(f' [Analyzer] Waiting for messages in batches of {batch_size}. To exit press CTRL+C')
+    channel.start_consuming()
+    flush()
+    analytics_writer.flush()
+    connection.close()
 
 def main():
+    if ANALYZER_BATCH_SIZE > 1:
+        return main_batched()
+
     connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbitmq_host))
     channel = connection.channel()
 
@@ -134,15 +322,36 @@ def main():
             # Fetch the existing AttackLog entry and update it
             attack_log_entry = db.query(AttackLog).filter(AttackLog.id == log_id).first()
             if attack_log_entry:
+                first_analysis = attack_log_entry.attack_type is None
                 attack_log_entry.attack_type = prediction
                 attack_log_entry.confidence_score = float(f"{confidence_score:.2f}")
                 attack_log_entry.is_anomaly = is_anomaly
                 attack_log_entry.anomaly_score = anomaly_score
                 attack_log_entry.lat = lat
                 attack_log_entry.lon = lon
+                if first_analysis:
+                    apply_rollups(db, [{
+                        "timestamp": attack_log_entry.timestamp,
+                        "attack_type": prediction,
+                        "port": original_log_data["port"],
+                        "country": (geolocation_service.lookup(original_log_data["ip"]) or {}).get("country"),
+                        "honeypot": message_data.get("honeypot"),
+                        "confidence_score": float(f"{confidence_score:.2f}"),
+                        "is_anomaly": bool(is_anomaly),
+                    }])
                 db.commit()
                 db.refresh(attack_log_entry)
                 print(f" [Analyzer] Updated AttackLog ID {log_id} with prediction, anomaly status, and geolocation.")
+                analytics_writer.append([{
+                    "id": log_id,
+                    "timestamp": original_log_data["timestamp"],
+                    "ip": original_log_data["ip"],
+                    "port": original_log_data["port"],
+                    "attack_type": prediction,
+                    "confidence_score": float(f"{confidence_score:.2f}"),
+                    "is_anomaly": bool(is_anomaly),
+                    "anomaly_score": float(anomaly_score),
+                }])
 
                 # Publish to agent-events for real-time map
                 publish_message("agent-events", {
@@ -166,40 +375,18 @@ def main():
         finally:
             db.close()
 
-        # Run AbuseIPDB check in a separate thread to avoid blocking the consumer
+        # Queue the AbuseIPDB check; the verifier's worker pool keeps it off the consumer thread
         if original_log_data["ip"]:
-            thread = threading.Thread(target=check_abuseipdb_sync, args=(original_log_data["ip"], log_id))
-            thread.start()
+            abuseipdb_verifier.submit(original_log_data["ip"], log_id)
 
         # Check for repeated attacks for blacklisting (mocked)
-        db_for_blacklist = next(get_db())
-        try:
-            five_minutes_ago = datetime.now() - timedelta(minutes=5)
-            recent_attacks = db_for_blacklist.query(AttackLog).filter(
-                AttackLog.ip == original_log_data["ip"],
-                AttackLog.timestamp >= five_minutes_ago
-            ).count()
-
-            if recent_attacks >= 3:
-                print(f" [Analyzer] Repeated attacks from {original_log_data["ip"]}. Mock blacklisting.")
-                # Update all recent attacks from this IP as blacklisted
-                db_for_blacklist.query(AttackLog).filter(AttackLog.ip == original_log_data["ip"], AttackLog.timestamp >= five_minutes_ago).update({"is_blacklisted": True})
-                db_for_blacklist.commit()
-                # Send alert to API Gateway for blacklisting
-                httpx.post(f"{API_GATEWAY_URL}/alerts/blacklisted", json={
-                    "ip": original_log_data["ip"],
-                    "message": f"IP {original_log_data["ip"]} has been blacklisted due to repeated attacks."
-                })
-        except Exception as e:
-            db_for_blacklist.rollback()
-            print(f" [Analyzer] Error during blacklisting check: {e}")
-        finally:
-            db_for_blacklist.close()
+        check_repeated_attacks([(original_log_data["ip"], log_id)])
 
     channel.basic_consume(queue='attack_logs', on_message_callback=callback, auto_ack=True)
 
     print(' [Analyzer] Waiting for messages. To exit press CTRL+C')
+    schedule_analytics_flush(connection)
     channel.start_consuming()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,26 @@
+import pandas as pd
+
+# Column order must match the frame the models in model.py were trained on.
+FEATURE_COLUMNS = ['port', 'data_length', 'keyword_sql', 'keyword_ddos', 'keyword_scan']
+
+SQL_KEYWORDS = ("select", "union", "insert", "drop", "' or", "--")
+DDOS_KEYWORDS = ("ddos", "flood", "syn")
+SCAN_KEYWORDS = ("scan", "nmap", "masscan", "zgrab", "probe")
+
+def _feature_row(log_data: dict) -> list:
+    data = (log_data.get("data") or "").lower()
+    return [
+        int(log_data.get("port") or 0),
+        len(data),
+        int(any(keyword in data for keyword in SQL_KEYWORDS)),
+        int(any(keyword in data for keyword in DDOS_KEYWORDS)),
+        int(any(keyword in data for keyword in SCAN_KEYWORDS)),
+    ]
+
+def extract_features(log_data: dict) -> pd.DataFrame:
+    """Builds a one-row feature frame for a single log entry."""
+    return extract_features_batch([log_data])
+
+def extract_features_batch(logs: list[dict]) -> pd.DataFrame:
+    """Builds one feature matrix for a batch of log entries, one row per log."""
+    return pd.DataFrame([_feature_row(log_data) for log_data in logs], columns=FEATURE_COLUMNS)
@@ -47,12 +47,14 @@ def train_classifier_model():
     print(f"Classifier model trained and saved to {CLASSIFIER_MODEL_PATH}")
     return model
 
-def load_classifier_model():
+def load_classifier_model(mmap_mode=None):
+    # mmap_mode='r' maps the model's numpy arrays read-only from the file, so
+    # forked analyzer workers share the same physical pages.
     if not os.path.exists(CLASSIFIER_MODEL_PATH):
         print("No classifier model found, training a new one...")
-        return train_classifier_model()
+        train_classifier_model()
     print(f"Loading classifier model from {CLASSIFIER_MODEL_PATH}")
-    return joblib.load(CLASSIFIER_MODEL_PATH)
+    return joblib.load(CLASSIFIER_MODEL_PATH, mmap_mode=mmap_mode)
 
 def train_anomaly_model():
     # Use the same mock data for anomaly detection, but without labels
@@ -72,12 +74,12 @@ def train_anomaly_model():
     print(f"Anomaly detection model trained and saved to {ANOMALY_MODEL_PATH}")
     return model
 
-def load_anomaly_model():
+def load_anomaly_model(mmap_mode=None):
     if not os.path.exists(ANOMALY_MODEL_PATH):
         print("No anomaly detection model found, training a new one...")
-        return train_anomaly_model()
+        train_anomaly_model()
     print(f"Loading anomaly detection model from {ANOMALY_MODEL_PATH}")
-    return joblib.load(ANOMALY_MODEL_PATH)
+    return joblib.load(ANOMALY_MODEL_PATH, mmap_mode=mmap_mode)
 
 if __name__ == "__main__":
     train_classifier_model()
@@ -0,0 +1,143 @@
+"""
+Runs the analyzer as a pool of forked worker processes.
+
+sklearn and pandas hold the GIL, so a single consumer thread cannot use more
+than one core. The supervisor imports the consumer (which loads both joblib
+models) before forking, so every worker shares the model pages copy-on-write,
+or through the page cache when ANALYZER_MODEL_MMAP=r. Each worker consumes
+`attack_logs` with its own prefetch window via consumer.main_batched.
+
+    python -m backend_api.analyzer.supervisor --workers 4 --batch-size 64
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import time
+
+from backend_api.database import engine
+from . import consumer
+
+ANALYZER_WORKERS = int(os.getenv("ANALYZER_WORKERS", str(os.cpu_count() or 1)))
+METRICS_INTERVAL = float(os.getenv("ANALYZER_METRICS_INTERVAL", "10")) # seconds
+DRAIN_TIMEOUT = float(os.getenv("ANALYZER_DRAIN_TIMEOUT", "30")) # seconds
+
+_fork = multiprocessing.get_context("fork")
+
+
+def worker_main(worker_id: int, processed, batch_size: int, batch_timeout: float):
+    stop_requested = False
+
+    def request_stop(signum, frame):
+        nonlocal stop_requested
+        stop_requested = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    # Never reuse pooled DB connections inherited from the parent across processes
+    engine.dispose(close=False)
+
+    def count(batch_len: int):
+        with processed.get_lock():
+            processed[worker_id] += batch_len
+
+    print(f" [Analyzer worker {worker_id}] Started with PID {os.getpid()}")
+    consumer.main_batched(
+        batch_size=batch_size,
+        batch_timeout=batch_timeout,
+        should_stop=lambda: stop_requested,
+        on_batch_committed=count,
+    )
+    print(f" [Analyzer worker {worker_id}] Drained and stopped.")
+
+
+class AnalyzerSupervisor:
+    """Starts, restarts and drains the analyzer worker processes and reports per-worker throughput."""
+
+    def __init__(self, workers: int, batch_size: int, batch_timeout: float):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.processed = _fork.Array('Q', workers) # messages committed, per worker
+        self.processes = [None] * workers
+        self.draining = False
+        self._last_counts = [0] * workers
+        self._last_report = time.monotonic()
+
+    def _spawn(self, worker_id: int):
+        process = _fork.Process(
+            target=worker_main,
+            args=(worker_id, self.processed, self.batch_size, self.batch_timeout),
+            name=f"analyzer-worker-{worker_id}",
+        )
+        process.start()
+        self.processes[worker_id] = process
+
+    def metrics(self) -> list[dict]:
+        """Messages/second per worker since the previous call."""
+        now = time.monotonic()
+        elapsed = max(now - self._last_report, 1e-9)
+        counts = list(self.processed)
+        rates = [
+            {
+                "worker": worker_id,
+                "pid": process.pid if process else None,
+                "alive": bool(process and process.is_alive()),
+                "processed_total": counts[worker_id],
+                "messages_per_second": round((counts[worker_id] - self._last_counts[worker_id]) / elapsed, 1),
+            }
+            for worker_id, process in enumerate(self.processes)
+        ]
+        self._last_counts = counts
+        self._last_report = now
+        return rates
+
+    def drain(self, signum=None, frame=None):
+        if self.draining:
+            return
+        self.draining = True
+        print(" [Analyzer supervisor] Draining workers...")
+        for process in self.processes:
+            if process and process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.drain)
+        signal.signal(signal.SIGINT, self.drain)
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+        print(f" [Analyzer supervisor] Started {self.workers} workers (batch size {self.batch_size}).")
+
+        next_report = time.monotonic() + METRICS_INTERVAL
+        while not self.draining:
+            time.sleep(0.5)
+            for worker_id, process in enumerate(self.processes):
+                if not self.draining and not process.is_alive():
+                    print(f" [Analyzer supervisor] Worker {worker_id} exited with code {process.exitcode}, restarting.")
+                    self._spawn(worker_id)
+            if time.monotonic() >= next_report:
+                for worker in self.metrics():
+                    print(f" [Analyzer supervisor] worker {worker['worker']}: {worker['messages_per_second']} msg/s ({worker['processed_total']} total)")
+                next_report = time.monotonic() + METRICS_INTERVAL
+
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        for process in self.processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                print(f" [Analyzer supervisor] Worker PID {process.pid} did not drain in time, killing it.")
+                process.kill()
+                process.join()
+        print(f" [Analyzer supervisor] All workers stopped. Processed {sum(self.processed)} messages.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the analyzer as a multi-process worker pool.")
+    parser.add_argument("--workers", type=int, default=ANALYZER_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=max(consumer.ANALYZER_BATCH_SIZE, 32))
+    parser.add_argument("--batch-timeout", type=float, default=consumer.ANALYZER_BATCH_TIMEOUT)
+    args = parser.parse_args()
+    AnalyzerSupervisor(args.workers, args.batch_size, args.batch_timeout).run()
+
+
+if __name__ == "__main__":
+    main()
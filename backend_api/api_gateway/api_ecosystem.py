@@ -1,55 +1,146 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from backend_api.database import get_db, Block, AttackLog
 from backend_api.auth import get_current_user
-from typing import List, Dict, Any
+from backend_api.analytics_store import AnalyticsStore
+from backend_api.rollups import rollup_series, overview
+from typing import List, Dict, Any, Optional
+import asyncio
 import datetime
 
+analytics_store = AnalyticsStore()
+
 router = APIRouter()
 
+def _summary_from_database(db: Session, since: datetime.datetime, until: datetime.datetime, top_n: int) -> Dict[str, Any]:
+    # Fallback when the analytics store is not available; fine for small databases only
+    in_range = (AttackLog.timestamp >= since, AttackLog.timestamp < until)
+    total, anomalies, average_confidence, unique_ips = db.query(
+        func.count(AttackLog.id),
+        func.count(AttackLog.id).filter(AttackLog.is_anomaly == True),
+        func.avg(AttackLog.confidence_score),
+        func.count(func.distinct(AttackLog.ip)),
+    ).filter(*in_range).one()
+    top_ips = db.query(AttackLog.ip, func.count(AttackLog.id).label("attacks")).filter(*in_range) \
+        .group_by(AttackLog.ip).order_by(func.count(AttackLog.id).desc(), AttackLog.ip).limit(top_n).all()
+    attack_types = db.query(AttackLog.attack_type, func.count(AttackLog.id)).filter(*in_range) \
+        .group_by(AttackLog.attack_type).order_by(func.count(AttackLog.id).desc()).all()
+    return {
+        "total_attacks": total,
+        "anomalies": anomalies,
+        "average_confidence": round(average_confidence, 4) if average_confidence is not None else None,
+        "unique_ips": unique_ips,
+        "top_ips": [{"ip": ip, "attacks": attacks} for ip, attacks in top_ips],
+        "attack_types": {attack_type: attacks for attack_type, attacks in attack_types},
+    }
+
 @router.get("/analytics/threat_summary", response_model=Dict[str, Any])
 async def get_threat_summary(
     current_user: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    hours: int = Query(24, ge=1, le=24 * 365),
+    top_n: int = Query(10, ge=1, le=100)
 ):
     """
-    Conceptual REST endpoint for a threat summary.
-    In a real scenario, this would query the database, perform analytics,
-    and return aggregated threat intelligence.
-    """
-    # Simulate fetching some analytics data
-    total_attacks = db.query(AttackLog).count()
-    total_blocks = db.query(Block).count()
-    
-    # Placeholder for more advanced analytics
-    # e.g., top attacking IPs, common attack types, trends
-    
+    Top attacking IPs, attack-type histogram and hourly trend over the last `hours`.
+    Served from the columnar analytics store, or from the database if it is unavailable.
+    """
+    until = datetime.datetime.utcnow()
+    since = until - datetime.timedelta(hours=hours)
+    if analytics_store.available:
+        summary = await asyncio.to_thread(analytics_store.threat_summary, since, until, top_n)
+        trend = await asyncio.to_thread(analytics_store.hourly_trend, since, until)
+        source = "analytics_store"
+    else:
+        summary = _summary_from_database(db, since, until, top_n)
+        trend = None
+        source = "database"
+
     return {
-        "message": "Threat summary analytics (conceptual)",
-        "total_attacks_logged": total_attacks,
-        "total_blockchain_blocks": total_blocks,
-        "top_attack_types": ["SSH Brute Force", "Port Scan"], # Placeholder
-        "risk_score_average": 75.5 # Placeholder
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "source": source,
+        **summary,
+        "top_attack_types": list(summary["attack_types"])[:5],
+        "hourly_trend": trend,
+        "total_blockchain_blocks": db.query(Block).count(),
     }
 
+@router.get("/analytics/rollups", response_model=Dict[str, Any])
+async def get_attack_rollups(
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    granularity: str = Query("hour", pattern="^(minute|hour|day)$"),
+    hours: int = Query(24, ge=1, le=24 * 365),
+    group_by: Optional[str] = Query(None, description="attack_type, port, country or honeypot"),
+    attack_type: Optional[str] = None,
+    port: Optional[int] = None,
+    country: Optional[str] = None,
+    honeypot: Optional[str] = None
+):
+    """
+    Attack counts per minute, hour or day from the rollup table, optionally split by one dimension.
+    """
+    until = datetime.datetime.utcnow()
+    since = until - datetime.timedelta(hours=hours)
+    try:
+        series = rollup_series(db, granularity, since, until, group_by=group_by,
+                               attack_type=attack_type, port=port, country=country, honeypot=honeypot)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"granularity": granularity, "since": since.isoformat(), "until": until.isoformat(), "series": series}
+
+@router.get("/analytics/overview", response_model=Dict[str, Any])
+async def get_attack_overview(
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    hours: int = Query(24, ge=1, le=24 * 365)
+):
+    """
+    Totals for the dashboard cards over the last `hours`, read from the hourly rollups.
+    """
+    until = datetime.datetime.utcnow()
+    return overview(db, until - datetime.timedelta(hours=hours), until)
+
 @router.get("/reports/daily_digest", response_model=Dict[str, Any])
 async def get_daily_digest_report(
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Conceptual REST endpoint for a daily digest report.
-    This would generate a summary of recent activities, anomalies, and insights.
+    Summary of the last 24 hours compared with the 24 hours before, plus the latest activity.
     """
-    # Simulate generating a report
-    recent_logs = db.query(AttackLog).order_by(AttackLog.timestamp.desc()).limit(10).all()
-    
+    now = datetime.datetime.utcnow()
+    yesterday = now - datetime.timedelta(days=1)
+    day_before = yesterday - datetime.timedelta(days=1)
+    if analytics_store.available:
+        today_summary = await asyncio.to_thread(analytics_store.threat_summary, yesterday, now, 5)
+        previous_summary = await asyncio.to_thread(analytics_store.threat_summary, day_before, yesterday, 5)
+    else:
+        today_summary = _summary_from_database(db, yesterday, now, 5)
+        previous_summary = _summary_from_database(db, day_before, yesterday, 5)
+    recent_logs = db.query(AttackLog.ip, AttackLog.data).order_by(AttackLog.timestamp.desc()).limit(10).all()
+
+    previous_total = previous_summary["total_attacks"]
+    change = round((today_summary["total_attacks"] - previous_total) / previous_total * 100, 1) if previous_total else None
+    recommendations = []
+    if today_summary["top_ips"]:
+        recommendations.append(f"Review firewall rules for {today_summary['top_ips'][0]['ip']}, the most active source")
+    if today_summary["anomalies"]:
+        recommendations.append(f"Investigate the {today_summary['anomalies']} anomalous events")
+    if change is not None and change > 50:
+        recommendations.append("Attack volume rose sharply; check honeypot exposure and rate limits")
+
     return {
-        "message": "Daily digest report (conceptual)",
-        "report_date": datetime.date.today().isoformat(),
-        "recent_activities": [{"ip": log.ip, "data": log.data} for log in recent_logs],
-        "anomalies_detected": 3, # Placeholder
-        "recommendations": ["Review firewall rules", "Update honeypot configurations"] # Placeholder
+        "report_date": now.date().isoformat(),
+        "recent_activities": [{"ip": ip, "data": data} for ip, data in recent_logs],
+        "anomalies_detected": today_summary["anomalies"],
+        "total_attacks": today_summary["total_attacks"],
+        "attack_volume_change_percent": change,
+        "top_ips": today_summary["top_ips"],
+        "attack_types": today_summary["attack_types"],
+        "recommendations": recommendations or ["No action needed"],
     }
 
 # Placeholder for GraphQL endpoint
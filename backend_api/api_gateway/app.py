@@ -1,8 +1,9 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, status, Response, Request
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, status, Response, Request, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional
 import os
 from dotenv import load_dotenv
 from datetime import timedelta, datetime # Import timedelta and datetime
@@ -10,6 +11,7 @@ import sys
 
 load_dotenv()
 import json
+import math
 import asyncio
 import httpx
 import logging
@@ -43,10 +45,19 @@ from backend_api.admin import router as admin_router
 from backend_api.agent_api import router as agent_router # Import admin_router
 from backend_api.orchestrator_api import router as orchestrator_router
 from backend_api.blockchain_service.blockchain import Blockchain
+from blockchain_layer.blockchain import default_sealer
 from starlette.datastructures import URL # Import URL
 from uuid import uuid4 # Import uuid4
 from backend_api.email_service import send_reset_email # Import send_reset_email
 from backend_api.health_monitor import monitor_health # Import health monitor
+from backend_api.geolocation import geolocation_service
+from backend_api.ip_blacklist import ip_blacklist, BLACKLIST_CHANNEL
+from backend_api.message_bus import listen
+from backend_api.rate_limiter import rate_limiter, rate_limit, matches_routes
+from backend_api.session_cache import session_cache, invalidate_sessions, SESSION_REVOCATIONS_CHANNEL
+from backend_api.log_query import fetch_log_page, parse_fields, stream_logs_ndjson
+from backend_api.ws_broadcaster import broadcaster
+from backend_api.ws_event_bus import event_bus
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -70,6 +81,14 @@ def get_db():
 async def startup_event():
     create_db_and_tables()
     logger.info("Database tables created/checked.") # Log startup event
+    default_sealer() # refuse to start without the BLOCKCHAIN_SEALER key instead of failing on the first block
+    # Keep the IP blacklist in memory; admin.py publishes every change on BLACKLIST_CHANNEL
+    ip_blacklist.reload()
+    asyncio.create_task(listen(BLACKLIST_CHANNEL, ip_blacklist.apply_update, on_reconnect=ip_blacklist.reload))
+    # Drop cached sessions revoked by any gateway process
+    asyncio.create_task(listen(SESSION_REVOCATIONS_CHANNEL, session_cache.apply_revocation, on_reconnect=session_cache.clear))
+    # WebSocket events from every gateway worker, fanned out to this worker's clients
+    asyncio.create_task(event_bus.run())
     # Start the health monitoring in the background
     asyncio.create_task(monitor_health())
     logger.info("Health monitoring started in background.")
@@ -140,7 +159,6 @@ class SimulateAttack(BaseModel):
     port: int = Field(..., ge=1, le=65535, description="Port for simulation")
     data: str = Field(..., min_length=1, description="Data for simulation")
 
-clients = set() # Store active WebSocket connections
 
 
 # CORS middleware to allow frontend to connect
@@ -154,6 +172,10 @@ app.add_middleware(
 
 RATE_LIMIT_THRESHOLD = 100  # requests
 RATE_LIMIT_WINDOW = 60  # seconds
+# Per-router limits, applied instead of the global per-IP limit
+AGENT_RATE_LIMIT = int(os.getenv("AGENT_RATE_LIMIT", "600")) # requests per RATE_LIMIT_WINDOW
+ORCHESTRATOR_RATE_LIMIT = int(os.getenv("ORCHESTRATOR_RATE_LIMIT", "120")) # requests per RATE_LIMIT_WINDOW
+OWN_RATE_LIMIT_ROUTES = [*agent_router.routes, *orchestrator_router.routes] # included under /api
 
 BAD_USER_AGENTS = [
     "sqlmap",
@@ -180,10 +202,7 @@ async def blacklist_middleware(request: Request, call_next):
             logger.warning(f"Blocked request from blacklisted user agent: {user_agent} from IP: {ip}")
             return JSONResponse(status_code=403, content={"detail": "User agent is blacklisted"})
 
-    db = SessionLocal()
-    blacklisted_ip = db.query(BlacklistedIP).filter(BlacklistedIP.ip_address == ip).first()
-    db.close()
-    if blacklisted_ip:
+    if ip_blacklist.contains(ip):
         logger.warning(f"Blocked request from blacklisted IP: {ip}")
         return JSONResponse(status_code=403, content={"detail": "IP address is blacklisted"})
     response = await call_next(request)
@@ -191,18 +210,14 @@ async def blacklist_middleware(request: Request, call_next):
 
 @app.middleware("http")
 async def rate_limit_middleware(request: Request, call_next):
+    if matches_routes(OWN_RATE_LIMIT_ROUTES, "/api", request.scope):
+        return await call_next(request)
     ip = request.client.host
-    key = f"rate_limit:{ip}"
-
-    # Use a pipeline to execute commands atomically
-    pipe = redis_client.pipeline()
-    pipe.incr(key)
-    pipe.expire(key, RATE_LIMIT_WINDOW)
-    request_count, _ = pipe.execute()
+    allowed, retry_after = await rate_limiter.hit(f"rate_limit:{ip}", RATE_LIMIT_THRESHOLD, RATE_LIMIT_WINDOW)
 
-    if request_count > RATE_LIMIT_THRESHOLD:
+    if not allowed:
         logger.warning(f"Rate limit exceeded for IP: {ip}")
-        return JSONResponse(status_code=429, content={"detail": "Too Many Requests"})
+        return JSONResponse(status_code=429, content={"detail": "Too Many Requests"}, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
 
     response = await call_next(request)
     return response
@@ -219,8 +234,8 @@ CONFIG_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "phantomnet_ag
 
 app.include_router(api_ecosystem_router, prefix="/api/v1/enterprise", tags=["Enterprise API"])
 app.include_router(admin_router, prefix="/api", tags=["Admin"])
-app.include_router(agent_router, prefix="/api", tags=["Agents"])
-app.include_router(orchestrator_router, prefix="/api", tags=["Orchestrator"])
+app.include_router(agent_router, prefix="/api", tags=["Agents"], dependencies=[rate_limit(AGENT_RATE_LIMIT, RATE_LIMIT_WINDOW, scope="agents")])
+app.include_router(orchestrator_router, prefix="/api", tags=["Orchestrator"], dependencies=[rate_limit(ORCHESTRATOR_RATE_LIMIT, RATE_LIMIT_WINDOW, scope="orchestrator")])
 
 def get_blockchain(db: Session = Depends(get_db)):
     return Blockchain(db)
@@ -274,21 +289,10 @@ async def login_for_access_token(login_request: LoginRequest, db: Session = Depe
 
     # For anomaly detection, we need the geo data of the current login.
     city, region, country, latitude, longitude = None, None, None, None, None
-    if ip_address and ip_address not in ["127.0.0.1", "localhost"]:
-        try:
-            geo_response = httpx.get(f"http://ip-api.com/json/{ip_address}")
-            geo_response.raise_for_status()
-            geo_data = geo_response.json()
-            if geo_data.get("status") == "success":
-                city = geo_data.get("city")
-                region = geo_data.get("regionName")
-                country = geo_data.get("country")
-                latitude = geo_data.get("lat")
-                longitude = geo_data.get("lon")
-        except httpx.RequestError as e:
-            logger.error(f"Error fetching geolocation for IP {ip_address} during anomaly check: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error processing geolocation for IP {ip_address} during anomaly check: {e}")
+    geo = await geolocation_service.alookup(ip_address)
+    if geo:
+        city, region, country = geo.get("city"), geo.get("region"), geo.get("country")
+        latitude, longitude = geo.get("lat"), geo.get("lon")
 
     anomaly_score = calculate_anomaly_score(db, user.id, ip_address, device_fingerprint, city, country)
 
@@ -309,6 +313,7 @@ async def login_for_access_token(login_request: LoginRequest, db: Session = Depe
             {"is_valid": False, "revoked_at": datetime.utcnow()}
         )
         db.commit()
+        invalidate_sessions(user_id=user.id)
         db.refresh(user)
         logger.info(f"Trust score for user ID: {user.id} decreased to {user.trust_score} due to session anomaly.")
         raise HTTPException(
@@ -387,6 +392,7 @@ async def revoke_session(
     session_to_revoke.is_valid = False
     session_to_revoke.revoked_at = datetime.utcnow()
     db.commit()
+    invalidate_sessions(jtis=[jti])
     logger.info(f"Session {jti} revoked for user ID: {current_user.id}") # Add logging
     return {"message": "Session revoked successfully"}
 
@@ -422,6 +428,7 @@ async def revoke_all_sessions(
         session.is_valid = False
         session.revoked_at = datetime.utcnow()
     db.commit()
+    invalidate_sessions(jtis=[session.jti for session in sessions_to_revoke])
     logger.info(f"All eligible sessions revoked for user ID: {current_user.id}. Exclude current: {exclude_current}") # Add logging
     return {"message": "All eligible sessions revoked successfully"}
 
@@ -513,6 +520,7 @@ async def reset_password(
         {"is_valid": False, "revoked_at": datetime.utcnow()}
     )
     db.commit()
+    invalidate_sessions(user_id=user.id)
 
     logger.info(f"Password successfully reset for user ID: {user.id}. All sessions revoked. Token ID: {token_id}") # Redact username, log user ID and token ID
     return {"message": "Password has been reset successfully. All your active sessions have been revoked."}
@@ -525,6 +533,7 @@ async def generate_2fa_secret(current_user: User = Depends(get_current_user), db
     current_user.totp_secret = secret
     db.commit()
     db.refresh(current_user)
+    invalidate_sessions(user_id=current_user.id)
     
     # For TOTP, the URI is used to generate the QR code on the frontend
     otp_uri = pyotp.totp.TOTP(secret).provisioning_uri(
@@ -545,6 +554,7 @@ async def verify_2fa_setup(code: str, current_user: User = Depends(get_current_u
         current_user.trust_score = min(100, current_user.trust_score + 10)
         db.commit()
         db.refresh(current_user)
+        invalidate_sessions(user_id=current_user.id)
         logger.info(f"2FA successfully verified and enabled for user ID: {current_user.id}") # Redact username
         return {"message": "2FA successfully enabled."}
     else:
@@ -562,6 +572,7 @@ async def disable_2fa(current_user: User = Depends(get_current_user), db: Sessio
     current_user.trust_score = max(0, current_user.trust_score - 10)
     db.commit()
     db.refresh(current_user)
+    invalidate_sessions(user_id=current_user.id)
     logger.info(f"2FA disabled for user ID: {current_user.id}")
     return {"message": "2FA successfully disabled."}
 
@@ -760,15 +771,8 @@ async def get_health_status():
     return {"status": overall_status, "database": "Healthy" if db_status else "Degraded"}
 
 async def broadcast_event(event_json: dict):
-    for ws in list(clients):
-        try:
-            await ws.send_json(event_json)
-        except RuntimeError:
-            # This can happen if the WebSocket is already closed
-            clients.remove(ws)
-        except Exception as e:
-            logger.error(f"Error broadcasting event: {e}") # Use logger
-            clients.remove(ws)
+    # Every worker reads the event stream and queues the event for its own clients
+    await event_bus.publish(event_json)
 
 # Placeholder for Smart Contract Interaction
 async def write_merkle_root_to_contract(merkle_root: str, block_index: int):
@@ -829,14 +833,8 @@ async def add_blockchain_transaction(
             amount=1, # Placeholder, consider adding more meaningful data from transaction.data
         )
 
-        # Mine a new block to record the transaction
-        last_block_obj = blockchain.last_block
-        last_proof = last_block_obj.proof if last_block_obj else 0 # Get proof from the last block object
-        proof = blockchain.proof_of_work(last_proof)
-        previous_hash = blockchain.hash(last_block_obj.to_dict()) if last_block_obj else '1' # Hash the last block object
-
-        new_block_obj = blockchain.new_block(proof, previous_hash)
-        db.add(new_block_obj) # Add the new block to the session
+        # Seal a new block to record the transaction, on top of the cached chain tip
+        new_block_obj = blockchain.seal_block()
         db.commit() # Commit the new block to the database
         db.refresh(new_block_obj) # Refresh to get the ID and other generated fields
 
@@ -996,12 +994,28 @@ def home():
 @app.get("/logs", dependencies=[Depends(has_role([UserRole.ADMIN, UserRole.ANALYST, UserRole.VIEWER]))])
 def get_logs(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    ip: Optional[str] = None,
+    attack_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    is_anomaly: Optional[bool] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. timestamp,ip,attack_type"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams every matching log for exports"),
 ):
-    logs = db.query(AttackLog).order_by(AttackLog.timestamp.desc()).all()
-    # Convert AttackLog objects to dictionaries or a suitable format for the frontend
+    filters = {"cursor": cursor, "ip": ip, "attack_type": attack_type, "since": since, "until": until, "is_anomaly": is_anomaly}
+    try:
+        selected_fields = parse_fields(fields)
+        if format == "ndjson":
+            logger.info(f"User ID: {current_user.id} exported logs.") # Redact username
+            return StreamingResponse(stream_logs_ndjson(SessionLocal, selected_fields, **filters), media_type="application/x-ndjson")
+        page = fetch_log_page(db, selected_fields, limit, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     logger.info(f"User ID: {current_user.id} fetched logs.") # Redact username
-    return {"logs": [{"timestamp": log.timestamp.isoformat(), "ip": log.ip, "port": log.port, "data": log.data, "attack_type": log.attack_type, "confidence_score": log.confidence_score, "is_anomaly": log.is_anomaly, "anomaly_score": log.anomaly_score, "is_verified_threat": log.is_verified_threat, "is_blacklisted": log.is_blacklisted} for log in logs]}
+    return page
 
 @app.get("/config", dependencies=[Depends(has_role([UserRole.ADMIN]))])
 def get_config(current_user: dict = Depends(get_current_user)):
@@ -1027,9 +1041,13 @@ def get_blockchain_data(
     return [block.to_dict() for block in blocks]
 
 @app.post("/blockchain/verify", dependencies=[Depends(has_role([UserRole.ADMIN]))])
-async def verify_blockchain_integrity(db: Session = Depends(get_db)):
+async def verify_blockchain_integrity(full: bool = False, db: Session = Depends(get_db)):
+    """
+    Verifies the blocks sealed since the last verification, or the whole chain with ?full=true.
+    Blocks before the last checkpoint are not read again, so only ?full=true detects one edited there.
+    """
     blockchain_instance = Blockchain(db)
-    is_valid = blockchain_instance.is_chain_valid()
+    is_valid = await asyncio.to_thread(blockchain_instance.is_chain_valid, full)
     if is_valid:
         logger.info("Blockchain integrity verified: All blocks are valid.") # Use logger
         return {"message": "Blockchain integrity verified: All blocks are valid."}
@@ -1048,20 +1066,26 @@ async def get_ip_info(ip_address: str, current_user: dict = Depends(get_current_
             logger.error(f"User ID: {current_user.id} failed to fetch IP info for IP: {ip_address}: Status {response.status_code}") # Redact username
             return {"error": "Failed to fetch IP info"}, response.status_code
 
+@app.get("/ws/stats", dependencies=[Depends(has_role([UserRole.ADMIN]))])
+async def get_websocket_stats():
+    """Connected WebSocket clients with their queue depth, drops and lag."""
+    return broadcaster.stats()
+
 @app.websocket("/ws/events")
-async def websocket_events_endpoint(websocket: WebSocket):
+async def websocket_events_endpoint(websocket: WebSocket, last_event_id: Optional[str] = None):
     await websocket.accept()
-    clients.add(websocket)
+    # Clients reconnecting with the last event_id they received get the missed events first
+    await event_bus.attach(websocket, last_event_id)
     logger.info("Client connected to /ws/events.") # No PII
     try:
         while True:
             # Keep the connection alive. Incoming messages are not expected for this broadcast endpoint.
             await websocket.receive_text()
     except WebSocketDisconnect:
-        clients.remove(websocket)
+        await broadcaster.unregister(websocket)
         logger.info("Client disconnected from events.") # No PII
     except Exception as e:
-        clients.remove(websocket)
+        await broadcaster.unregister(websocket)
         logger.error(f"WebSocket event error: {e}", exc_info=True) # No PII
         import traceback
         traceback.print_exc()
@@ -1070,6 +1094,7 @@ async def websocket_events_endpoint(websocket: WebSocket):
 async def websocket_log_endpoint(
     websocket: WebSocket,
     token: str = None,
+    last_event_id: Optional[str] = None,
     db: Session = Depends(get_db) # Inject the database session
 ):
     credentials_exception = HTTPException(
@@ -1090,22 +1115,22 @@ async def websocket_log_endpoint(
     user_id_for_logging = user.id if user else "UNKNOWN"
 
     await websocket.accept()
-    clients.add(websocket) # Add to the general clients set for broadcasting
+    await event_bus.attach(websocket, last_event_id) # Receives every broadcast event from now on
     logger.info(f"Client connected to /ws/logs. User ID: {user_id_for_logging}") # Redact username
     try:
-        # Send existing logs from the database
-        logs = db.query(AttackLog).order_by(AttackLog.timestamp.desc()).limit(100).all() # Limit to 100 for initial load
-        formatted_logs = [{"timestamp": log.timestamp.isoformat(), "ip": log.ip, "port": log.port, "data": log.data, "attack_type": log.attack_type, "confidence_score": log.confidence_score, "is_anomaly": log.is_anomaly, "anomaly_score": log.anomaly_score, "is_verified_threat": log.is_verified_threat, "is_blacklisted": log.is_blacklisted} for log in logs]
-        await websocket.send_json({"type": "initial_logs", "logs": formatted_logs})
+        if last_event_id is None:
+            # Send existing logs from the database, queued ahead of any newer broadcast
+            formatted_logs = fetch_log_page(db, limit=100)["logs"] # Limit to 100 for initial load
+            broadcaster.send(websocket, {"type": "initial_logs", "logs": formatted_logs})
 
         # Keep the connection alive. New logs will be broadcasted via broadcast_event
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
-        clients.remove(websocket)
+        await broadcaster.unregister(websocket)
         logger.info(f"Client disconnected from /ws/logs. User ID: {user_id_for_logging}") # Redact username
     except Exception as e:
-        clients.remove(websocket)
+        await broadcaster.unregister(websocket)
         import traceback
         logger.error(f"WebSocket log error: {e}", exc_info=True) # No PII
         traceback.print_exc()
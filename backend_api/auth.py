@@ -1,5 +1,5 @@
 from fastapi import Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 import os
 from enum import Enum
 from dotenv import load_dotenv # Import load_dotenv
@@ -15,7 +15,7 @@ import math # Import math for haversine_distance
 
 load_dotenv() # Load environment variables
 
-from backend_api.database import User, SessionLocal, SessionToken, RecoveryCode # Import the User model, SessionLocal, SessionToken, and RecoveryCode
+from backend_api.database import User, SessionLocal, SessionToken, RecoveryCode, get_db # Import the User model, SessionLocal, SessionToken, and RecoveryCode
 from backend_api.schemas import TokenData # Import TokenData schema
 
 # Password hashing
@@ -83,7 +83,8 @@ def calculate_anomaly_score(db: Session, user_id: int, ip_address: str, device_f
     return score
 
 
-import httpx # Import httpx
+from backend_api.geolocation import geolocation_service
+from backend_api.session_cache import session_cache
 
 def create_access_token(
     db: Session,
@@ -122,22 +123,15 @@ def create_access_token(
     latitude = None
     longitude = None
 
-    if ip_address and ip_address not in ["127.0.0.1", "localhost"]:
-        try:
-            # Use a synchronous httpx client here as create_access_token is not async
-            response = httpx.get(f"http://ip-api.com/json/{ip_address}")
-            response.raise_for_status()
-            geo_data = response.json()
-            if geo_data.get("status") == "success":
-                city = geo_data.get("city")
-                region = geo_data.get("regionName")
-                country = geo_data.get("country")
-                latitude = geo_data.get("lat")
-                longitude = geo_data.get("lon")
-        except httpx.RequestError as e:
-            print(f"Error fetching geolocation for IP {ip_address}: {e}")
-        except Exception as e:
-            print(f"Unexpected error processing geolocation for IP {ip_address}: {e}")
+    # Served from the shared geolocation cache; the /token handler has usually
+    # just looked this IP up for the anomaly check.
+    geo = geolocation_service.lookup(ip_address)
+    if geo:
+        city = geo.get("city")
+        region = geo.get("region")
+        country = geo.get("country")
+        latitude = geo.get("lat")
+        longitude = geo.get("lon")
 
     session_token = SessionToken(
         jti=jti,
@@ -199,7 +193,7 @@ def authenticate_user(db: Session, username: str, password: str, totp_code: Opti
 
     return user, None # Return user object and None for status
 
-async def get_current_user(request: Request, db: Session = Depends(lambda: SessionLocal())):
+async def get_current_user(request: Request, db: Session = Depends(get_db)):
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(
@@ -223,6 +217,11 @@ async def get_current_user(request: Request, db: Session = Depends(lambda: Sessi
         if username is None or user_role is None or jti is None:
             raise credentials_exception
 
+        # Sessions validated recently are served from the cache without touching the database
+        cached_user = session_cache.get(jti)
+        if cached_user is not None and cached_user.username == username:
+            return db.merge(cached_user, load=False)
+
         # Validate session token from database
         session_record = db.query(SessionToken).filter(SessionToken.jti == jti).first()
         if not session_record or not session_record.is_valid or session_record.revoked_at or session_record.expires_at < datetime.utcnow():
@@ -234,8 +233,16 @@ async def get_current_user(request: Request, db: Session = Depends(lambda: Sessi
     user = get_user(db, username=token_data.username)
     if user is None:
         raise credentials_exception
+    session_cache.put(jti, _detached_copy(user), session_record.expires_at)
     return user
 
+def _detached_copy(user: User) -> User:
+    # The cached row must not stay bound to this request's session; merge(load=False)
+    # attaches a copy of it to later sessions without a query.
+    copy = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+    make_transient_to_detached(copy)
+    return copy
+
 def has_role(required_roles: list[UserRole]):
     async def role_checker(current_user: User = Depends(get_current_user)):
         if current_user.role not in required_roles:
@@ -5,6 +5,7 @@ from urllib.parse import urlparse
 import requests
 from sqlalchemy.orm import Session
 from backend_api.database import Block as DBBlock # Alias to avoid name collision
+from blockchain_layer.sealing import ProofOfWorkSealer
 
 class Blockchain:
     def __init__(self, db: Session):
@@ -18,7 +19,6 @@ class Blockchain:
     def _load_chain_from_db(self):
         print(f"Blockchain _load_chain_from_db: Loading chain from DB for session {id(self.db)}.")
         db_blocks = self.db.query(DBBlock).order_by(DBBlock.index).all()
-        print(f"Blockchain _load_chain_from_db: Raw DB blocks found: {db_blocks}")
         chain = []
         for db_block in db_blocks:
             # Reconstruct Block objects from DBBlock
@@ -54,9 +54,6 @@ class Blockchain:
 
         while current_index < len(chain):
             block = chain[current_index]
-            print(f'{last_block}')
-            print(f'{block}')
-            print("\n-----------")
             # Check that the hash of the block is correct
             if block['previous_hash'] != self.hash(last_block):
                 return False
@@ -191,11 +188,7 @@ class Blockchain:
         :param last_proof: <int>
         :return: <int>
         """
-        proof = 0
-        while self.valid_proof(last_proof, proof) is False:
-            proof += 1
-
-        return proof
+        return ProofOfWorkSealer().find_proof(last_proof)
 
     @staticmethod
     def valid_proof(last_proof, proof):
@@ -205,6 +198,4 @@ class Blockchain:
         :param proof: <int> Current Proof
         :return: <bool> True if correct, False otherwise
         """
-        guess = f'{last_proof}{proof}'.encode()
-        guess_hash = hashlib.sha256(guess).hexdigest()
-        return guess_hash[:4] == "0000"
+        return ProofOfWorkSealer().valid_proof(last_proof, proof)
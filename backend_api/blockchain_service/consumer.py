@@ -1,68 +1,63 @@
 import pika
 import json
 import os
-import threading
-import time
 
-from blockchain_layer.blockchain import Blockchain
-from backend_api.database import get_db, Block, AttackLog # Import AttackLog model
+from backend_api.blockchain_service.sealer import BlockSealer, BLOCK_MAX_TRANSACTIONS, BLOCK_MAX_LATENCY_MS
+from blockchain_layer.blockchain import default_sealer
 
 rabbitmq_host = os.getenv("RABBITMQ_HOST", "localhost")
+DEAD_LETTER_QUEUE = "attack_logs.blockchain_dead" # batches that could not be sealed after BLOCK_SEAL_MAX_ATTEMPTS
 
 def main():
+    default_sealer() # fail at startup, not on the first block, when the sealing key is missing
     connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbitmq_host))
     channel = connection.channel()
 
     channel.queue_declare(queue='attack_logs')
+    channel.queue_declare(queue=DEAD_LETTER_QUEUE)
+    # Enough unacked messages to fill a block; they are acked once their block is committed
+    channel.basic_qos(prefetch_count=BLOCK_MAX_TRANSACTIONS)
+    bodies = {} # delivery tag -> body, until the message is sealed or dead-lettered
 
-    def callback(ch, method, properties, body):
-        message_data = json.loads(body.decode())
-        log_id = message_data.get("id")
-
-        print(f" [Blockchain Service] Received log entry with ID: {log_id}")
-
-        db = next(get_db()) # Get a database session
-        blockchain = Blockchain(db)
-
-        try:
-            # Fetch the AttackLog entry from the database
-            attack_log_entry = db.query(AttackLog).filter(AttackLog.id == log_id).first()
+    def ack_sealed(delivery_tags):
+        channel.basic_ack(delivery_tag=max(delivery_tags), multiple=True)
+        for delivery_tag in delivery_tags:
+            bodies.pop(delivery_tag, None)
 
-            if attack_log_entry:
-                # Add a new transaction to the blockchain using data from AttackLog
-                blockchain.new_transaction(
-                    sender="honeypot", # The agent is the sender
-                    recipient=attack_log_entry.ip,
-                    amount=1, # Placeholder, consider adding more meaningful data
-                    data=attack_log_entry.data, # Include the full data
-                    attack_type=attack_log_entry.attack_type, # Include predicted attack type
-                    confidence_score=attack_log_entry.confidence_score # Include confidence score
-                )
+    def dead_letter(delivery_tags):
+        # Kept for inspection and replay instead of being redelivered forever
+        for delivery_tag in delivery_tags:
+            channel.basic_publish(exchange='', routing_key=DEAD_LETTER_QUEUE, body=bodies.pop(delivery_tag))
+        channel.basic_ack(delivery_tag=max(delivery_tags), multiple=True)
 
-                # Mine a new block to record the transaction
-                last_block_obj = blockchain.last_block
-                last_proof = last_block_obj.proof if last_block_obj else 0
-                proof = blockchain.proof_of_work(last_proof)
-                previous_hash = blockchain.hash(last_block_obj.to_dict()) if last_block_obj else '1'
+    sealer = BlockSealer(on_sealed=ack_sealed, on_failed=dead_letter)
 
-                new_block_obj = blockchain.new_block(proof, previous_hash)
-                db.add(new_block_obj)
-                db.commit()
-                db.refresh(new_block_obj)
-                print(f" [Blockchain Service] New block mined: {new_block_obj.index}")
-            else:
-                print(f" [Blockchain Service] AttackLog with ID {log_id} not found. Cannot add to blockchain.")
+    def check_deadline():
+        if sealer.due():
+            sealer.seal()
+        connection.call_later(BLOCK_MAX_LATENCY_MS / 4000, check_deadline)
 
-        except Exception as e:
-            db.rollback()
-            print(f" [Blockchain Service] Error processing log entry for blockchain: {e}")
-        finally:
-            db.close()
-
-    channel.basic_consume(queue='attack_logs', on_message_callback=callback, auto_ack=True)
-
-    print(' [Blockchain Service] Waiting for messages. To exit press CTRL+C')
-    channel.start_consuming()
+    def callback(ch, method, properties, body):
+        try:
+            message_data = json.loads(body.decode())
+        except ValueError as e:
+            print(f" [Blockchain Service] Dropping undecodable message: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+        bodies[method.delivery_tag] = body
+        sealer.add(message_data.get("id"), method.delivery_tag)
+
+    channel.basic_consume(queue='attack_logs', on_message_callback=callback, auto_ack=False)
+    connection.call_later(BLOCK_MAX_LATENCY_MS / 4000, check_deadline)
+
+    print(f' [Blockchain Service] Sealing a block every {BLOCK_MAX_TRANSACTIONS} events or {BLOCK_MAX_LATENCY_MS} ms. To exit press CTRL+C')
+    try:
+        channel.start_consuming()
+    finally:
+        if connection.is_open:
+            # Unsealed messages would be redelivered anyway if the connection is gone
+            sealer.seal()
+            connection.close()
 
 if __name__ == '__main__':
     main()
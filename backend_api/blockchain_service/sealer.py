@@ -0,0 +1,134 @@
+import os
+import time
+from typing import Callable, Optional
+
+from blockchain_layer.blockchain import Blockchain
+from blockchain_layer.sealing import SealingStrategy
+from backend_api.database import SessionLocal, AttackLog, Block
+
+BLOCK_MAX_TRANSACTIONS = int(os.getenv("BLOCK_MAX_TRANSACTIONS", "500"))
+BLOCK_MAX_LATENCY_MS = int(os.getenv("BLOCK_MAX_LATENCY_MS", "2000")) # oldest pending event waits at most this long
+BLOCK_SEAL_MAX_ATTEMPTS = int(os.getenv("BLOCK_SEAL_MAX_ATTEMPTS", "5")) # then the batch is handed to on_failed
+BLOCK_SEAL_RETRY_BACKOFF_MS = int(os.getenv("BLOCK_SEAL_RETRY_BACKOFF_MS", "500")) # doubled after every failed attempt
+BLOCK_SEAL_MAX_BACKOFF_MS = 30000
+
+
+def attack_log_transaction(attack_log: AttackLog) -> dict:
+    """The ledger transaction for one attack log, in the shape of Blockchain.new_transaction."""
+    return {
+        'sender': "honeypot", # The agent is the sender
+        'recipient': attack_log.ip,
+        'amount': 1, # Placeholder, consider adding more meaningful data
+        'data': attack_log.data, # Include the full data
+        'attack_type': attack_log.attack_type, # Include predicted attack type
+        'confidence_score': attack_log.confidence_score, # Include confidence score
+    }
+
+
+class BlockSealer:
+    """
+    Collects attack log IDs and seals them into one block once max_transactions
+    are pending or the oldest has waited max_latency_ms, instead of mining a
+    block per event. Sealing, the commit and the Merkle root over the batch
+    (Blockchain.merkle_root, computed by new_block) are paid once per block.
+
+    on_sealed(tokens) gets the tokens passed to add() for every event in a
+    committed block, e.g. RabbitMQ delivery tags to acknowledge. If sealing
+    fails the events stay pending and are retried with exponential backoff;
+    after max_attempts failures the batch is dropped and its tokens go to
+    on_failed(tokens), e.g. to dead-letter the messages.
+    """
+
+    def __init__(self, session_factory=SessionLocal, max_transactions: int = BLOCK_MAX_TRANSACTIONS,
+                 max_latency_ms: int = BLOCK_MAX_LATENCY_MS, on_sealed: Optional[Callable[[list], None]] = None,
+                 sealing_strategy: Optional[SealingStrategy] = None, on_failed: Optional[Callable[[list], None]] = None,
+                 max_attempts: int = BLOCK_SEAL_MAX_ATTEMPTS, retry_backoff_ms: int = BLOCK_SEAL_RETRY_BACKOFF_MS):
+        self.session_factory = session_factory
+        self.sealing_strategy = sealing_strategy
+        self.max_transactions = max_transactions
+        self.max_latency_ms = max_latency_ms
+        self.on_sealed = on_sealed
+        self.on_failed = on_failed
+        self.max_attempts = max_attempts
+        self.retry_backoff_ms = retry_backoff_ms
+        self.pending = [] # (log_id, token)
+        self.oldest_at = None
+        self.attempts = 0 # failed seals of the pending batch
+        self.retry_at = None
+        self.blocks_sealed = 0
+        self.events_sealed = 0
+        self.events_failed = 0
+
+    def add(self, log_id: int, token=None) -> Optional[Block]:
+        if not self.pending:
+            self.oldest_at = time.monotonic()
+        self.pending.append((log_id, token))
+        if len(self.pending) >= self.max_transactions and not self._backing_off():
+            return self.seal()
+        return None
+
+    def due(self) -> bool:
+        if not self.pending or self._backing_off():
+            return False
+        return len(self.pending) >= self.max_transactions or (time.monotonic() - self.oldest_at) * 1000 >= self.max_latency_ms
+
+    def _backing_off(self) -> bool:
+        return self.retry_at is not None and time.monotonic() < self.retry_at
+
+    def seal(self) -> Optional[Block]:
+        """Seals and commits one block with every pending event. Returns it, or None if nothing was sealed."""
+        if not self.pending:
+            return None
+        batch = self.pending
+        db = self.session_factory()
+        try:
+            # A redelivered message repeats its log ID; it is still acked, but recorded once
+            log_ids = list(dict.fromkeys(log_id for log_id, _ in batch))
+            attack_logs = {attack_log.id: attack_log for attack_log in db.query(AttackLog).filter(AttackLog.id.in_(log_ids))}
+            found = [log_id for log_id in log_ids if log_id in attack_logs]
+            missing = len(log_ids) - len(found)
+            if missing:
+                print(f" [Blockchain Service] {missing} AttackLog entries not found. Cannot add them to blockchain.")
+
+            blockchain = Blockchain(db, sealer=self.sealing_strategy)
+            blockchain.current_transactions = [attack_log_transaction(attack_logs[log_id]) for log_id in found]
+            new_block_obj = None
+            if blockchain.current_transactions:
+                # Signed or mined according to BLOCKCHAIN_SEALER
+                new_block_obj = blockchain.seal_block()
+                db.commit()
+                db.refresh(new_block_obj)
+                db.expunge(new_block_obj)
+                self.blocks_sealed += 1
+                self.events_sealed += len(found)
+                print(f" [Blockchain Service] New block sealed: {new_block_obj.index} with {len(found)} transactions")
+        except Exception as e:
+            db.rollback()
+            self._failed(batch, e)
+            return None
+        finally:
+            db.close()
+
+        self._reset()
+        if self.on_sealed:
+            self.on_sealed([token for _, token in batch])
+        return new_block_obj
+
+    def _failed(self, batch: list, error: Exception):
+        self.attempts += 1
+        if self.attempts < self.max_attempts:
+            backoff_ms = min(self.retry_backoff_ms * 2 ** (self.attempts - 1), BLOCK_SEAL_MAX_BACKOFF_MS)
+            self.retry_at = time.monotonic() + backoff_ms / 1000
+            print(f" [Blockchain Service] Error sealing block of {len(batch)} log entries (attempt {self.attempts}): {error}. Retrying in {backoff_ms} ms")
+            return
+        print(f" [Blockchain Service] Giving up on block of {len(batch)} log entries after {self.attempts} attempts: {error}")
+        self.events_failed += len(batch)
+        self._reset()
+        if self.on_failed:
+            self.on_failed([token for _, token in batch])
+
+    def _reset(self):
+        self.pending = []
+        self.oldest_at = None
+        self.attempts = 0
+        self.retry_at = None
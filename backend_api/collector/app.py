@@ -1,20 +1,108 @@
-import pika
+import asyncio
 import json
 from fastapi import FastAPI, Request, HTTPException, Depends
+from fastapi.responses import JSONResponse
 import os
 import datetime
+from loguru import logger
+from sqlalchemy import insert
 from backend_api.database import get_db, AttackLog
+from backend_api.collector.publisher import AttackLogPublisher, PublisherBusy
 from sqlalchemy.orm import Session
 
+try:
+    import msgpack
+except ImportError: # msgpack is optional, JSON bodies work without it
+    msgpack = None
+
 app = FastAPI()
 
 rabbitmq_host = os.getenv("RABBITMQ_HOST", "localhost")
+MAX_BATCH_SIZE = int(os.getenv("COLLECTOR_MAX_BATCH_SIZE", "5000"))
+PUBLISH_QUEUE_SIZE = int(os.getenv("COLLECTOR_PUBLISH_QUEUE_SIZE", "20000"))
+PUBLISH_CONFIRM_TIMEOUT = float(os.getenv("COLLECTOR_PUBLISH_CONFIRM_TIMEOUT", "5"))
+RETRY_AFTER_SECONDS = int(os.getenv("COLLECTOR_RETRY_AFTER", "1"))
+
+publisher = AttackLogPublisher(rabbitmq_host, max_pending=PUBLISH_QUEUE_SIZE, retry_after=RETRY_AFTER_SECONDS)
+
+@app.on_event("startup")
+async def startup_event():
+    # The publisher thread connects lazily on the first publish, so a broker
+    # that comes up after the collector is not fatal.
+    publisher.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    publisher.stop()
+
+@app.exception_handler(PublisherBusy)
+async def publisher_busy_handler(request: Request, exc: PublisherBusy):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    return {"publisher": publisher.metrics()}
+
+async def publish_confirmed(messages: list[dict]) -> bool:
+    """
+    Publishes messages whose queue space was reserved and waits for the broker
+    to accept them. Returns False if that did not happen within the timeout;
+    the messages stay queued and are still published afterwards.
+    """
+    try:
+        await asyncio.wait_for(asyncio.shield(publisher.publish_batch(messages, reserved=True)), PUBLISH_CONFIRM_TIMEOUT)
+        return True
+    except asyncio.TimeoutError:
+        logger.warning(f"Broker confirm for {len(messages)} messages is taking longer than {PUBLISH_CONFIRM_TIMEOUT}s")
+        return False
+
+def to_message(log_id: int, log_data: dict, timestamp: datetime.datetime) -> dict:
+    return {
+        "id": log_id,
+        "ip": log_data.get("ip"),
+        "port": log_data.get("port"),
+        "data": log_data.get("data"),
+        "honeypot": log_data.get("honeypot"), # optional sensor name, used by the rollups
+        "timestamp": timestamp.isoformat() # ISO format for datetime
+    }
+
+async def parse_batch_body(request: Request) -> list[dict]:
+    """
+    Decodes a batch body. Accepts a JSON array (application/json), JSON lines
+    (application/x-ndjson) or a msgpack array (application/msgpack).
+    """
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    body = await request.body()
+    try:
+        if content_type in ("application/msgpack", "application/x-msgpack"):
+            if msgpack is None:
+                raise HTTPException(status_code=415, detail="msgpack is not installed on this collector")
+            entries = msgpack.unpackb(body, raw=False)
+        elif content_type in ("application/x-ndjson", "application/jsonl", "application/json-lines"):
+            entries = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            entries = json.loads(body)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not decode batch body: {e}")
+
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        raise HTTPException(status_code=400, detail="Batch body must be an array of log objects")
+    if len(entries) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds the maximum of {MAX_BATCH_SIZE} entries")
+    return entries
 
 @app.post("/logs/ingest")
 async def ingest_log_entry(
     request: Request,
     db: Session = Depends(get_db)
 ):
+    publisher.reserve(1) # Reject with 429/503 before writing anything
     try:
         log_data = await request.json()
 
@@ -23,30 +111,59 @@ async def ingest_log_entry(
             ip=log_data.get("ip"),
             port=log_data.get("port"),
             data=log_data.get("data"),
-            timestamp=datetime.datetime.now()
+            timestamp=datetime.datetime.utcnow()
         )
         db.add(new_log)
         db.commit()
         db.refresh(new_log) # Refresh to get the generated ID and timestamp
+    except Exception as e:
+        publisher.release(1)
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Prepare message to publish to RabbitMQ, including the log ID
-        message_to_publish = {
-            "id": new_log.id,
-            "ip": new_log.ip,
-            "port": new_log.port,
-            "data": new_log.data,
-            "timestamp": new_log.timestamp.isoformat() # ISO format for datetime
-        }
-
-        connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbitmq_host))
-        channel = connection.channel()
-        channel.queue_declare(queue='attack_logs')
-        channel.basic_publish(exchange='',
-                              routing_key='attack_logs',
-                              body=json.dumps(message_to_publish))
-        connection.close()
+    try:
+        # Hand the message to the publisher thread, including the log ID
+        confirmed = await publish_confirmed([to_message(new_log.id, log_data, new_log.timestamp)])
+        if not confirmed:
+            return JSONResponse(status_code=202, content={"message": "Log entry ingested, publish pending broker confirm", "log_id": new_log.id})
 
         return {"message": "Log entry ingested and published to RabbitMQ", "log_id": new_log.id}
     except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/logs/ingest/batch")
+async def ingest_log_batch(
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    entries = await parse_batch_body(request)
+    if not entries:
+        return {"message": "Empty batch", "log_ids": []}
+    publisher.reserve(len(entries)) # Reject with 429/503 before writing anything
+
+    try:
+        now = datetime.datetime.utcnow()
+        rows = [
+            {"ip": entry.get("ip"), "port": entry.get("port"), "data": entry.get("data"), "timestamp": now}
+            for entry in entries
+        ]
+        # One multi-row INSERT ... RETURNING for the whole batch, one commit
+        log_ids = db.scalars(
+            insert(AttackLog).returning(AttackLog.id, sort_by_parameter_order=True),
+            rows
+        ).all()
+        db.commit()
+    except Exception as e:
+        publisher.release(len(entries))
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+
+    try:
+        # The space is reserved, so committed rows are always handed to the publisher
+        confirmed = await publish_confirmed([to_message(log_id, entry, now) for log_id, entry in zip(log_ids, entries)])
+        if not confirmed:
+            return JSONResponse(status_code=202, content={"message": f"{len(log_ids)} log entries ingested, publish pending broker confirm", "log_ids": log_ids})
+
+        return {"message": f"{len(log_ids)} log entries ingested and published to RabbitMQ", "log_ids": log_ids}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
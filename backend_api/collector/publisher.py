@@ -0,0 +1,206 @@
+import asyncio
+import json
+import queue
+import threading
+import pika
+from loguru import logger
+
+
+class PublisherBusy(Exception):
+    """
+    Raised when the publisher cannot accept more messages right now.
+    status_code is 429 when the local queue is full and 503 when the broker is unreachable.
+    """
+    def __init__(self, detail: str, status_code: int, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AttackLogPublisher:
+    """
+    Publishes attack logs to RabbitMQ from a dedicated thread.
+
+    pika's BlockingConnection must not be driven from the event loop, so request
+    handlers hand their messages to a bounded in-memory queue and await an
+    asyncio future that resolves once the broker has accepted the batch. Each
+    batch is published in one AMQP transaction, so it costs a single round trip
+    to commit and a failed batch leaves nothing half-published. When the queue
+    is full the publisher refuses new work with PublisherBusy instead of letting
+    the backlog grow without bound.
+
+    Callers that write before publishing reserve() the capacity first and then
+    publish_batch(..., reserved=True), which cannot be refused any more.
+    """
+    def __init__(self, host: str, queue_name: str = "attack_logs", max_pending: int = 10000, retry_after: int = 1):
+        self.host = host
+        self.queue_name = queue_name
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.connection = None
+        self.channel = None
+        self._work = queue.Queue()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.connected = False
+        self.broker_unavailable = False
+        self.published_total = 0
+        self.failed_total = 0
+        self.rejected_total = 0
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="attack-log-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stops accepting work, drains what is queued and closes the connection."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._pending,
+            "queue_capacity": self.max_pending,
+            "broker_connected": self.connected,
+            "published_total": self.published_total,
+            "failed_total": self.failed_total,
+            "rejected_total": self.rejected_total,
+        }
+
+    def reserve(self, count: int = 1):
+        """
+        Claims queue space for `count` messages, before the caller writes anything,
+        or raises PublisherBusy. The caller must either publish them with
+        publish_batch(..., reserved=True) or give the space back with release().
+        """
+        if self._stopping.is_set():
+            self.rejected_total += count
+            raise PublisherBusy("Collector is shutting down", 503, self.retry_after)
+        if self.broker_unavailable:
+            self.rejected_total += count
+            raise PublisherBusy("Message broker is unavailable", 503, self.retry_after)
+        with self._lock:
+            if self._pending + count > self.max_pending:
+                self.rejected_total += count
+                raise PublisherBusy("Collector publish queue is full", 429, self.retry_after)
+            self._pending += count
+
+    def release(self, count: int = 1):
+        """Returns space claimed with reserve() for messages that will not be published."""
+        with self._lock:
+            self._pending -= count
+
+    async def publish(self, message: dict, reserved: bool = False):
+        return await self.publish_batch([message], reserved=reserved)
+
+    async def publish_batch(self, messages: list[dict], reserved: bool = False) -> int:
+        """Queues the messages and waits for the broker to accept all of them."""
+        if not reserved:
+            self.reserve(len(messages))
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._work.put((messages, loop, future))
+        return await future
+
+    def _run(self):
+        while True:
+            try:
+                messages, loop, future = self._work.get(timeout=1)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    break
+                self._keepalive()
+                continue
+
+            try:
+                self._publish_with_retry(messages)
+                self.broker_unavailable = False
+                self.published_total += len(messages)
+                loop.call_soon_threadsafe(_resolve, future, len(messages))
+            except Exception as e:
+                if isinstance(e, pika.exceptions.AMQPConnectionError):
+                    self.broker_unavailable = True
+                self.failed_total += len(messages)
+                logger.error(f"Collector publisher failed to publish {len(messages)} messages: {e}")
+                loop.call_soon_threadsafe(_reject, future, e)
+            finally:
+                with self._lock:
+                    self._pending -= len(messages)
+        self._close()
+
+    def _connect(self):
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+        self.channel = self.connection.channel()
+        self.channel.queue_declare(queue=self.queue_name)
+        self.channel.tx_select()
+        self.connected = True
+        logger.info(f"Collector publisher connected to RabbitMQ at {self.host}, queue '{self.queue_name}'")
+
+    def _publish_with_retry(self, messages: list[dict]):
+        try:
+            if self.channel is None or self.channel.is_closed or self.connection.is_closed:
+                self._connect()
+            self._publish_all(messages)
+        except (pika.exceptions.AMQPConnectionError, pika.exceptions.AMQPChannelError):
+            logger.warning("Collector publisher lost its RabbitMQ channel, reconnecting")
+            self._close()
+            self._connect()
+            self._publish_all(messages)
+
+    def _publish_all(self, messages: list[dict]):
+        # basic_publish does not wait in transaction mode; tx_commit is the one
+        # round trip per batch, and returns once the broker has taken all of it.
+        # If the channel fails first, the uncommitted messages are discarded and
+        # the retry publishes the whole batch again without duplicates.
+        for message in messages:
+            self.channel.basic_publish(exchange='',
+                                       routing_key=self.queue_name,
+                                       body=json.dumps(message))
+        self.channel.tx_commit()
+
+    def _keepalive(self):
+        # Services heartbeats while idle so the broker does not drop the connection,
+        # and probes a broker we lost so reserve stops returning 503.
+        if self.connection is None or self.connection.is_closed:
+            if self.broker_unavailable:
+                try:
+                    self._connect()
+                    self.broker_unavailable = False
+                except pika.exceptions.AMQPConnectionError:
+                    pass
+            return
+        try:
+            self.connection.process_data_events(time_limit=0)
+        except Exception as e:
+            logger.warning(f"Collector publisher heartbeat failed: {e}")
+            self._close()
+
+    def _close(self):
+        try:
+            if self.connection is not None and self.connection.is_open:
+                self.connection.close()
+        except Exception as e:
+            logger.error(f"Error closing collector publisher connection: {e}")
+        finally:
+            self.connection = None
+            self.channel = None
+            self.connected = False
+
+
+def _resolve(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+def _reject(future: asyncio.Future, exc: Exception):
+    if not future.done():
+        future.set_exception(exc)
@@ -0,0 +1,116 @@
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend_api.collector.app import app
+from backend_api.collector.publisher import AttackLogPublisher, PublisherBusy
+from backend_api.database import Base, AttackLog, get_db
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def client(db_session):
+    mock_publisher = MagicMock(spec=AttackLogPublisher)
+    app.dependency_overrides[get_db] = lambda: db_session
+    with patch("backend_api.collector.app.publisher", new=mock_publisher):
+        yield TestClient(app), mock_publisher
+    app.dependency_overrides.clear()
+
+
+def test_batch_ingest_json_array(client, db_session):
+    test_client, publisher = client
+    entries = [{"ip": f"10.0.0.{i}", "port": 22, "data": "ssh probe"} for i in range(5)]
+
+    response = test_client.post("/logs/ingest/batch", json=entries)
+
+    assert response.status_code == 200
+    log_ids = response.json()["log_ids"]
+    assert len(log_ids) == 5
+    assert db_session.query(AttackLog).count() == 5
+    published = publisher.publish_batch.call_args[0][0]
+    assert [message["id"] for message in published] == log_ids
+    assert [message["ip"] for message in published] == [entry["ip"] for entry in entries]
+
+
+def test_batch_ingest_json_lines(client, db_session):
+    test_client, publisher = client
+    body = "\n".join(json.dumps({"ip": "10.0.0.1", "port": 23, "data": f"telnet {i}"}) for i in range(3))
+
+    response = test_client.post("/logs/ingest/batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    assert len(response.json()["log_ids"]) == 3
+    publisher.publish_batch.assert_called_once()
+
+
+def test_batch_ingest_rejects_non_array(client):
+    test_client, publisher = client
+    response = test_client.post("/logs/ingest/batch", json={"ip": "10.0.0.1"})
+    assert response.status_code == 400
+    publisher.publish_batch.assert_not_called()
+
+
+def test_full_publish_queue_returns_429_without_writing(db_session):
+    full_publisher = AttackLogPublisher("localhost", max_pending=0, retry_after=3)
+    app.dependency_overrides[get_db] = lambda: db_session
+    try:
+        with patch("backend_api.collector.app.publisher", new=full_publisher):
+            response = TestClient(app).post("/logs/ingest/batch", json=[{"ip": "10.0.0.1", "port": 22, "data": "x"}])
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+    assert db_session.query(AttackLog).count() == 0
+    assert full_publisher.metrics()["rejected_total"] == 1
+
+
+def test_reserved_capacity_is_released_when_the_write_fails(client, db_session):
+    test_client, publisher = client
+    with patch.object(db_session, "commit", side_effect=RuntimeError("disk full")):
+        response = test_client.post("/logs/ingest/batch", json=[{"ip": "10.0.0.1", "port": 22, "data": "x"}] * 3)
+    assert response.status_code == 500
+    publisher.reserve.assert_called_once_with(3)
+    publisher.release.assert_called_once_with(3)
+    publisher.publish_batch.assert_not_called()
+
+
+def test_reservation_holds_queue_space_until_published():
+    publisher = AttackLogPublisher("localhost", max_pending=2)
+    publisher.reserve(2)
+    with pytest.raises(PublisherBusy):
+        publisher.reserve(1)
+    publisher.release(1)
+    publisher.reserve(1)
+    assert publisher.pending == 2
+
+    publisher.stop()
+    publisher.release(2)
+    with pytest.raises(PublisherBusy) as busy:
+        publisher.reserve(1)
+    assert busy.value.status_code == 503
+
+
+def test_batch_is_committed_in_one_transaction():
+    publisher = AttackLogPublisher("localhost")
+    publisher.channel = MagicMock()
+    publisher._publish_all([{"id": i} for i in range(5)])
+    assert publisher.channel.basic_publish.call_count == 5
+    publisher.channel.tx_commit.assert_called_once()
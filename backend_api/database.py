@@ -1,14 +1,64 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Float, ForeignKey
+from sqlalchemy import create_engine, event, text, Column, Integer, String, DateTime, Boolean, Float, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import datetime
+import os
 import time
 import hashlib
 import json
 
-DATABASE_URL = "sqlite:///./backend_api/test.db"
+# e.g. postgresql+psycopg2://phantomnet:secret@db:5432/phantomnet for production
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./backend_api/test.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# PostgreSQL profile
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10")) # per process
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30")) # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800")) # seconds
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+# SQLite profile, for single-box installs
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))) # bytes
+
+def create_db_engine(url: str = DATABASE_URL):
+    """
+    Creates the engine for DATABASE_URL with settings for its backend.
+
+    PostgreSQL gets a sized QueuePool, pre-ping to survive server restarts and a
+    server-side statement timeout. SQLite runs in WAL mode with synchronous=NORMAL,
+    so readers no longer block the writer, and a busy timeout, so the services
+    writing to the same file wait for the write lock instead of failing.
+    """
+    backend = make_url(url).get_backend_name()
+    if backend == "postgresql":
+        return create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+            connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"},
+        )
+    if backend == "sqlite":
+        sqlite_engine = create_engine(
+            url, connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        )
+        event.listen(sqlite_engine, "connect", _set_sqlite_pragmas)
+        return sqlite_engine
+    return create_engine(url, pool_pre_ping=True)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL") # Ignored by in-memory databases
+    cursor.execute("PRAGMA synchronous=NORMAL") # Durable in WAL mode except on power loss
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -61,6 +111,32 @@ class AttackLog(Base):
     is_verified_threat = Column(Boolean, default=False)
     is_blacklisted = Column(Boolean, default=False)
 
+    # Existing databases get these through `python -m backend_api.db_maintenance migrate`
+    __table_args__ = (
+        Index("ix_attack_logs_ip_timestamp", "ip", "timestamp"), # repeated-attack checks per IP
+        Index("ix_attack_logs_timestamp_id", "timestamp", "id"), # newest-first listings and paging
+        Index("ix_attack_logs_anomalies", "timestamp", postgresql_where=text("is_anomaly"), sqlite_where=text("is_anomaly")), # security alerts
+    )
+
+class AttackRollup(Base):
+    """Attack counters per time bucket, maintained by the analyzer (see backend_api.rollups)."""
+    __tablename__ = "attack_rollups"
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String, nullable=False) # "minute", "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False)
+    # Dimensions are never NULL, so the unique key below also matches unknown values
+    attack_type = Column(String, nullable=False)
+    port = Column(Integer, nullable=False)
+    country = Column(String, nullable=False)
+    honeypot = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    anomaly_count = Column(Integer, nullable=False, default=0)
+    sum_confidence = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "attack_type", "port", "country", "honeypot", name="uq_attack_rollups_bucket"),
+    )
+
 class BlacklistedIP(Base):
     __tablename__ = "blacklisted_ips"
     id = Column(Integer, primary_key=True, index=True)
@@ -85,9 +161,12 @@ class Block(Base):
     hash = Column(String, unique=True, nullable=False)
     proof = Column(Integer, nullable=False)
     merkle_root = Column(String, nullable=True)
+    # Set by the sealing strategies of blockchain_layer.sealing; NULL on older proof-of-work blocks
+    signature = Column(String, nullable=True)
+    sealer = Column(String, nullable=True)
 
     def to_dict(self):
-        return {
+        block = {
             "id": self.id,
             "index": self.index,
             "timestamp": self.timestamp.isoformat(),
@@ -97,6 +176,21 @@ class Block(Base):
             "proof": self.proof,
             "merkle_root": self.merkle_root
         }
+        # Omitted when unset so the hashes of blocks sealed before these columns existed stay the same
+        if self.signature is not None:
+            block["signature"] = self.signature
+        if self.sealer is not None:
+            block["sealer"] = self.sealer
+        return block
+
+class ChainCheckpoint(Base):
+    """A verified prefix of the chain: blocks up to block_index were valid when verified_at."""
+    __tablename__ = "chain_checkpoints"
+    id = Column(Integer, primary_key=True, index=True)
+    block_index = Column(Integer, unique=True, nullable=False)
+    block_hash = Column(String, nullable=False) # Blockchain.hash of the block, i.e. the next block's previous_hash
+    authority_sealed = Column(Boolean, nullable=False, default=False) # whether a signed block was seen up to here
+    verified_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 class Agent(Base):
     __tablename__ = "agents"
@@ -0,0 +1,222 @@
+"""
+Schema migrations and storage maintenance for `attack_logs`.
+
+    python -m backend_api.db_maintenance migrate
+        Adds the AttackLog indexes and the Block seal columns to an existing
+        database. Safe to re-run; on PostgreSQL the indexes are built
+        CONCURRENTLY so ingest keeps going. Prints the last unsigned block,
+        the BLOCKCHAIN_LEGACY_POW_UNTIL to set before leaving proof of work.
+
+    python -m backend_api.db_maintenance partition
+        PostgreSQL only, run once: turns attack_logs into a table partitioned
+        by day on `timestamp`. The existing rows stay where they are, attached
+        as the `attack_logs_legacy` partition.
+
+    python -m backend_api.db_maintenance maintain --retention-days 90 [--interval 3600]
+        PostgreSQL only: creates the partitions for the coming days and drops
+        the daily partitions older than the retention period. Dropping a
+        partition is a metadata change, unlike a DELETE over millions of rows.
+        With --interval it keeps running and repeats every N seconds.
+"""
+import argparse
+import datetime
+import re
+import time
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from backend_api.database import engine as default_engine, AttackLog, Block
+
+PARTITION_PREFIX = "attack_logs_p"
+PARTITION_NAME = re.compile(r"^attack_logs_p(\d{8})$")
+PARTITION_DAYS_AHEAD = 7
+
+
+def create_attack_log_indexes(engine=default_engine) -> list[str]:
+    """Creates the AttackLog indexes that are missing. Returns the names of the ones created."""
+    inspector = inspect(engine)
+    if not inspector.has_table(AttackLog.__tablename__):
+        AttackLog.__table__.create(engine)
+        return [index.name for index in AttackLog.__table__.indexes]
+    existing = {index["name"] for index in inspector.get_indexes(AttackLog.__tablename__)}
+    missing = [index for index in AttackLog.__table__.indexes if index.name not in existing]
+    if not missing:
+        return []
+    if engine.dialect.name == "postgresql":
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            # Not supported on partitioned tables, where the index is built per partition anyway
+            concurrently = not _is_partitioned(connection)
+            for index in missing:
+                ddl = str(CreateIndex(index).compile(dialect=engine.dialect))
+                if concurrently:
+                    ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+                connection.execute(text(ddl))
+    else:
+        with engine.begin() as connection:
+            for index in missing:
+                index.create(connection)
+    return [index.name for index in missing]
+
+
+def add_block_seal_columns(engine=default_engine) -> list[str]:
+    """Adds the nullable Block columns that older databases lack. Returns the names of the ones added."""
+    inspector = inspect(engine)
+    if not inspector.has_table(Block.__tablename__):
+        return []
+    existing = {column["name"] for column in inspector.get_columns(Block.__tablename__)}
+    missing = [column for column in (Block.__table__.c.signature, Block.__table__.c.sealer) if column.name not in existing]
+    with engine.begin() as connection:
+        for column in missing:
+            column_type = column.type.compile(dialect=engine.dialect)
+            connection.execute(text(f'ALTER TABLE {Block.__tablename__} ADD COLUMN "{column.name}" {column_type}'))
+    return [column.name for column in missing]
+
+
+def last_unsigned_block_index(engine=default_engine):
+    """The highest block index without a signature, i.e. the BLOCKCHAIN_LEGACY_POW_UNTIL for this chain."""
+    with engine.connect() as connection:
+        return connection.execute(text(f"SELECT MAX(\"index\") FROM {Block.__tablename__} WHERE signature IS NULL")).scalar()
+
+
+def _is_partitioned(connection) -> bool:
+    return bool(connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('attack_logs')"
+    )).scalar())
+
+
+def partition_name(day: datetime.date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def partition_day(name: str):
+    """The day covered by a daily partition, or None for other tables (e.g. attack_logs_legacy)."""
+    match = PARTITION_NAME.match(name)
+    return datetime.datetime.strptime(match.group(1), "%Y%m%d").date() if match else None
+
+
+def partition_attack_logs(engine=default_engine, today: datetime.date = None):
+    """Converts attack_logs into a table range-partitioned by day. PostgreSQL only; no-op if already done."""
+    _require_postgresql(engine)
+    today = today or datetime.datetime.utcnow().date()
+    with engine.begin() as connection:
+        if _is_partitioned(connection):
+            return
+        pkey = connection.execute(text(
+            "SELECT conname FROM pg_constraint WHERE conrelid = 'attack_logs'::regclass AND contype = 'p'"
+        )).scalar()
+        legacy_upper = today + datetime.timedelta(days=1)
+        statements = [
+            "ALTER TABLE attack_logs RENAME TO attack_logs_legacy",
+            # A partitioned table's primary key must contain the partition key
+            f'ALTER TABLE attack_logs_legacy DROP CONSTRAINT "{pkey}"' if pkey else None,
+            "UPDATE attack_logs_legacy SET timestamp = now() AT TIME ZONE 'utc' WHERE timestamp IS NULL",
+            "ALTER TABLE attack_logs_legacy ALTER COLUMN timestamp SET NOT NULL",
+            "CREATE TABLE attack_logs (LIKE attack_logs_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)",
+            "ALTER TABLE attack_logs ADD PRIMARY KEY (id, timestamp)",
+            # Keep the id sequence alive when the legacy partition is dropped one day
+            "ALTER SEQUENCE IF EXISTS attack_logs_id_seq OWNED BY attack_logs.id",
+            f"ALTER TABLE attack_logs ATTACH PARTITION attack_logs_legacy FOR VALUES FROM (MINVALUE) TO ('{legacy_upper.isoformat()}')",
+            # Catches rows outside the precreated days instead of failing the insert
+            "CREATE TABLE attack_logs_default PARTITION OF attack_logs DEFAULT",
+        ]
+        for statement in statements:
+            if statement:
+                connection.execute(text(statement))
+        # Indexes on the legacy table keep their names; recreate them on the parent so new partitions get them
+        for index in AttackLog.__table__.indexes:
+            connection.execute(text(f'ALTER INDEX IF EXISTS "{index.name}" RENAME TO "{index.name}_legacy"'))
+            index.create(connection)
+    ensure_attack_log_partitions(engine, start=legacy_upper)
+
+
+def ensure_attack_log_partitions(engine=default_engine, days_ahead: int = PARTITION_DAYS_AHEAD, start: datetime.date = None) -> list[str]:
+    """Creates the daily partitions from `start` (default today) through `days_ahead` days ahead."""
+    _require_postgresql(engine)
+    start = start or datetime.datetime.utcnow().date()
+    end = datetime.datetime.utcnow().date() + datetime.timedelta(days=days_ahead)
+    created = []
+    with engine.begin() as connection:
+        existing = _partitions(connection)
+        day = start
+        while day <= end:
+            name = partition_name(day)
+            if name not in existing and not _covered_by_legacy(connection, day):
+                connection.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF attack_logs "
+                    f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + datetime.timedelta(days=1)).isoformat()}')"
+                ))
+                created.append(name)
+            day += datetime.timedelta(days=1)
+    return created
+
+
+def drop_expired_attack_log_partitions(engine=default_engine, retention_days: int = 90, today: datetime.date = None) -> list[str]:
+    """Drops the daily partitions whose whole day is older than the retention period."""
+    _require_postgresql(engine)
+    cutoff = (today or datetime.datetime.utcnow().date()) - datetime.timedelta(days=retention_days)
+    dropped = []
+    with engine.begin() as connection:
+        for name in sorted(_partitions(connection)):
+            day = partition_day(name)
+            if day is not None and day < cutoff:
+                connection.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+    return dropped
+
+
+def _partitions(connection) -> set[str]:
+    return set(connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'attack_logs'::regclass"
+    )).scalars())
+
+
+def _covered_by_legacy(connection, day: datetime.date) -> bool:
+    # The legacy partition covers everything before the day the table was partitioned
+    bound = connection.execute(text(
+        "SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_class c WHERE c.relname = 'attack_logs_legacy'"
+    )).scalar()
+    match = re.search(r"TO \('(\d{4}-\d{2}-\d{2})", bound or "")
+    return bool(match) and day < datetime.date.fromisoformat(match.group(1))
+
+
+def _require_postgresql(engine):
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError(f"Partitioning needs PostgreSQL, but DATABASE_URL uses {engine.dialect.name}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="attack_logs migrations and partition maintenance.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="Create missing AttackLog indexes and Block columns")
+    subparsers.add_parser("partition", help="Convert attack_logs to daily partitions (PostgreSQL)")
+    maintain = subparsers.add_parser("maintain", help="Create upcoming and drop expired partitions (PostgreSQL)")
+    maintain.add_argument("--retention-days", type=int, default=90)
+    maintain.add_argument("--days-ahead", type=int, default=PARTITION_DAYS_AHEAD)
+    maintain.add_argument("--interval", type=float, default=0, help="Repeat every N seconds instead of running once")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        print(f"Created indexes: {create_attack_log_indexes() or 'none, already up to date'}")
+        print(f"Added block columns: {add_block_seal_columns() or 'none, already up to date'}")
+        legacy_until = last_unsigned_block_index() if inspect(default_engine).has_table(Block.__tablename__) else None
+        if legacy_until is not None:
+            print(f"Blocks up to {legacy_until} are proof of work: set BLOCKCHAIN_LEGACY_POW_UNTIL={legacy_until} "
+                  "before switching BLOCKCHAIN_SEALER to hmac or ed25519.")
+    elif args.command == "partition":
+        partition_attack_logs()
+        print("attack_logs is partitioned by day.")
+    else:
+        while True:
+            created = ensure_attack_log_partitions(days_ahead=args.days_ahead)
+            dropped = drop_expired_attack_log_partitions(retention_days=args.retention_days)
+            print(f"Created partitions: {created}. Dropped partitions: {dropped}.")
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import asyncio
+import ipaddress
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+import httpx
+import redis
+from loguru import logger
+
+from backend_api.ttl_cache import MISSING, TTLCache
+
+try:
+    import geoip2.database
+except ImportError: # The offline MaxMind reader is optional
+    geoip2 = None
+
+GEO_CACHE_SIZE = int(os.getenv("GEO_CACHE_SIZE", "100000"))
+GEO_CACHE_TTL = int(os.getenv("GEO_CACHE_TTL", "86400")) # seconds
+GEO_NEGATIVE_TTL = int(os.getenv("GEO_NEGATIVE_TTL", "300")) # seconds, for IPs the upstream could not resolve
+GEO_RATE_LIMIT = int(os.getenv("GEO_RATE_LIMIT", "45")) # ip-api.com free tier: 45 requests per minute
+GEOIP_DB_PATH = os.getenv("GEOIP_DB_PATH") # Optional MaxMind GeoLite2-City .mmdb file
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+GEO_REDIS_TIMEOUT = float(os.getenv("GEO_REDIS_TIMEOUT", "0.5")) # seconds; a slow cache must not stall lookups
+
+
+def fetch_ip_api(ip_address: str) -> Optional[dict]:
+    """Queries ip-api.com. Returns None if the IP could not be resolved."""
+    response = httpx.get(f"http://ip-api.com/json/{ip_address}", timeout=5)
+    response.raise_for_status()
+    data = response.json()
+    if data.get("status") != "success":
+        return None
+    return {
+        "city": data.get("city"),
+        "region": data.get("regionName"),
+        "country": data.get("country"),
+        "lat": data.get("lat"),
+        "lon": data.get("lon"),
+    }
+
+
+class GeoLocationService:
+    """
+    Shared IP geolocation lookup used by the analyzer, auth and the gateway.
+
+    Lookups go through an in-process TTL/LRU cache, then an optional offline
+    MaxMind database, then Redis (shared across processes), and only then the
+    upstream API. Concurrent lookups for the same IP wait on a single upstream
+    request, and upstream requests are rate limited. When the limit is reached
+    the lookup returns None instead of blocking.
+    """
+
+    def __init__(self, redis_client=None, fetcher: Callable[[str], Optional[dict]] = fetch_ip_api,
+                 cache_size: int = GEO_CACHE_SIZE, ttl: int = GEO_CACHE_TTL, negative_ttl: int = GEO_NEGATIVE_TTL,
+                 rate_limit: int = GEO_RATE_LIMIT, offline_db_path: Optional[str] = GEOIP_DB_PATH):
+        self.redis_client = redis_client
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.rate_limit = rate_limit
+        self.cache = TTLCache(cache_size, ttl)
+        self.offline_reader = self._open_offline_reader(offline_db_path)
+        self._inflight = {} # ip -> threading.Event of the request already in flight
+        self._inflight_lock = threading.Lock()
+        self._tokens = float(rate_limit)
+        self._tokens_updated = time.monotonic()
+        self._rate_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _open_offline_reader(path: Optional[str]):
+        if not path:
+            return None
+        if geoip2 is None:
+            logger.warning(f"GEOIP_DB_PATH is set to {path} but geoip2 is not installed; offline lookups disabled.")
+            return None
+        try:
+            return geoip2.database.Reader(path)
+        except Exception as e:
+            logger.error(f"Could not open offline geolocation database {path}: {e}")
+            return None
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "cached_entries": len(self.cache),
+        }
+
+    def lookup(self, ip_address: str) -> Optional[dict]:
+        """Returns {"city", "region", "country", "lat", "lon"} for a public IP, or None."""
+        if not _is_public_ip(ip_address):
+            return None
+
+        cached = self.cache.get(ip_address)
+        if cached is not MISSING:
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        geo = self._lookup_offline(ip_address)
+        if geo is not None:
+            self.cache.set(ip_address, geo)
+            return geo
+
+        geo = self._lookup_redis(ip_address)
+        if geo is not MISSING:
+            self.cache.set(ip_address, geo, ttl=self.ttl if geo else self.negative_ttl)
+            return geo
+
+        return self._lookup_upstream_once(ip_address)
+
+    async def alookup(self, ip_address: str) -> Optional[dict]:
+        """Async variant for request handlers; a cache hit never leaves the event loop."""
+        cached = self.cache.get(ip_address)
+        if cached is not MISSING:
+            self.hits += 1
+            return cached
+        return await asyncio.to_thread(self.lookup, ip_address)
+
+    def _lookup_offline(self, ip_address: str) -> Optional[dict]:
+        if self.offline_reader is None:
+            return None
+        try:
+            record = self.offline_reader.city(ip_address)
+        except Exception:
+            return None
+        return {
+            "city": record.city.name,
+            "region": record.subdivisions.most_specific.name,
+            "country": record.country.name,
+            "lat": record.location.latitude,
+            "lon": record.location.longitude,
+        }
+
+    def _lookup_redis(self, ip_address: str):
+        if self.redis_client is None:
+            return MISSING
+        try:
+            raw = self.redis_client.get(f"geo:{ip_address}")
+        except redis.RedisError as e:
+            logger.warning(f"Geolocation Redis cache unavailable: {e}")
+            return MISSING
+        if raw is None:
+            return MISSING
+        return json.loads(raw)
+
+    def _lookup_upstream_once(self, ip_address: str) -> Optional[dict]:
+        # Collapse concurrent lookups for the same IP into a single upstream request
+        with self._inflight_lock:
+            event = self._inflight.get(ip_address)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._inflight[ip_address] = event
+        if not leader:
+            event.wait(timeout=10)
+            cached = self.cache.get(ip_address)
+            return None if cached is MISSING else cached
+
+        try:
+            return self._lookup_upstream(ip_address)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[ip_address]
+            event.set()
+
+    def _lookup_upstream(self, ip_address: str) -> Optional[dict]:
+        if not self._acquire_upstream_token():
+            logger.warning(f"Geolocation rate limit reached, skipping lookup for {ip_address}")
+            return None
+        try:
+            geo = self.fetcher(ip_address)
+        except Exception as e:
+            logger.error(f"Error fetching geolocation for IP {ip_address}: {e}")
+            return None
+
+        ttl = self.ttl if geo else self.negative_ttl
+        self.cache.set(ip_address, geo, ttl=ttl)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.setex(f"geo:{ip_address}", ttl, json.dumps(geo))
+            except redis.RedisError as e:
+                logger.warning(f"Could not store geolocation in Redis: {e}")
+        return geo
+
+    def _acquire_upstream_token(self) -> bool:
+        # The upstream limit is per source IP, so it is shared by every process
+        # through a per-minute Redis counter when Redis is reachable.
+        if self.redis_client is not None:
+            try:
+                key = f"geo:ratelimit:{int(time.time() // 60)}"
+                pipe = self.redis_client.pipeline()
+                pipe.incr(key)
+                pipe.expire(key, 60)
+                count, _ = pipe.execute()
+                return count <= self.rate_limit
+            except redis.RedisError:
+                pass
+        with self._rate_lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._tokens_updated) * self.rate_limit / 60.0)
+            self._tokens_updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+def _is_public_ip(ip_address: Optional[str]) -> bool:
+    if not ip_address:
+        return False
+    try:
+        ip = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return False
+    return ip.is_global
+
+
+geolocation_service = GeoLocationService(redis_client=redis.Redis.from_url(
+    REDIS_URL, socket_connect_timeout=GEO_REDIS_TIMEOUT, socket_timeout=GEO_REDIS_TIMEOUT
+))
@@ -0,0 +1,104 @@
+import ipaddress
+from typing import Iterable
+
+from loguru import logger
+
+from backend_api.database import SessionLocal, BlacklistedIP
+
+BLACKLIST_CHANNEL = "blacklist-updates"
+
+
+class IPBlacklist:
+    """
+    In-process copy of the `blacklisted_ips` table for the gateway middleware.
+
+    Entries are single addresses or CIDR blocks. Single addresses live in a set;
+    blocks are grouped by (IP version, prefix length) and stored as the network
+    prefix integer, so a lookup costs one set probe per distinct prefix length
+    instead of a database query. The table is loaded once at startup and kept in
+    sync through the BLACKLIST_CHANNEL pub/sub messages sent by admin.py.
+    """
+
+    def __init__(self):
+        self._addresses = set()
+        self._networks = {} # (version, prefixlen) -> set of network prefixes
+
+    def __len__(self):
+        return len(self._addresses) + sum(len(prefixes) for prefixes in self._networks.values())
+
+    def replace(self, entries: Iterable[str]):
+        addresses, networks = set(), {}
+        for entry in entries:
+            self._insert(entry, addresses, networks)
+        # Swap in one step so concurrent lookups never see a half-built list
+        self._addresses, self._networks = addresses, networks
+
+    def load(self, db):
+        self.replace(ip_address for (ip_address,) in db.query(BlacklistedIP.ip_address))
+        logger.info(f"Loaded {len(self)} blacklisted IP entries.")
+
+    def reload(self):
+        db = SessionLocal()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+    def add(self, entry: str):
+        self._insert(entry, self._addresses, self._networks)
+
+    def remove(self, entry: str):
+        parsed = self._parse(entry)
+        if isinstance(parsed, ipaddress._BaseNetwork):
+            self._networks.get((parsed.version, parsed.prefixlen), set()).discard(self._prefix(parsed.network_address, parsed.prefixlen))
+        elif parsed is not None:
+            self._addresses.discard(parsed)
+
+    def apply_update(self, update: dict):
+        """Handles a BLACKLIST_CHANNEL message: {"action": "add" | "remove" | "reload", "ip_address": ...}."""
+        action = update.get("action")
+        if action == "add":
+            self.add(update["ip_address"])
+        elif action == "remove":
+            self.remove(update["ip_address"])
+        else:
+            self.reload()
+
+    def contains(self, ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        if address in self._addresses:
+            return True
+        for (version, prefixlen), prefixes in self._networks.items():
+            if version == address.version and self._prefix(address, prefixlen) in prefixes:
+                return True
+        return False
+
+    @staticmethod
+    def _prefix(address, prefixlen: int) -> int:
+        return int(address) >> (address.max_prefixlen - prefixlen)
+
+    @staticmethod
+    def _parse(entry: str):
+        try:
+            if "/" in entry:
+                network = ipaddress.ip_network(entry.strip(), strict=False)
+                if network.prefixlen < network.max_prefixlen:
+                    return network
+                return network.network_address
+            return ipaddress.ip_address(entry.strip())
+        except ValueError:
+            logger.warning(f"Ignoring invalid blacklist entry: {entry}")
+            return None
+
+    def _insert(self, entry: str, addresses: set, networks: dict):
+        parsed = self._parse(entry)
+        if isinstance(parsed, ipaddress._BaseNetwork):
+            networks.setdefault((parsed.version, parsed.prefixlen), set()).add(self._prefix(parsed.network_address, parsed.prefixlen))
+        elif parsed is not None:
+            addresses.add(parsed)
+
+
+ip_blacklist = IPBlacklist()
@@ -0,0 +1,104 @@
+import base64
+import json
+from datetime import datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import and_, or_, select
+
+from backend_api.database import AttackLog
+
+LOG_FIELDS = [
+    "id", "timestamp", "ip", "port", "data", "attack_type", "confidence_score",
+    "is_anomaly", "anomaly_score", "is_verified_threat", "is_blacklisted",
+]
+EXPORT_YIELD_PER = 1000 # rows fetched from the database cursor at a time
+
+
+def encode_cursor(timestamp: datetime, log_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{log_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def parse_fields(fields: Optional[str]) -> list[str]:
+    """Parses a comma-separated projection such as "timestamp,ip,attack_type"."""
+    if not fields:
+        return LOG_FIELDS
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in LOG_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def build_log_query(fields: list[str], cursor: Optional[str] = None, ip: Optional[str] = None,
+                    attack_type: Optional[str] = None, since: Optional[datetime] = None,
+                    until: Optional[datetime] = None, is_anomaly: Optional[bool] = None):
+    """
+    Newest-first SELECT of only the requested columns. Pages are cut with a
+    keyset on (timestamp, id), which the (timestamp, id) index serves directly
+    no matter how deep the page is, unlike OFFSET.
+    """
+    # The keyset columns are always selected so the next cursor can be built
+    columns = [getattr(AttackLog, field) for field in dict.fromkeys(fields + ["timestamp", "id"])]
+    query = select(*columns).order_by(AttackLog.timestamp.desc(), AttackLog.id.desc())
+    if ip is not None:
+        query = query.where(AttackLog.ip == ip)
+    if attack_type is not None:
+        query = query.where(AttackLog.attack_type == attack_type)
+    if since is not None:
+        query = query.where(AttackLog.timestamp >= since)
+    if until is not None:
+        query = query.where(AttackLog.timestamp < until)
+    if is_anomaly is not None:
+        query = query.where(AttackLog.is_anomaly == is_anomaly)
+    if cursor is not None:
+        timestamp, log_id = decode_cursor(cursor)
+        query = query.where(or_(
+            AttackLog.timestamp < timestamp,
+            and_(AttackLog.timestamp == timestamp, AttackLog.id < log_id),
+        ))
+    return query
+
+
+def serialize_log(row, fields: list[str]) -> dict:
+    log = {}
+    for field in fields:
+        value = row._mapping[field]
+        log[field] = value.isoformat() if isinstance(value, datetime) else value
+    return log
+
+
+def fetch_log_page(db, fields: list[str] = LOG_FIELDS, limit: int = 100, **filters) -> dict:
+    """Returns {"logs": [...], "next_cursor": str or None}."""
+    rows = db.execute(build_log_query(fields, **filters).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return {"logs": [serialize_log(row, fields) for row in rows], "next_cursor": next_cursor}
+
+
+def stream_logs_ndjson(session_factory, fields: list[str] = LOG_FIELDS, **filters) -> Iterator[str]:
+    """
+    Yields every matching log as one JSON line. Uses its own session, since the
+    response body is produced after the request's dependencies have been closed,
+    and fetches rows in chunks so memory stays flat for any export size.
+    """
+    # Built eagerly so an invalid cursor fails before the response starts
+    query = build_log_query(fields, **filters).execution_options(yield_per=EXPORT_YIELD_PER)
+
+    def lines():
+        db = session_factory()
+        try:
+            for row in db.execute(query):
+                yield json.dumps(serialize_log(row, fields)) + "\n"
+        finally:
+            db.close()
+    return lines()
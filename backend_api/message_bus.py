@@ -1,20 +1,36 @@
 import redis
+import redis.asyncio as aioredis
+import asyncio
 import json
+import os
+import time
 from loguru import logger
-from typing import Optional
+from typing import Awaitable, Callable, Optional, Union
 
 redis_client = redis.Redis(host='localhost', port=6379, db=0)
+async_redis_client = aioredis.Redis(host='localhost', port=6379, db=0)
+
+STREAM_MAXLEN = int(os.getenv("STREAM_MAXLEN", "100000")) # entries kept per stream
+STREAM_MAX_DELIVERIES = int(os.getenv("STREAM_MAX_DELIVERIES", "5")) # before a message goes to the dead-letter stream
+
+class StreamBackpressure(Exception):
+    """The consumer group is too far behind; publishing now would trim unread entries."""
+
+def _namespaced(channel: str, cluster_id: Optional[str]) -> str:
+    return f"{cluster_id}:{channel}" if cluster_id else channel
+
+def _envelope(message: dict, jwt_token: Optional[str] = None) -> dict:
+    full_message = {"data": message}
+    if jwt_token:
+        full_message["jwt"] = jwt_token
+    return full_message
 
 def publish_message(channel: str, message: dict, cluster_id: Optional[str] = None, jwt_token: Optional[str] = None):
+    """Fire-and-forget Pub/Sub: subscribers that are not connected miss the message. See publish_stream."""
+    namespaced_channel = _namespaced(channel, cluster_id)
     try:
-        namespaced_channel = f"{cluster_id}:{channel}" if cluster_id else channel
-        full_message = {"data": message}
-        if jwt_token:
-            full_message["jwt"] = jwt_token
-        redis_client.publish(namespaced_channel, json.dumps(full_message))
-        # TODO: For backpressure with Redis Streams, use redis_client.xadd with a MAXLEN argument.
-        # This current implementation uses Pub/Sub, which does not have built-in backpressure like Streams.
-        logger.info(f"Published message to channel '{namespaced_channel}': {full_message}")
+        redis_client.publish(namespaced_channel, json.dumps(_envelope(message, jwt_token)))
+        logger.debug(f"Published message to channel '{namespaced_channel}'")
     except Exception as e:
         logger.error(f"Error publishing message to channel '{namespaced_channel}': {e}")
 
@@ -24,3 +40,176 @@ def subscribe_to_channel(channel: str, cluster_id: Optional[str] = None):
     pubsub.subscribe(namespaced_channel)
     logger.info(f"Subscribed to channel '{namespaced_channel}'")
     return pubsub
+
+async def listen(channel: str, handler: Callable[[dict], Union[None, Awaitable[None]]], cluster_id: Optional[str] = None,
+                 on_reconnect: Optional[Callable[[], None]] = None, retry_delay: float = 1.0, envelope: bool = False):
+    """
+    Calls handler(data) for every message published on the channel, without
+    blocking the event loop. Reconnects forever on Redis errors; since Pub/Sub
+    drops messages while disconnected, on_reconnect is called after every
+    resubscription so the caller can resynchronise its state. With envelope=True
+    the handler gets the whole message ({"data", "jwt"}) instead of its data.
+    """
+    namespaced_channel = f"{cluster_id}:{channel}" if cluster_id else channel
+    reconnecting = False
+    while True:
+        pubsub = async_redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(namespaced_channel)
+            logger.info(f"Listening on channel '{namespaced_channel}'")
+            if reconnecting and on_reconnect:
+                await asyncio.to_thread(on_reconnect)
+            async for message in pubsub.listen():
+                try:
+                    full_message = json.loads(message["data"])
+                    result = handler(full_message if envelope else full_message["data"])
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    logger.error(f"Error handling message on channel '{namespaced_channel}': {e}")
+        except redis.RedisError as e:
+            logger.warning(f"Lost subscription to channel '{namespaced_channel}': {e}. Retrying in {retry_delay}s.")
+        finally:
+            await pubsub.aclose()
+        reconnecting = True
+        await asyncio.sleep(retry_delay)
+
+# Redis Streams: unlike Pub/Sub, entries stay in the stream until trimmed, and a
+# consumer group tracks what each consumer has read and acknowledged, so slow or
+# restarting consumers do not lose messages. Each stream is capped at about
+# `maxlen` entries (approximate trimming is O(1)) so a burst cannot grow Redis
+# memory without bound. Passing `group` to the publish functions raises
+# StreamBackpressure instead of trimming entries that group has not read yet.
+
+def stream_backlog(stream: str, group: str, cluster_id: Optional[str] = None, client=None) -> int:
+    """Entries of the stream the group has not acknowledged: never delivered (lag) plus pending."""
+    client = client or redis_client
+    try:
+        groups = client.xinfo_groups(_namespaced(stream, cluster_id))
+    except redis.ResponseError as e:
+        if "no such key" in str(e).lower():
+            return 0 # Nothing published yet, so nothing to read
+        raise
+    for info in groups:
+        name = info["name"].decode() if isinstance(info["name"], bytes) else info["name"]
+        if name == group:
+            return (info.get("lag") or 0) + info["pending"]
+    return 0
+
+def _check_backpressure(stream: str, group: Optional[str], incoming: int, maxlen: int, cluster_id: Optional[str], client):
+    if group and stream_backlog(stream, group, cluster_id, client) + incoming > maxlen:
+        raise StreamBackpressure(f"Consumer group '{group}' is more than {maxlen} entries behind on '{_namespaced(stream, cluster_id)}'")
+
+def publish_stream(stream: str, message: dict, cluster_id: Optional[str] = None, jwt_token: Optional[str] = None,
+                   maxlen: int = STREAM_MAXLEN, group: Optional[str] = None, client=None) -> str:
+    """Appends one message to the stream. Returns its entry ID."""
+    client = client or redis_client
+    _check_backpressure(stream, group, 1, maxlen, cluster_id, client)
+    entry_id = client.xadd(_namespaced(stream, cluster_id), {"message": json.dumps(_envelope(message, jwt_token))},
+                           maxlen=maxlen, approximate=True)
+    return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+
+def publish_stream_batch(stream: str, messages: list[dict], cluster_id: Optional[str] = None, jwt_token: Optional[str] = None,
+                         maxlen: int = STREAM_MAXLEN, group: Optional[str] = None, client=None) -> list[str]:
+    """Appends all messages in one pipelined round trip. Returns their entry IDs."""
+    if not messages:
+        return []
+    client = client or redis_client
+    _check_backpressure(stream, group, len(messages), maxlen, cluster_id, client)
+    namespaced_stream = _namespaced(stream, cluster_id)
+    pipe = client.pipeline(transaction=False)
+    for message in messages:
+        pipe.xadd(namespaced_stream, {"message": json.dumps(_envelope(message, jwt_token))}, maxlen=maxlen, approximate=True)
+    return [entry_id.decode() if isinstance(entry_id, bytes) else entry_id for entry_id in pipe.execute()]
+
+def ensure_consumer_group(stream: str, group: str, cluster_id: Optional[str] = None, start_id: str = "0", client=None):
+    """Creates the group (and the stream) if needed. start_id "0" reads existing entries, "$" only new ones."""
+    client = client or redis_client
+    try:
+        client.xgroup_create(_namespaced(stream, cluster_id), group, id=start_id, mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+class StreamConsumer:
+    """
+    One consumer of a consumer group. read() returns up to batch_size
+    (entry_id, {"data", "jwt"}) pairs: first entries other consumers left
+    unacknowledged for claim_idle_ms (they crashed or hung), then new ones.
+    Entries must be ack()ed once processed; unacknowledged ones are redelivered,
+    and after max_deliveries attempts moved to the "<stream>:dead" stream.
+    """
+
+    def __init__(self, stream: str, group: str, consumer: str, cluster_id: Optional[str] = None, batch_size: int = 100,
+                 block_ms: int = 5000, claim_idle_ms: int = 60000, max_deliveries: int = STREAM_MAX_DELIVERIES, client=None):
+        self.stream = _namespaced(stream, cluster_id)
+        self.group = group
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+        self.client = client or redis_client
+        self._claim_cursor = "0-0"
+        ensure_consumer_group(stream, group, cluster_id, client=self.client)
+
+    def read(self) -> list[tuple[str, dict]]:
+        entries = self._claim_stale()
+        if len(entries) < self.batch_size:
+            # Only block when there is nothing to do already
+            replies = self.client.xreadgroup(self.group, self.consumer, {self.stream: ">"}, count=self.batch_size - len(entries),
+                                             block=None if entries else self.block_ms)
+            for _, stream_entries in replies or []:
+                entries.extend(stream_entries)
+        return [(_decode(entry_id), json.loads(fields[b"message"] if b"message" in fields else fields["message"]))
+                for entry_id, fields in entries if fields]
+
+    def ack(self, entry_ids: list[str]) -> int:
+        return self.client.xack(self.stream, self.group, *entry_ids) if entry_ids else 0
+
+    def consume(self, handler: Callable[[list[dict]], None], should_stop: Optional[Callable[[], bool]] = None):
+        """Calls handler(messages) per batch and acknowledges the batch if it returns without raising."""
+        while not (should_stop and should_stop()):
+            try:
+                batch = self.read()
+            except redis.RedisError as e:
+                logger.warning(f"Error reading stream '{self.stream}': {e}")
+                time.sleep(1)
+                continue
+            if not batch:
+                continue
+            try:
+                handler([message for _, message in batch])
+            except Exception as e:
+                # Left pending; redelivered after claim_idle_ms
+                logger.error(f"Error handling {len(batch)} messages from stream '{self.stream}': {e}")
+                continue
+            self.ack([entry_id for entry_id, _ in batch])
+
+    def _claim_stale(self) -> list:
+        reply = self.client.xautoclaim(self.stream, self.group, self.consumer, min_idle_time=self.claim_idle_ms,
+                                       start_id=self._claim_cursor, count=self.batch_size)
+        self._claim_cursor, claimed = _decode(reply[0]), reply[1]
+        if not claimed:
+            return []
+        # Looked up by ID: a range query would also return other consumers' entries in between
+        pipe = self.client.pipeline(transaction=False)
+        for entry_id, _ in claimed:
+            pipe.xpending_range(self.stream, self.group, min=entry_id, max=entry_id, count=1, consumername=self.consumer)
+        deliveries = {
+            _decode(pending["message_id"]): pending["times_delivered"]
+            for reply in pipe.execute() for pending in reply
+        }
+        dead = [(entry_id, fields) for entry_id, fields in claimed if deliveries.get(_decode(entry_id), 0) > self.max_deliveries]
+        if dead:
+            pipe = self.client.pipeline(transaction=False)
+            for entry_id, fields in dead:
+                pipe.xadd(f"{self.stream}:dead", fields, maxlen=STREAM_MAXLEN, approximate=True)
+                pipe.xack(self.stream, self.group, entry_id)
+            pipe.execute()
+            logger.warning(f"Moved {len(dead)} messages that failed {self.max_deliveries} times to '{self.stream}:dead'")
+        dead_ids = {_decode(entry_id) for entry_id, _ in dead}
+        return [(entry_id, fields) for entry_id, fields in claimed if _decode(entry_id) not in dead_ids]
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
@@ -0,0 +1,149 @@
+import math
+import os
+import time
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+from fastapi import Depends, HTTPException, Request
+from loguru import logger
+from starlette.routing import Match
+
+from backend_api.ttl_cache import TTLCache
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Share of a client's limit the processes take from Redis in one call each and then serve locally
+RATE_LIMIT_LEASE_FRACTION = float(os.getenv("RATE_LIMIT_LEASE_FRACTION", "0.1"))
+# Gateway processes sharing the limits, e.g. the uvicorn/gunicorn worker count
+RATE_LIMIT_PROCESSES = int(os.getenv("RATE_LIMIT_PROCESSES", os.getenv("WEB_CONCURRENCY", "1")))
+RATE_LIMIT_LOCAL_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_KEYS", "100000"))
+
+# GCRA (generic cell rate algorithm): one key per client holding the
+# theoretical arrival time (TAT) in milliseconds. A request of `cost` units is
+# allowed if it would not push the TAT more than one full period ahead of now.
+# Equivalent to a sliding window of `limit` requests per `period`, in one
+# atomic round trip and one small key.
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local period = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - period
+if allow_at > now then
+    return {0, math.ceil(allow_at - now)}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return {1, 0}
+"""
+
+
+class RateLimiter:
+    """
+    Asynchronous rate limiter shared by every gateway process through Redis.
+
+    To keep clients that are well under their limit off Redis, a process leases
+    a slice of the client's allowance with a single GCRA call and serves the
+    following requests from that local budget for up to one period. A lease is
+    charged in full when it is taken, whether or not the client comes back to
+    that process, so the RATE_LIMIT_LEASE_FRACTION of the limit is split
+    between the `processes`: the leases held by all of them together never
+    exceed that fraction. A client is therefore always allowed at least
+    limit * (1 - lease_fraction) requests per period, and at most one lease
+    per process above its limit. When a lease cannot be granted the limiter
+    falls back to single-request checks. If Redis is down, each process
+    enforces the limit on its own.
+    """
+
+    def __init__(self, redis_client=None, lease_fraction: float = RATE_LIMIT_LEASE_FRACTION,
+                 local_keys: int = RATE_LIMIT_LOCAL_KEYS, processes: int = RATE_LIMIT_PROCESSES):
+        self.redis_client = redis_client
+        self.lease_fraction = lease_fraction / max(1, processes)
+        self._script = redis_client.register_script(GCRA_SCRIPT) if redis_client is not None else None
+        self._leases = TTLCache(local_keys, ttl=3600) # key -> [tokens, expires_at]
+        self._fallback = TTLCache(local_keys, ttl=3600) # key -> [tokens, updated_at], used without Redis
+        self.redis_calls = 0
+
+    async def hit(self, key: str, limit: int, period: float) -> tuple[bool, float]:
+        """Counts one request for `key`. Returns (allowed, seconds to wait before retrying)."""
+        now = time.monotonic()
+        lease = self._leases.get(key, None)
+        if lease is not None and lease[0] >= 1 and lease[1] > now:
+            lease[0] -= 1
+            return True, 0.0
+
+        lease_size = max(1, int(limit * self.lease_fraction))
+        try:
+            if lease_size > 1:
+                allowed, _ = await self._acquire(key, limit, period, lease_size)
+                if allowed:
+                    self._leases.set(key, [lease_size - 1, now + period])
+                    return True, 0.0
+            allowed, retry_after = await self._acquire(key, limit, period, 1)
+            return allowed, retry_after
+        except (redis.RedisError, OSError) as e:
+            logger.warning(f"Rate limiter Redis unavailable, limiting locally: {e}")
+            return self._local_hit(key, limit, period, now)
+
+    async def _acquire(self, key: str, limit: int, period: float, cost: int) -> tuple[bool, float]:
+        if self._script is None:
+            raise redis.ConnectionError("No Redis client configured")
+        self.redis_calls += 1
+        period_ms = period * 1000
+        allowed, retry_after_ms = await self._script(
+            keys=[key], args=[int(time.time() * 1000), period_ms / limit, period_ms, cost]
+        )
+        return bool(allowed), retry_after_ms / 1000
+
+    def _local_hit(self, key: str, limit: int, period: float, now: float) -> tuple[bool, float]:
+        bucket = self._fallback.get(key, None)
+        if bucket is None:
+            bucket = [float(limit), now]
+            self._fallback.set(key, bucket)
+        rate = limit / period
+        bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return False, (1 - bucket[0]) / rate
+        bucket[0] -= 1
+        return True, 0.0
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit(limit: int, period: float = 60, scope: Optional[str] = None):
+    """
+    Per-client limit for a route or router, e.g.
+
+        app.include_router(agent_router, dependencies=[rate_limit(600, 60, scope="agents")])
+
+    Without a scope, every route path is limited separately. The gateway leaves
+    routes with such a limit out of its global per-IP limit (see matches_routes).
+    """
+    async def check_rate_limit(request: Request):
+        route = request.scope.get("route")
+        key = f"rate_limit:{scope or getattr(route, 'path', request.url.path)}:{client_ip(request)}"
+        allowed, retry_after = await rate_limiter.hit(key, limit, period)
+        if not allowed:
+            logger.warning(f"Rate limit exceeded for {key}")
+            raise HTTPException(status_code=429, detail="Too Many Requests",
+                                headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+    return Depends(check_rate_limit)
+
+
+def matches_routes(routes, prefix: str, scope) -> bool:
+    """Whether the request goes to one of `routes`, included under `prefix`. Middleware runs before routing."""
+    path = scope["path"]
+    if not path.startswith(prefix):
+        return False
+    scope = {**scope, "path": path[len(prefix):]}
+    return any(route.matches(scope)[0] == Match.FULL for route in routes)
+
+
+rate_limiter = RateLimiter(redis_client=aioredis.Redis.from_url(REDIS_URL))
@@ -0,0 +1,217 @@
+"""
+Per-minute, per-hour and per-day attack counters, maintained as events are analyzed.
+
+The analyzer calls apply_rollups() in the same transaction that stores its
+results, with only the logs that had not been analyzed before, so a redelivered
+message is never counted twice. Each (granularity, bucket, attack_type, port,
+country, honeypot) counter is one row, updated with INSERT ... ON CONFLICT DO
+UPDATE, so dashboards read a few hundred bucket rows instead of scanning
+attack_logs.
+
+    python -m backend_api.rollups prune --minute-retention-days 2 --hour-retention-days 90
+        Deletes old fine-grained buckets; the daily buckets are kept.
+"""
+import argparse
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, delete, func, select, update
+
+from backend_api.database import SessionLocal, AttackRollup
+
+GRANULARITIES = ("minute", "hour", "day")
+DIMENSIONS = ("attack_type", "port", "country", "honeypot")
+ROLLUP_KEY = ("granularity", "bucket_start") + DIMENSIONS
+UNKNOWN = "unknown"
+NORMAL_ATTACK_TYPE = "Normal" # classifier label for benign traffic
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def _parse_timestamp(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.utcnow()
+
+
+def aggregate(results: list[dict]) -> list[dict]:
+    """Sums analyzer results into one row per rollup key, ordered by key."""
+    counters = {}
+    for result in results:
+        timestamp = _parse_timestamp(result.get("timestamp"))
+        dimensions = (
+            str(result.get("attack_type") or UNKNOWN),
+            int(result.get("port") or 0),
+            result.get("country") or UNKNOWN,
+            result.get("honeypot") or UNKNOWN,
+        )
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(timestamp, granularity)) + dimensions
+            counter = counters.setdefault(key, [0, 0, 0.0])
+            counter[0] += 1
+            counter[1] += 1 if result.get("is_anomaly") else 0
+            counter[2] += float(result.get("confidence_score") or 0.0)
+    # A fixed order makes concurrent analyzers lock the rows in the same order, avoiding deadlocks
+    return [
+        dict(zip(ROLLUP_KEY, key), count=count, anomaly_count=anomaly_count, sum_confidence=sum_confidence)
+        for key, (count, anomaly_count, sum_confidence) in sorted(counters.items(), key=lambda item: item[0])
+    ]
+
+
+def apply_rollups(db, results: list[dict]) -> int:
+    """
+    Adds the results to their rollup rows inside the caller's transaction.
+    Returns the number of rollup rows touched.
+    """
+    rows = aggregate(results)
+    if not rows:
+        return 0
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(AttackRollup).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(ROLLUP_KEY),
+            set_={
+                "count": AttackRollup.count + statement.excluded["count"],
+                "anomaly_count": AttackRollup.anomaly_count + statement.excluded.anomaly_count,
+                "sum_confidence": AttackRollup.sum_confidence + statement.excluded.sum_confidence,
+            },
+        )
+        db.execute(statement)
+    else:
+        for row in rows:
+            matches = [getattr(AttackRollup, column) == row[column] for column in ROLLUP_KEY]
+            updated = db.execute(update(AttackRollup).where(*matches).values(
+                count=AttackRollup.count + row["count"],
+                anomaly_count=AttackRollup.anomaly_count + row["anomaly_count"],
+                sum_confidence=AttackRollup.sum_confidence + row["sum_confidence"],
+            )).rowcount
+            if not updated:
+                db.add(AttackRollup(**row))
+        db.flush()
+    return len(rows)
+
+
+def rollup_series(db, granularity: str, since: datetime, until: datetime,
+                  group_by: Optional[str] = None, **filters) -> list[dict]:
+    """
+    Counts per bucket overlapping [since, until), optionally split by one dimension and
+    filtered on others, e.g. rollup_series(db, "hour", since, until, group_by="country", port=22).
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    if group_by is not None and group_by not in DIMENSIONS:
+        raise ValueError(f"Cannot group by {group_by}")
+    unknown = [name for name in filters if name not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Cannot filter on {', '.join(unknown)}")
+
+    columns = [AttackRollup.bucket_start]
+    if group_by is not None:
+        columns.append(getattr(AttackRollup, group_by))
+    query = select(
+        *columns,
+        func.sum(AttackRollup.count).label("count"),
+        func.sum(AttackRollup.anomaly_count).label("anomaly_count"),
+        func.sum(AttackRollup.sum_confidence).label("sum_confidence"),
+    ).where(
+        AttackRollup.granularity == granularity,
+        AttackRollup.bucket_start >= bucket_start(since, granularity), # the bucket containing `since` counts in full
+        AttackRollup.bucket_start < until,
+        *[getattr(AttackRollup, name) == value for name, value in filters.items() if value is not None],
+    ).group_by(*columns).order_by(*columns)
+
+    series = []
+    for row in db.execute(query):
+        entry = {"bucket_start": row.bucket_start.isoformat()}
+        if group_by is not None:
+            entry[group_by] = row._mapping[group_by]
+        entry["count"] = row.count
+        entry["anomaly_count"] = row.anomaly_count
+        entry["average_confidence"] = round(row.sum_confidence / row.count, 4) if row.count else None
+        series.append(entry)
+    return series
+
+
+def overview(db, since: datetime, until: datetime) -> dict:
+    """
+    Totals over [since, until) from the hourly buckets, for dashboard cards.
+
+    average_threat_score only averages the classifier confidence of traffic
+    classified as an attack; a confident "Normal" verdict is not a threat.
+    """
+    is_threat = AttackRollup.attack_type != NORMAL_ATTACK_TYPE
+    count, anomaly_count, sum_confidence, threat_count, threat_confidence = db.execute(select(
+        func.coalesce(func.sum(AttackRollup.count), 0),
+        func.coalesce(func.sum(AttackRollup.anomaly_count), 0),
+        func.coalesce(func.sum(AttackRollup.sum_confidence), 0.0),
+        func.coalesce(func.sum(case((is_threat, AttackRollup.count), else_=0)), 0),
+        func.coalesce(func.sum(case((is_threat, AttackRollup.sum_confidence), else_=0.0)), 0.0),
+    ).where(
+        AttackRollup.granularity == "hour",
+        AttackRollup.bucket_start >= bucket_start(since, "hour"),
+        AttackRollup.bucket_start < until,
+    )).one()
+    average_confidence = sum_confidence / count if count else None
+    return {
+        "total_attacks": count,
+        "anomalies": anomaly_count,
+        "average_confidence": round(average_confidence, 4) if average_confidence is not None else None,
+        # Confidence of the attack verdicts on the 0-100 scale the dashboards use for threat scores
+        "average_threat_score": round(threat_confidence / threat_count * 100, 1) if threat_count else None,
+    }
+
+
+def attack_count_telemetry(db, since: datetime, until: datetime, granularity: str = "day") -> list[dict]:
+    """Attack counts per bucket in the [{"timestamp", "attack_count"}] shape of RiskIndexPredictor."""
+    return [
+        {"timestamp": datetime.fromisoformat(entry["bucket_start"]), "attack_count": entry["count"]}
+        for entry in rollup_series(db, granularity, since, until)
+    ]
+
+
+def prune_rollups(db, granularity: str, before: datetime) -> int:
+    """Deletes the buckets of one granularity that start before `before`. Returns the rows deleted."""
+    deleted = db.execute(delete(AttackRollup).where(
+        AttackRollup.granularity == granularity,
+        AttackRollup.bucket_start < before,
+    )).rowcount
+    db.commit()
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the attack rollup tables.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    prune = subparsers.add_parser("prune", help="Delete old minute and hour buckets")
+    prune.add_argument("--minute-retention-days", type=float, default=2)
+    prune.add_argument("--hour-retention-days", type=float, default=90)
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        minutes = prune_rollups(db, "minute", now - timedelta(days=args.minute_retention_days))
+        hours = prune_rollups(db, "hour", now - timedelta(days=args.hour_retention_days))
+    finally:
+        db.close()
+    print(f"Deleted {minutes} minute and {hours} hour buckets.")
+
+
+if __name__ == "__main__":
+    main()
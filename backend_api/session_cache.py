@@ -0,0 +1,86 @@
+import os
+import threading
+from datetime import datetime
+from typing import Iterable, Optional
+
+from loguru import logger
+
+from backend_api.ttl_cache import TTLCache
+from backend_api.message_bus import publish_message
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30")) # seconds
+SESSION_REVOCATIONS_CHANNEL = "session-revocations"
+
+
+class SessionCache:
+    """
+    Validated sessions by JWT ID, so get_current_user can skip the SessionToken
+    and User queries for tokens it has already checked.
+
+    An entry holds the user row (detached) and lives for SESSION_CACHE_TTL
+    seconds, never past the session's own expiry. Revocations are published on
+    SESSION_REVOCATIONS_CHANNEL and drop the affected entries in every gateway
+    process, so a revoked token is rejected on its next request.
+    """
+
+    def __init__(self, maxsize: int = SESSION_CACHE_SIZE, ttl: float = SESSION_CACHE_TTL):
+        self.ttl = ttl
+        self._sessions = TTLCache(maxsize, ttl) # jti -> (user, expires_at)
+        self._jtis_by_user = {} # user id -> jtis that may be cached
+        self._lock = threading.Lock()
+
+    def get(self, jti: str):
+        """Returns the cached user for a still-valid session, or None."""
+        entry = self._sessions.get(jti, None)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if expires_at < datetime.utcnow():
+            self._sessions.pop(jti)
+            return None
+        return user
+
+    def put(self, jti: str, user, expires_at: datetime):
+        ttl = min(self.ttl, (expires_at - datetime.utcnow()).total_seconds())
+        if ttl <= 0:
+            return
+        self._sessions.set(jti, (user, expires_at), ttl=ttl)
+        with self._lock:
+            # Forget sessions of this user that have already left the cache
+            user_jtis = {cached for cached in self._jtis_by_user.get(user.id, ()) if self._sessions.get(cached, None) is not None}
+            user_jtis.add(jti)
+            self._jtis_by_user[user.id] = user_jtis
+
+    def invalidate(self, jtis: Iterable[str] = (), user_id: Optional[int] = None):
+        for jti in jtis:
+            self._sessions.pop(jti)
+        if user_id is not None:
+            with self._lock:
+                user_jtis = self._jtis_by_user.pop(user_id, set())
+            for jti in user_jtis:
+                self._sessions.pop(jti)
+
+    def clear(self):
+        self._sessions.clear()
+        with self._lock:
+            self._jtis_by_user.clear()
+
+    def apply_revocation(self, revocation: dict):
+        """Handles a SESSION_REVOCATIONS_CHANNEL message: {"jtis": [...]} and/or {"user_id": ...}."""
+        self.invalidate(revocation.get("jtis", ()), revocation.get("user_id"))
+
+
+def invalidate_sessions(jtis: Iterable[str] = (), user_id: Optional[int] = None):
+    """
+    Drops sessions, or every session of a user, from the cache of this process
+    right away and from all other gateway processes via Redis. Call it after a
+    revocation or a change to the user row has been committed.
+    """
+    jtis = list(jtis)
+    session_cache.invalidate(jtis, user_id)
+    publish_message(SESSION_REVOCATIONS_CHANNEL, {"jtis": jtis, "user_id": user_id})
+    logger.debug(f"Published session invalidation for user ID {user_id}, {len(jtis)} session(s)")
+
+
+session_cache = SessionCache()
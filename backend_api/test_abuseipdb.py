@@ -0,0 +1,109 @@
+import threading
+import time
+
+import httpx
+
+from backend_api.analyzer.abuseipdb import AbuseIPDBVerifier
+
+
+class FakeAbuseIPDB:
+    def __init__(self, score=90, delay=0.0):
+        self.score = score
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, ip_address):
+        with self.lock:
+            self.calls.append(ip_address)
+        time.sleep(self.delay)
+        if self.score is None:
+            raise httpx.ConnectError("unreachable")
+        return self.score
+
+
+class RecordingApply:
+    def __init__(self):
+        self.updates = []
+
+    def __call__(self, ip_address, log_ids, is_verified_threat, alert):
+        self.updates.append((ip_address, sorted(log_ids), is_verified_threat, alert))
+
+
+def make_verifier(checker, apply, **kwargs):
+    return AbuseIPDBVerifier(checker=checker, apply=apply, workers=2, enabled=True, **kwargs)
+
+
+def test_flood_from_one_ip_costs_one_check_and_one_update():
+    checker = FakeAbuseIPDB(delay=0.2)
+    apply = RecordingApply()
+    verifier = make_verifier(checker, apply)
+
+    for log_id in range(1, 1001):
+        verifier.submit("203.0.113.7", log_id)
+    verifier.join()
+
+    assert checker.calls == ["203.0.113.7"]
+    assert apply.updates == [("203.0.113.7", list(range(1, 1001)), True, True)]
+
+
+def test_cached_verdict_is_reused_without_alerting_again():
+    checker = FakeAbuseIPDB(score=10)
+    apply = RecordingApply()
+    verifier = make_verifier(checker, apply)
+
+    verifier.submit("198.51.100.1", 1)
+    verifier.join()
+    verifier.submit("198.51.100.1", 2)
+    verifier.join()
+
+    assert checker.calls == ["198.51.100.1"]
+    assert apply.updates == [("198.51.100.1", [1], False, True), ("198.51.100.1", [2], False, False)]
+
+
+def test_failed_checks_are_not_cached():
+    checker = FakeAbuseIPDB(score=None)
+    apply = RecordingApply()
+    verifier = make_verifier(checker, apply)
+
+    verifier.submit("192.0.2.1", 1)
+    verifier.join()
+    verifier.submit("192.0.2.1", 2)
+    verifier.join()
+
+    assert len(checker.calls) == 2
+    assert apply.updates == []
+
+
+def test_unexpected_errors_do_not_strand_the_ip():
+    responses = [ValueError("malformed JSON"), 95]
+
+    def checker(ip_address):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    apply = RecordingApply()
+    verifier = make_verifier(checker, apply)
+
+    verifier.submit("192.0.2.9", 1)
+    verifier.join()
+    verifier.submit("192.0.2.9", 2)
+    verifier.join()
+
+    assert apply.updates == [("192.0.2.9", [2], True, True)]
+    assert verifier._pending == {}
+
+
+def test_full_queue_drops_new_ips():
+    checker = FakeAbuseIPDB(delay=0.2)
+    apply = RecordingApply()
+    verifier = AbuseIPDBVerifier(checker=checker, apply=apply, workers=1, queue_size=1, enabled=True)
+
+    for i in range(1, 6):
+        verifier.submit(f"192.0.2.{i}", i)
+    verifier.join()
+
+    assert verifier.dropped >= 3
+    assert len(apply.updates) == len(checker.calls) <= 2
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import jwt
+
+from backend_api.agent_events import AgentEventRelay
+from backend_api.ws_broadcaster import WebSocketBroadcaster
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.received = []
+
+    async def send_text(self, text):
+        self.received.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+
+def token(jti):
+    return jwt.encode({"jti": jti}, "test-key", algorithm="HS256")
+
+
+def test_each_event_is_verified_once_for_all_viewers_and_replays_are_dropped():
+    verified = []
+
+    def verify(message):
+        verified.append(message)
+        return None if message["data"].get("forged") else dict(message["data"], node_attestation="signed")
+
+    async def scenario():
+        relay = AgentEventRelay(broadcaster=WebSocketBroadcaster(), verify=verify)
+        viewers = [FakeWebSocket() for _ in range(50)]
+        for websocket in viewers:
+            relay.broadcaster.register(websocket)
+
+        heartbeat = {"data": {"agent_id": 1, "status": "ok"}, "jwt": token("heartbeat-1")}
+        forged = {"data": {"agent_id": 2, "forged": True}, "jwt": token("forged-1")}
+        for message in (heartbeat, forged, heartbeat, forged):
+            await relay.handle(message)
+        await asyncio.sleep(0.05)
+
+        # The replayed heartbeat is dropped; the rejected forgery is checked again, not remembered
+        assert len(verified) == 3
+        assert relay.verifications == 3
+        assert relay.duplicates == 1
+        for websocket in viewers:
+            assert websocket.received == [{"agent_id": 1, "status": "ok", "node_attestation": "signed"}]
+    asyncio.run(scenario())
+
+
+def test_identical_unsigned_events_are_all_forwarded():
+    async def scenario():
+        relay = AgentEventRelay(broadcaster=WebSocketBroadcaster(), verify=lambda message: message["data"])
+        viewer = FakeWebSocket()
+        relay.broadcaster.register(viewer)
+
+        status = {"data": {"agent_id": 3, "status": "ok"}}
+        for _ in range(3):
+            await relay.handle(status)
+        await asyncio.sleep(0.05)
+
+        assert relay.duplicates == 0
+        assert viewer.received == [{"agent_id": 3, "status": "ok"}] * 3
+    asyncio.run(scenario())
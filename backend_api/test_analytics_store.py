@@ -0,0 +1,82 @@
+import glob
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("duckdb")
+
+from backend_api.analytics_store import AnalyticsStore, AttackEventWriter, compact
+
+START = datetime(2024, 1, 1, 10, 0, 0)
+
+
+def make_events(count, start=START):
+    return [
+        {
+            "id": i,
+            "timestamp": (start + timedelta(minutes=i)).isoformat(),
+            "ip": f"203.0.113.{i % 3}",
+            "port": 22,
+            "attack_type": "SSH Brute Force" if i % 2 else "Port Scan",
+            "confidence_score": 0.5,
+            "is_anomaly": i % 10 == 0,
+            "anomaly_score": 0.1,
+            "data": "ignored",
+        }
+        for i in range(count)
+    ]
+
+
+def test_writer_buffers_until_the_flush_threshold(tmp_path):
+    writer = AttackEventWriter(root=str(tmp_path), flush_rows=100, flush_interval=3600)
+    writer.append(make_events(50))
+    assert not AnalyticsStore(str(tmp_path)).available
+
+    writer.append(make_events(50, start=START + timedelta(hours=1)))
+    files = glob.glob(os.path.join(tmp_path, "date=*", "hour=*", "*.parquet"))
+    assert sorted(os.path.basename(os.path.dirname(path)) for path in files) == ["hour=10", "hour=11"]
+
+
+def test_summary_and_trend_cover_only_the_requested_range(tmp_path):
+    writer = AttackEventWriter(root=str(tmp_path), flush_rows=10_000)
+    writer.append(make_events(180))
+    writer.flush()
+    store = AnalyticsStore(str(tmp_path))
+
+    summary = store.threat_summary(START + timedelta(hours=1), START + timedelta(hours=2), top_n=2)
+    assert summary["total_attacks"] == 60
+    assert summary["anomalies"] == 6
+    assert summary["average_confidence"] == 0.5
+    assert summary["unique_ips"] == 3
+    assert [row["attacks"] for row in summary["top_ips"]] == [20, 20]
+    assert summary["attack_types"] == {"SSH Brute Force": 30, "Port Scan": 30}
+
+    trend = store.hourly_trend(START, START + timedelta(hours=3))
+    assert [row["attacks"] for row in trend] == [60, 60, 60]
+    assert trend[0]["hour"] == START.isoformat()
+
+
+def test_compact_merges_closed_hours(tmp_path):
+    writer = AttackEventWriter(root=str(tmp_path), flush_rows=10_000)
+    for batch in range(3):
+        writer.append(make_events(20, start=START + timedelta(seconds=batch)))
+        writer.flush()
+    writer.append(make_events(20, start=START + timedelta(hours=5)))
+    writer.flush()
+
+    assert compact(str(tmp_path), before=START + timedelta(hours=2)) == 1
+    assert len(glob.glob(os.path.join(tmp_path, "date=*", "hour=10", "*.parquet"))) == 1
+    assert AnalyticsStore(str(tmp_path)).threat_summary(START, START + timedelta(hours=6))["total_attacks"] == 80
+
+
+def test_an_empty_store_is_rechecked_only_after_the_interval(tmp_path):
+    store = AnalyticsStore(str(tmp_path), recheck_interval=3600)
+    assert not store.available
+
+    writer = AttackEventWriter(root=str(tmp_path))
+    writer.append(make_events(10))
+    writer.flush()
+    assert not store.available # not looked at again yet
+    assert AnalyticsStore(str(tmp_path), recheck_interval=3600).available
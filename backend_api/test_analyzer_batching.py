@@ -0,0 +1,21 @@
+from backend_api.analyzer.batching import commit_isolating_failures
+
+
+def commit(messages):
+    # Stands in for persist_batch(analyze_batch(...)): int() fails on the whole batch
+    return [{"id": message["id"], "port": int(message["port"])} for message in messages]
+
+
+def test_valid_batch_is_committed_at_once():
+    calls = []
+    batch = [(tag, {"id": tag, "port": "22"}) for tag in range(3)]
+    results, failed = commit_isolating_failures(batch, lambda messages: calls.append(len(messages)) or commit(messages))
+    assert [result["id"] for result in results] == [0, 1, 2]
+    assert failed == [] and calls == [3]
+
+
+def test_poison_message_fails_alone():
+    batch = [(1, {"id": 1, "port": "22"}), (2, {"id": 2, "port": "ssh"}), (3, {"id": 3, "port": "80"})]
+    results, failed = commit_isolating_failures(batch, commit)
+    assert [result["id"] for result in results] == [1, 3]
+    assert failed == [(2, {"id": 2, "port": "ssh"})]
@@ -0,0 +1,72 @@
+import pytest
+
+from backend_api.analyzer.attack_counter import AttackCounter
+
+
+def test_threshold_crossing_emits_one_decision_per_window():
+    counter = AttackCounter(threshold=3, clear_threshold=0, window=300)
+
+    decisions = [counter.record([("203.0.113.7", log_id)], now=1000 + log_id) for log_id in range(1, 11)]
+
+    assert decisions[:2] == [[], []]
+    assert decisions[2] == ["203.0.113.7"]
+    assert all(decision == [] for decision in decisions[3:])
+
+
+def test_ip_rearms_after_its_count_falls_below_the_clear_threshold():
+    counter = AttackCounter(threshold=3, clear_threshold=0, window=300)
+    assert counter.record([("203.0.113.7", i) for i in range(3)], now=1000) == ["203.0.113.7"]
+
+    # Still active inside the window: no new decision
+    assert counter.record([("203.0.113.7", 3)], now=1200) == []
+    # Quiet for a whole window, then a new burst
+    assert counter.record([("203.0.113.7", i) for i in range(4, 7)], now=1600) == ["203.0.113.7"]
+
+
+def test_events_outside_the_window_are_not_counted():
+    counter = AttackCounter(threshold=3, window=60)
+
+    assert counter.record([("198.51.100.1", 1)], now=0) == []
+    assert counter.record([("198.51.100.1", 2)], now=61) == []
+    assert counter.record([("198.51.100.1", 3)], now=90) == []
+    assert counter.record([("198.51.100.1", 4)], now=100) == ["198.51.100.1"]
+
+
+
+def test_events_that_leave_the_window_are_dropped_before_counting():
+    counter = AttackCounter(threshold=3, window=300)
+
+    assert counter.record([("198.51.100.2", 1)], now=1000) == []
+    assert counter.record([("198.51.100.2", 2)], now=1200) == []
+    # The event at 1000 has left the window: 2 attacks in it, not 3
+    assert counter.record([("198.51.100.2", 3)], now=1400) == []
+    assert counter.record([("198.51.100.2", 4)], now=1450) == ["198.51.100.2"]
+
+def test_redis_counter_is_shared_and_deduplicates_log_ids():
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    worker_a = AttackCounter(redis_client=client, threshold=3, window=300)
+    worker_b = AttackCounter(redis_client=client, threshold=3, window=300)
+
+    assert worker_a.record([("203.0.113.7", 1), ("203.0.113.7", 1)], now=1000) == [] # redelivered message
+    assert worker_b.record([("203.0.113.7", 2)], now=1001) == []
+    assert worker_a.record([("203.0.113.7", 3)], now=1002) == ["203.0.113.7"]
+    assert worker_b.record([("203.0.113.7", 4)], now=1003) == []
+
+
+def test_unflagged_ip_decides_again_on_its_next_event():
+    counter = AttackCounter(threshold=2, window=300)
+    assert counter.record([("203.0.113.9", 1), ("203.0.113.9", 2)], now=1000) == ["203.0.113.9"]
+    assert counter.record([("203.0.113.9", 3)], now=1001) == []
+
+    counter.unflag("203.0.113.9")
+    assert counter.record([("203.0.113.9", 4)], now=1002) == ["203.0.113.9"]
+
+
+def test_redis_unflag_clears_the_shared_flag():
+    fakeredis = pytest.importorskip("fakeredis")
+    counter = AttackCounter(redis_client=fakeredis.FakeRedis(), threshold=2, window=300)
+    assert counter.record([("203.0.113.9", 1), ("203.0.113.9", 2)], now=1000) == ["203.0.113.9"]
+
+    counter.unflag("203.0.113.9")
+    assert counter.record([("203.0.113.9", 3)], now=1001) == ["203.0.113.9"]
@@ -0,0 +1,100 @@
+import json
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend_api.database import Base, AttackLog, Block
+from backend_api.blockchain_service.sealer import BlockSealer
+from blockchain_layer.blockchain import Blockchain
+from blockchain_layer.sealing import HMACAuthoritySealer, ProofOfWorkSealer
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add_all([AttackLog(ip=f"203.0.113.{i}", port=22, data=f"payload {i}", attack_type="Port Scan") for i in range(10)])
+    db.commit()
+    db.close()
+    return factory
+
+
+def test_seals_one_block_per_max_transactions(session_factory):
+    acked = []
+    sealer = BlockSealer(session_factory, max_transactions=4, max_latency_ms=60000, on_sealed=acked.append,
+                         sealing_strategy=ProofOfWorkSealer())
+    blocks = [sealer.add(log_id, token=log_id) for log_id in range(1, 11)]
+
+    sealed = [block for block in blocks if block is not None]
+    assert len(sealed) == 2
+    assert acked == [[1, 2, 3, 4], [5, 6, 7, 8]]
+    assert len(sealer.pending) == 2
+
+    db = session_factory()
+    chain = db.query(Block).order_by(Block.index).all()
+    assert [block.index for block in chain] == [1, 2, 3] # genesis and two sealed blocks
+    transactions = json.loads(chain[1].data)
+    assert [transaction["recipient"] for transaction in transactions] == [f"203.0.113.{i}" for i in range(4)]
+    assert chain[1].merkle_root == Blockchain.merkle_root([Blockchain.hash(transaction) for transaction in transactions])
+    assert chain[2].previous_hash == Blockchain.hash(chain[1].to_dict())
+    assert Blockchain.valid_proof(chain[1].proof, chain[2].proof)
+    db.close()
+
+
+def test_partial_batch_is_sealed_after_the_deadline(session_factory):
+    sealer = BlockSealer(session_factory, max_transactions=100, max_latency_ms=0, sealing_strategy=HMACAuthoritySealer(b"key"))
+    assert not sealer.due()
+    sealer.add(1)
+    sealer.add(999) # unknown log: acknowledged, but not in the block
+    assert sealer.due()
+
+    block = sealer.seal()
+    assert json.loads(block.data)[0]["recipient"] == "203.0.113.0"
+    assert len(json.loads(block.data)) == 1
+    assert not sealer.due()
+    assert sealer.seal() is None
+
+
+class FailingSealer(HMACAuthoritySealer):
+    def sign(self, block_hash):
+        raise RuntimeError("sealing key unavailable")
+
+
+def test_failing_batch_backs_off_then_goes_to_on_failed(session_factory):
+    failed, sealed = [], []
+    sealer = BlockSealer(session_factory, max_transactions=2, max_latency_ms=0, on_sealed=sealed.append, on_failed=failed.append,
+                         sealing_strategy=FailingSealer(b"key"), max_attempts=3, retry_backoff_ms=20)
+    sealer.add(1, token="a")
+    assert sealer.add(2, token="b") is None # first attempt fails
+    assert not sealer.due() # backing off
+    time.sleep(0.03)
+    assert sealer.due()
+    assert sealer.seal() is None
+    assert sealer.attempts == 2 and not sealer.due()
+    time.sleep(0.05)
+    sealer.seal()
+
+    assert failed == [["a", "b"]]
+    assert sealed == []
+    assert sealer.pending == [] and sealer.events_failed == 2
+    db = session_factory()
+    assert db.query(Block).count() == 1 # genesis only
+    db.close()
+
+
+def test_redelivered_log_is_sealed_once_and_every_token_acked(session_factory):
+    acked = []
+    sealer = BlockSealer(session_factory, max_transactions=100, max_latency_ms=60000, on_sealed=acked.append,
+                         sealing_strategy=HMACAuthoritySealer(b"key"))
+    for log_id, token in [(1, "a"), (2, "b"), (1, "c"), (99, "d")]: # "c" redelivers log 1; log 99 does not exist
+        sealer.add(log_id, token=token)
+    block = sealer.seal()
+
+    assert [transaction["recipient"] for transaction in json.loads(block.data)] == ["203.0.113.0", "203.0.113.1"]
+    assert sealer.events_sealed == 2
+    assert acked == [["a", "b", "c", "d"]]
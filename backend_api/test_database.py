@@ -0,0 +1,19 @@
+from sqlalchemy import text
+
+from backend_api.database import create_db_engine
+
+
+def test_sqlite_profile_enables_wal_and_busy_timeout(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'phantomnet.db'}")
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1 # NORMAL
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() > 0
+        assert connection.execute(text("PRAGMA mmap_size")).scalar() > 0
+    engine.dispose()
+
+
+def test_in_memory_sqlite_still_works():
+    engine = create_db_engine("sqlite://")
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
@@ -0,0 +1,51 @@
+import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from backend_api.db_maintenance import add_block_seal_columns, create_attack_log_indexes, partition_day, partition_name, drop_expired_attack_log_partitions
+
+
+def test_migration_adds_missing_indexes_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        # attack_logs as created before the indexes existed
+        connection.execute(text(
+            "CREATE TABLE attack_logs (id INTEGER PRIMARY KEY, timestamp DATETIME, ip VARCHAR, port INTEGER, data VARCHAR, "
+            "attack_type VARCHAR, confidence_score FLOAT, is_anomaly BOOLEAN, anomaly_score FLOAT, "
+            "is_verified_threat BOOLEAN, is_blacklisted BOOLEAN)"
+        ))
+        connection.execute(text("CREATE INDEX ix_attack_logs_id ON attack_logs (id)"))
+
+    created = create_attack_log_indexes(engine)
+
+    assert sorted(created) == ["ix_attack_logs_anomalies", "ix_attack_logs_ip_timestamp", "ix_attack_logs_timestamp_id"]
+    assert create_attack_log_indexes(engine) == []
+    indexes = {index["name"] for index in inspect(engine).get_indexes("attack_logs")}
+    assert {"ix_attack_logs_ip_timestamp", "ix_attack_logs_timestamp_id", "ix_attack_logs_anomalies"} <= indexes
+
+
+def test_migration_adds_block_seal_columns(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE blocks (id INTEGER PRIMARY KEY, \"index\" INTEGER, timestamp DATETIME, data VARCHAR, "
+            "previous_hash VARCHAR, hash VARCHAR, proof INTEGER, merkle_root VARCHAR)"
+        ))
+
+    assert add_block_seal_columns(engine) == ["signature", "sealer"]
+    assert add_block_seal_columns(engine) == []
+    assert {"signature", "sealer"} <= {column["name"] for column in inspect(engine).get_columns("blocks")}
+
+
+def test_partition_names_round_trip():
+    day = datetime.date(2024, 2, 29)
+    assert partition_name(day) == "attack_logs_p20240229"
+    assert partition_day(partition_name(day)) == day
+    assert partition_day("attack_logs_legacy") is None
+    assert partition_day("attack_logs_default") is None
+
+
+def test_partitioning_requires_postgresql():
+    with pytest.raises(RuntimeError):
+        drop_expired_attack_log_partitions(create_engine("sqlite://"), retention_days=30)
@@ -0,0 +1,79 @@
+import threading
+import time
+import pytest
+
+from backend_api.geolocation import GeoLocationService
+
+GEO = {"city": "Mountain View", "region": "California", "country": "United States", "lat": 37.4, "lon": -122.1}
+
+
+class CountingFetcher:
+    def __init__(self, result=GEO, delay=0.0):
+        self.result = result
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, ip_address):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return self.result
+
+
+def test_repeated_lookups_hit_the_cache():
+    fetcher = CountingFetcher()
+    service = GeoLocationService(fetcher=fetcher, offline_db_path=None)
+
+    results = [service.lookup("8.8.8.8") for _ in range(100)]
+
+    assert all(result == GEO for result in results)
+    assert fetcher.calls == 1
+    assert service.stats()["hit_rate"] >= 0.95
+
+
+def test_private_and_invalid_ips_are_not_looked_up():
+    fetcher = CountingFetcher()
+    service = GeoLocationService(fetcher=fetcher, offline_db_path=None)
+
+    assert service.lookup("127.0.0.1") is None
+    assert service.lookup("10.1.2.3") is None
+    assert service.lookup("not-an-ip") is None
+    assert service.lookup(None) is None
+    assert fetcher.calls == 0
+
+
+def test_concurrent_lookups_for_one_ip_share_one_request():
+    fetcher = CountingFetcher(delay=0.2)
+    service = GeoLocationService(fetcher=fetcher, offline_db_path=None)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(service.lookup("1.1.1.1"))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fetcher.calls == 1
+    assert results == [GEO] * 10
+
+
+def test_upstream_rate_limit_is_enforced():
+    fetcher = CountingFetcher()
+    service = GeoLocationService(fetcher=fetcher, rate_limit=3, offline_db_path=None)
+
+    results = [service.lookup(f"8.8.4.{i}") for i in range(1, 6)]
+
+    assert fetcher.calls == 3
+    assert results[:3] == [GEO] * 3
+    assert results[3:] == [None, None]
+
+
+def test_failed_lookups_are_negatively_cached():
+    fetcher = CountingFetcher(result=None)
+    service = GeoLocationService(fetcher=fetcher, offline_db_path=None)
+
+    assert service.lookup("9.9.9.9") is None
+    assert service.lookup("9.9.9.9") is None
+    assert fetcher.calls == 1
+
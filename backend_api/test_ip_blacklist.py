@@ -0,0 +1,50 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend_api.database import Base, BlacklistedIP
+from backend_api.ip_blacklist import IPBlacklist
+
+
+def test_exact_addresses_and_cidr_blocks():
+    blacklist = IPBlacklist()
+    blacklist.replace(["203.0.113.7", "198.51.100.0/24", "2001:db8::/32", "192.0.2.9/32", "not-an-ip"])
+
+    assert blacklist.contains("203.0.113.7")
+    assert blacklist.contains("198.51.100.200")
+    assert blacklist.contains("2001:db8::1")
+    assert blacklist.contains("192.0.2.9")
+    assert not blacklist.contains("203.0.113.8")
+    assert not blacklist.contains("198.51.101.1")
+    assert not blacklist.contains("2001:db9::1")
+    assert not blacklist.contains("testclient")
+    assert len(blacklist) == 4
+
+
+def test_updates_from_the_pubsub_channel():
+    blacklist = IPBlacklist()
+    blacklist.apply_update({"action": "add", "ip_address": "10.0.0.0/8"})
+    blacklist.apply_update({"action": "add", "ip_address": "203.0.113.7"})
+    assert blacklist.contains("10.20.30.40")
+    assert blacklist.contains("203.0.113.7")
+
+    blacklist.apply_update({"action": "remove", "ip_address": "10.0.0.0/8"})
+    blacklist.apply_update({"action": "remove", "ip_address": "203.0.113.7"})
+    assert not blacklist.contains("10.20.30.40")
+    assert not blacklist.contains("203.0.113.7")
+
+
+def test_load_from_database():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([BlacklistedIP(ip_address="203.0.113.7"), BlacklistedIP(ip_address="198.51.100.0/24")])
+    db.commit()
+
+    blacklist = IPBlacklist()
+    blacklist.load(db)
+    db.close()
+
+    assert blacklist.contains("203.0.113.7")
+    assert blacklist.contains("198.51.100.1")
+    assert not blacklist.contains("192.0.2.1")
@@ -0,0 +1,72 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend_api.database import Base, AttackLog
+from backend_api.log_query import fetch_log_page, parse_fields, stream_logs_ndjson
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    # Pairs of logs share a timestamp, so the cursor has to break ties on id
+    db.add_all([
+        AttackLog(timestamp=START + timedelta(seconds=i // 2), ip=f"203.0.113.{i % 3}", port=22, data=f"payload {i}",
+                  attack_type="SSH Brute Force" if i % 2 else "Port Scan", is_anomaly=i % 5 == 0)
+        for i in range(25)
+    ])
+    db.commit()
+    db.close()
+    return factory
+
+
+def test_keyset_pages_cover_every_log_once_newest_first(session_factory):
+    db = session_factory()
+    seen, cursor = [], None
+    while True:
+        page = fetch_log_page(db, limit=10, cursor=cursor)
+        seen.extend(page["logs"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    db.close()
+
+    assert len(seen) == 25
+    assert len({log["id"] for log in seen}) == 25
+    keys = [(log["timestamp"], log["id"]) for log in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_filters_and_projection(session_factory):
+    db = session_factory()
+    page = fetch_log_page(db, parse_fields("ip,attack_type"), limit=100, ip="203.0.113.1", attack_type="SSH Brute Force",
+                          since=START + timedelta(seconds=2), is_anomaly=False)
+    db.close()
+
+    assert page["logs"]
+    assert all(set(log) == {"ip", "attack_type"} for log in page["logs"])
+    assert all(log["ip"] == "203.0.113.1" and log["attack_type"] == "SSH Brute Force" for log in page["logs"])
+
+
+def test_invalid_fields_and_cursor_are_rejected(session_factory):
+    with pytest.raises(ValueError):
+        parse_fields("ip,password")
+    with pytest.raises(ValueError):
+        stream_logs_ndjson(session_factory, cursor="not-a-cursor")
+
+
+def test_ndjson_export_streams_all_matching_logs(session_factory):
+    lines = list(stream_logs_ndjson(session_factory, parse_fields("id,is_anomaly"), is_anomaly=True))
+
+    logs = [json.loads(line) for line in lines]
+    assert len(logs) == 5
+    assert all(log["is_anomaly"] for log in logs)
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from backend_api.message_bus import (
+    StreamBackpressure, StreamConsumer, publish_stream, publish_stream_batch, stream_backlog,
+)
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis()
+
+
+def test_batch_publish_is_read_by_group_and_acked(client):
+    consumer = StreamConsumer("attack-events", "analyzers", "worker-1", cluster_id="eu", batch_size=3, block_ms=10, client=client)
+    ids = publish_stream_batch("attack-events", [{"seq": i} for i in range(5)], cluster_id="eu", client=client)
+    assert len(ids) == 5
+    assert client.xlen("eu:attack-events") == 5
+
+    batch = consumer.read()
+    assert [message["data"]["seq"] for _, message in batch] == [0, 1, 2]
+    assert consumer.ack([entry_id for entry_id, _ in batch]) == 3
+    assert [message["data"]["seq"] for _, message in consumer.read()] == [3, 4]
+    assert stream_backlog("attack-events", "analyzers", cluster_id="eu", client=client) == 2
+
+
+def test_entries_of_a_crashed_consumer_are_claimed(client):
+    crashed = StreamConsumer("events", "workers", "worker-1", batch_size=10, block_ms=10, claim_idle_ms=0, client=client)
+    publish_stream("events", {"seq": 1}, jwt_token="token", client=client)
+    assert len(crashed.read()) == 1 # and never acknowledged
+
+    survivor = StreamConsumer("events", "workers", "worker-2", batch_size=10, block_ms=10, claim_idle_ms=0, client=client)
+    handled = []
+    survivor.consume(handled.extend, should_stop=lambda: bool(handled))
+    assert handled == [{"data": {"seq": 1}, "jwt": "token"}]
+    assert stream_backlog("events", "workers", client=client) == 0
+
+
+def test_poison_messages_go_to_the_dead_letter_stream(client):
+    consumer = StreamConsumer("events", "workers", "worker-1", batch_size=10, block_ms=10, claim_idle_ms=0, max_deliveries=2, client=client)
+    publish_stream("events", {"seq": 1}, client=client)
+    for _ in range(2):
+        assert len(consumer.read()) == 1
+    # The third delivery would exceed max_deliveries
+    assert consumer.read() == []
+    assert client.xlen("events:dead") == 1
+    assert stream_backlog("events", "workers", client=client) == 0
+
+
+def test_backpressure_instead_of_trimming_unread_entries(client):
+    StreamConsumer("events", "slow", "worker-1", client=client)
+    publish_stream_batch("events", [{"seq": i} for i in range(3)], maxlen=4, group="slow", client=client)
+    with pytest.raises(StreamBackpressure):
+        publish_stream_batch("events", [{"seq": 3}, {"seq": 4}], maxlen=4, group="slow", client=client)
+    consumer = StreamConsumer("events", "slow", "worker-1", block_ms=10, client=client)
+    consumer.ack([entry_id for entry_id, _ in consumer.read()])
+    publish_stream_batch("events", [{"seq": 3}, {"seq": 4}], maxlen=4, group="slow", client=client)
+
+
+def test_dead_letters_are_looked_up_by_claimed_id(client):
+    first = StreamConsumer("events", "workers", "worker-1", batch_size=10, block_ms=10, client=client)
+    publish_stream_batch("events", [{"seq": i} for i in range(3)], client=client)
+    entry_ids = [entry_id for entry_id, _ in first.read()]
+    time.sleep(0.1)
+    # Another consumer just took over the middle entry, so it is not idle and not claimed below
+    client.xclaim("events", "workers", "worker-2", min_idle_time=0, message_ids=[entry_ids[1]])
+
+    claimer = StreamConsumer("events", "workers", "worker-3", batch_size=10, block_ms=10, claim_idle_ms=50, max_deliveries=1, client=client)
+    assert claimer.read() == []
+    assert [fields[b"message"] for _, fields in client.xrange("events:dead")] == [
+        fields[b"message"] for entry_id, fields in client.xrange("events") if entry_id.decode() != entry_ids[1]
+    ]
+
+
+def test_backpressure_check_on_a_stream_that_does_not_exist_yet(client):
+    assert stream_backlog("new-events", "slow", client=client) == 0
+    assert publish_stream("new-events", {"seq": 1}, group="slow", client=client)
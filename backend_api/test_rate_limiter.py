@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from backend_api.rate_limiter import RateLimiter
+
+
+def make_limiter(server=None, **kwargs):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa") # fakeredis needs lupa to run Lua scripts
+    return RateLimiter(redis_client=fakeredis.FakeAsyncRedis(server=server), **kwargs)
+
+
+def hits(limiter, key, count, limit, period):
+    async def run():
+        return [await limiter.hit(key, limit, period) for _ in range(count)]
+    return asyncio.run(run())
+
+
+def test_limit_is_enforced_with_retry_after():
+    limiter = make_limiter(lease_fraction=0)
+
+    results = hits(limiter, "rate_limit:203.0.113.7", 12, limit=10, period=60)
+
+    assert [allowed for allowed, _ in results] == [True] * 10 + [False] * 2
+    assert 0 < results[-1][1] <= 6
+
+
+def test_clients_under_the_limit_are_served_from_a_local_lease():
+    limiter = make_limiter(lease_fraction=0.1)
+
+    results = hits(limiter, "rate_limit:203.0.113.7", 50, limit=100, period=60)
+
+    assert all(allowed for allowed, _ in results)
+    assert limiter.redis_calls == 5
+
+
+def test_leases_never_exceed_the_limit():
+    limiter = make_limiter(lease_fraction=0.3)
+
+    results = hits(limiter, "rate_limit:203.0.113.7", 15, limit=10, period=60)
+
+    assert sum(allowed for allowed, _ in results) == 10
+
+
+def test_leases_spread_over_processes_do_not_starve_a_client():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    limiters = [make_limiter(server, lease_fraction=0.2, processes=20) for _ in range(20)]
+
+    # One request through every process, then the rest through the first one
+    allowed = sum(hits(limiter, "rate_limit:203.0.113.7", 1, limit=100, period=60)[0][0] for limiter in limiters)
+    allowed += sum(ok for ok, _ in hits(limiters[0], "rate_limit:203.0.113.7", 150, limit=100, period=60))
+
+    assert 80 <= allowed <= 100
+
+
+def test_falls_back_to_a_local_bucket_without_redis():
+    limiter = RateLimiter(redis_client=None)
+
+    results = hits(limiter, "rate_limit:203.0.113.7", 6, limit=5, period=60)
+
+    assert [allowed for allowed, _ in results] == [True] * 5 + [False]
+
+
+def test_routes_with_their_own_limit_are_recognised():
+    from fastapi import APIRouter
+
+    from backend_api.rate_limiter import matches_routes
+
+    router = APIRouter()
+    router.add_api_route("/agents/{agent_id}/heartbeat", lambda agent_id: None, methods=["POST"])
+
+    def scope(path, method="POST"):
+        return {"type": "http", "path": path, "method": method, "root_path": ""}
+
+    assert matches_routes(router.routes, "/api", scope("/api/agents/7/heartbeat"))
+    assert not matches_routes(router.routes, "/api", scope("/agents/7/heartbeat"))
+    assert not matches_routes(router.routes, "/api", scope("/api/logs", "GET"))
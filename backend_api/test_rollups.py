@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend_api.database import Base, AttackRollup
+from backend_api.rollups import apply_rollups, attack_count_telemetry, overview, prune_rollups, rollup_series
+
+START = datetime(2024, 1, 1, 10, 0, 0)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def make_results(count, start=START):
+    return [
+        {
+            "timestamp": (start + timedelta(minutes=i * 10)).isoformat(),
+            "attack_type": "SSH Brute Force" if i % 2 else "Port Scan",
+            "port": 22,
+            "country": "Germany" if i % 3 else None,
+            "honeypot": "ssh-1",
+            "confidence_score": 0.5 if i % 2 else 1.0,
+            "is_anomaly": i % 4 == 0,
+        }
+        for i in range(count)
+    ]
+
+
+def test_batches_add_to_existing_buckets(db):
+    apply_rollups(db, make_results(12))
+    apply_rollups(db, make_results(12))
+    db.commit()
+
+    series = rollup_series(db, "hour", START, START + timedelta(days=1))
+    assert [entry["count"] for entry in series] == [12, 12]
+    assert [entry["anomaly_count"] for entry in series] == [4, 2]
+    assert series[0]["average_confidence"] == 0.75
+    # Unknown dimensions are stored as a value, so their buckets are upserted too
+    assert db.scalar(select(func.count()).select_from(AttackRollup).where(
+        AttackRollup.granularity == "day", AttackRollup.country == "unknown", AttackRollup.attack_type == "Port Scan")) == 1
+
+
+def test_series_can_be_grouped_and_filtered(db):
+    apply_rollups(db, make_results(12))
+    db.commit()
+
+    by_type = rollup_series(db, "day", START, START + timedelta(days=1), group_by="attack_type")
+    assert {entry["attack_type"]: entry["count"] for entry in by_type} == {"Port Scan": 6, "SSH Brute Force": 6}
+    germany = rollup_series(db, "minute", START, START + timedelta(days=1), country="Germany")
+    assert sum(entry["count"] for entry in germany) == 8
+
+    with pytest.raises(ValueError):
+        rollup_series(db, "hour", START, START + timedelta(days=1), group_by="ip")
+
+
+def test_overview_and_telemetry(db):
+    apply_rollups(db, make_results(12))
+    apply_rollups(db, make_results(6, start=START + timedelta(days=1)))
+    db.commit()
+
+    summary = overview(db, START, START + timedelta(hours=1))
+    assert summary == {"total_attacks": 6, "anomalies": 2, "average_confidence": 0.75, "average_threat_score": 75.0}
+    assert attack_count_telemetry(db, START, START + timedelta(days=2)) == [
+        {"timestamp": START.replace(hour=0), "attack_count": 12},
+        {"timestamp": START.replace(hour=0) + timedelta(days=1), "attack_count": 6},
+    ]
+
+
+def test_threat_score_ignores_normal_traffic(db):
+    results = make_results(4)
+    for result in results[:2]:
+        result.update(attack_type="Normal", confidence_score=0.99)
+    apply_rollups(db, results)
+    db.commit()
+
+    summary = overview(db, START, START + timedelta(hours=1))
+    assert summary["average_threat_score"] == 75.0 # the Port Scan at 1.0 and SSH Brute Force at 0.5
+    assert summary["total_attacks"] == 4
+
+    apply_rollups(db, [dict(results[0], timestamp=(START + timedelta(days=3)).isoformat())])
+    db.commit()
+    assert overview(db, START + timedelta(days=3), START + timedelta(days=4))["average_threat_score"] is None
+
+
+def test_prune_keeps_other_granularities(db):
+    apply_rollups(db, make_results(12))
+    db.commit()
+
+    assert prune_rollups(db, "minute", START + timedelta(days=1)) == 12
+    assert rollup_series(db, "minute", START, START + timedelta(days=1)) == []
+    assert len(rollup_series(db, "hour", START, START + timedelta(days=1))) == 2
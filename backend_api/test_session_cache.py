@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend_api import auth
+from backend_api.database import Base, User, SessionToken
+from backend_api.session_cache import SessionCache
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    TestingSession = sessionmaker(bind=engine)
+
+    db = TestingSession()
+    user = User(username="analyst", hashed_password="x", role="user")
+    db.add(user)
+    db.commit()
+    db.add(SessionToken(jti="jti-1", user_id=user.id, expires_at=datetime.utcnow() + timedelta(minutes=30), is_valid=True))
+    db.commit()
+    db.close()
+
+    cache = SessionCache(ttl=30)
+    monkeypatch.setattr(auth, "SECRET_KEY", "test-secret")
+    monkeypatch.setattr(auth, "session_cache", cache)
+    token = jwt.encode({"sub": "analyst", "role": "user", "jti": "jti-1"}, "test-secret", algorithm=auth.ALGORITHM)
+    request = SimpleNamespace(cookies={"access_token": token})
+
+    def current_user():
+        db = TestingSession()
+        try:
+            return asyncio.run(auth.get_current_user(request, db)).username
+        finally:
+            db.close()
+
+    queries.clear()
+    return SimpleNamespace(current_user=current_user, queries=queries, cache=cache, session=TestingSession)
+
+
+def test_repeated_requests_cost_no_queries(setup):
+    assert setup.current_user() == "analyst"
+    assert len(setup.queries) == 2 # SessionToken and User
+
+    setup.queries.clear()
+    for _ in range(10):
+        assert setup.current_user() == "analyst"
+    assert setup.queries == []
+
+
+def test_revocation_is_seen_on_the_next_request(setup):
+    setup.current_user()
+
+    db = setup.session()
+    db.query(SessionToken).filter(SessionToken.jti == "jti-1").update({"is_valid": False, "revoked_at": datetime.utcnow()})
+    db.commit()
+    db.close()
+    setup.cache.apply_revocation({"jtis": ["jti-1"], "user_id": None})
+
+    with pytest.raises(HTTPException) as exc_info:
+        setup.current_user()
+    assert exc_info.value.status_code == 401
+
+
+def test_invalidating_a_user_drops_all_of_their_sessions(setup):
+    setup.current_user()
+    user_id = setup.cache.get("jti-1").id
+
+    setup.cache.apply_revocation({"jtis": [], "user_id": user_id})
+
+    assert setup.cache.get("jti-1") is None
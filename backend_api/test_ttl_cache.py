@@ -0,0 +1,14 @@
+import time
+
+from backend_api.ttl_cache import TTLCache
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a", None) is None # evicted as least recently used
+    assert cache.get("c") == 3
+    time.sleep(0.06)
+    assert cache.get("c", None) is None
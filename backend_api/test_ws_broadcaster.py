@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+from backend_api.ws_broadcaster import WebSocketBroadcaster
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0, block=False):
+        self.delay = delay
+        self.block = block
+        self.received = []
+        self.closed_with = None
+
+    async def send_text(self, text):
+        if self.block:
+            await asyncio.Event().wait()
+        await asyncio.sleep(self.delay)
+        self.received.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_slow_client_does_not_delay_the_others():
+    async def scenario():
+        broadcaster = WebSocketBroadcaster(queue_size=5, policy="drop_oldest")
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=0.05)
+        broadcaster.register(fast)
+        broadcaster.register(slow)
+
+        for i in range(20):
+            assert broadcaster.publish({"seq": i}) == 2
+            await asyncio.sleep(0.001)
+        assert [event["seq"] for event in fast.received] == list(range(20))
+        # The slow client keeps the newest events of its bounded queue
+        await asyncio.sleep(0.5)
+        assert [event["seq"] for event in slow.received][-5:] == list(range(15, 20))
+
+        stats = broadcaster.stats()
+        assert stats["connected"] == 2
+        assert sum(client["dropped"] for client in stats["clients"]) >= 10
+        assert stats["max_lag_seconds"] >= 0
+    asyncio.run(scenario())
+
+
+def test_disconnect_policy_closes_clients_that_fall_behind():
+    async def scenario():
+        broadcaster = WebSocketBroadcaster(queue_size=3, policy="disconnect")
+        stuck, healthy = FakeWebSocket(block=True), FakeWebSocket()
+        broadcaster.register(stuck)
+        broadcaster.register(healthy)
+
+        for i in range(10):
+            broadcaster.publish({"seq": i})
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.05)
+        assert stuck.closed_with == 1013
+        assert broadcaster.stats()["connected"] == 1
+        assert broadcaster.stats()["disconnected_slow"] == 1
+        assert len(healthy.received) == 10
+    asyncio.run(scenario())
+
+
+def test_blocked_send_times_out_and_unregister_stops_the_writer():
+    async def scenario():
+        broadcaster = WebSocketBroadcaster(queue_size=10, send_timeout=0.05)
+        stuck, leaving = FakeWebSocket(block=True), FakeWebSocket()
+        broadcaster.register(stuck)
+        broadcaster.register(leaving)
+        broadcaster.send(leaving, {"type": "initial_logs"})
+        broadcaster.publish({"seq": 1})
+        await asyncio.sleep(0.1)
+        assert stuck.closed_with == 1013
+        assert leaving.received == [{"type": "initial_logs"}, {"seq": 1}]
+
+        await broadcaster.unregister(leaving)
+        assert broadcaster.publish({"seq": 2}) == 0
+    asyncio.run(scenario())
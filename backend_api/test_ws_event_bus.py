@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from backend_api.ws_broadcaster import WebSocketBroadcaster
+from backend_api.ws_event_bus import WebSocketEventBus
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.received = []
+
+    async def send_text(self, text):
+        self.received.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+
+def make_bus(server, **kwargs):
+    client = fakeredis.aioredis.FakeRedis(server=server)
+    return WebSocketEventBus(client, broadcaster=WebSocketBroadcaster(), block_ms=50, **kwargs)
+
+
+def test_events_reach_clients_of_every_worker():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        workers = [make_bus(server), make_bus(server)]
+        sockets = [FakeWebSocket(), FakeWebSocket()]
+        readers = [asyncio.create_task(bus.run()) for bus in workers]
+        for bus, websocket in zip(workers, sockets):
+            await bus.attach(websocket)
+        await asyncio.sleep(0.1)
+
+        await workers[0].publish({"type": "anomaly_alert", "seq": 1})
+        await workers[1].publish({"type": "anomaly_alert", "seq": 2})
+        await asyncio.sleep(0.2)
+        for websocket in sockets:
+            assert [event["seq"] for event in websocket.received] == [1, 2]
+            assert all("event_id" in event for event in websocket.received)
+        for reader in readers:
+            reader.cancel()
+    asyncio.run(scenario())
+
+
+def test_reconnecting_client_gets_missed_events_once_and_in_order():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        bus = make_bus(server, replay_limit=3)
+        reader = asyncio.create_task(bus.run())
+        first = FakeWebSocket()
+        await bus.attach(first)
+        await asyncio.sleep(0.1)
+        for seq in range(3):
+            await bus.publish({"seq": seq})
+        await asyncio.sleep(0.2)
+        last_seen = first.received[0]["event_id"]
+
+        resumed = FakeWebSocket()
+        await bus.attach(resumed, last_event_id=last_seen)
+        await bus.publish({"seq": 3})
+        await asyncio.sleep(0.2)
+        assert [event["seq"] for event in resumed.received] == [1, 2, 3]
+
+        lagging = FakeWebSocket()
+        await bus.attach(lagging, last_event_id="0-0")
+        await asyncio.sleep(0.05)
+        assert [event.get("seq") for event in lagging.received] == [0, 1, 2, None]
+        assert lagging.received[-1] == {"type": "resync_required"}
+        reader.cancel()
+    asyncio.run(scenario())
+
+
+def test_client_behind_the_trimmed_stream_must_resync():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        bus = make_bus(server)
+        reader = asyncio.create_task(bus.run())
+        await asyncio.sleep(0.05)
+        for seq in range(5):
+            await bus.publish({"seq": seq})
+        await asyncio.sleep(0.1)
+        oldest = (await bus.redis_client.xrange(bus.stream, count=1))[0][0].decode()
+        await bus.redis_client.xtrim(bus.stream, maxlen=2, approximate=False)
+
+        resumed = FakeWebSocket()
+        await bus.attach(resumed, last_event_id=oldest)
+        await asyncio.sleep(0.05)
+        assert resumed.received == [{"type": "resync_required"}]
+        reader.cancel()
+    asyncio.run(scenario())
+
+
+def test_malformed_entry_does_not_stop_the_reader():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        bus = make_bus(server)
+        websocket = FakeWebSocket()
+        reader = asyncio.create_task(bus.run())
+        await bus.attach(websocket)
+        await asyncio.sleep(0.05)
+
+        await bus.redis_client.xadd(bus.stream, {"event": "not json"})
+        await bus.publish({"seq": 1})
+        await asyncio.sleep(0.2)
+        assert not reader.done()
+        assert [event["seq"] for event in websocket.received] == [1]
+        reader.cancel()
+    asyncio.run(scenario())
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+from loguru import logger
+
+WS_CLIENT_QUEUE_SIZE = int(os.getenv("WS_CLIENT_QUEUE_SIZE", "256")) # events buffered per client
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "drop_oldest") # or "disconnect"
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10")) # seconds before a stuck send disconnects the client
+
+
+class ClientQueue:
+    """One connected WebSocket: its bounded outgoing queue and the task that drains it."""
+
+    def __init__(self, websocket, maxsize: int, policy: str):
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+        self.pending = deque() # (enqueued_at, text)
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.connected_at = time.time()
+        self.writer = None
+
+    def enqueue(self, text: str) -> bool:
+        """Queues an already serialized event. Returns False if the client has to be disconnected."""
+        if self.closed:
+            return False
+        if len(self.pending) >= self.maxsize:
+            if self.policy == "disconnect":
+                return False
+            self.pending.popleft()
+            self.dropped += 1
+        self.pending.append((time.monotonic(), text))
+        self.ready.set()
+        return True
+
+    async def run(self, send_timeout: float):
+        while True:
+            if not self.pending:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            enqueued_at, text = self.pending.popleft()
+            await asyncio.wait_for(self.websocket.send_text(text), send_timeout)
+            self.sent += 1
+            self.last_lag = time.monotonic() - enqueued_at
+            self.max_lag = max(self.max_lag, self.last_lag)
+
+    def stats(self) -> dict:
+        # While events are queued the lag is the age of the oldest one, else that of the last event sent
+        lag = time.monotonic() - self.pending[0][0] if self.pending else self.last_lag
+        return {
+            "queued": len(self.pending),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "lag_seconds": round(lag, 4),
+            "max_lag_seconds": round(self.max_lag, 4),
+            "connected_for_seconds": round(time.time() - self.connected_at, 1),
+        }
+
+
+class WebSocketBroadcaster:
+    """
+    Fans events out to connected WebSockets without letting one slow client
+    hold up the others or the caller.
+
+    publish() serializes an event once and only appends the text to each
+    client's bounded queue; a writer task per client does the sending. When a
+    client falls `queue_size` events behind, the "drop_oldest" policy discards
+    its oldest queued events and "disconnect" closes it. A send that blocks for
+    longer than `send_timeout` also disconnects the client.
+    """
+
+    def __init__(self, queue_size: int = WS_CLIENT_QUEUE_SIZE, policy: str = WS_SLOW_CLIENT_POLICY,
+                 send_timeout: float = WS_SEND_TIMEOUT):
+        if policy not in ("drop_oldest", "disconnect"):
+            raise ValueError(f"Unknown slow client policy: {policy}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.clients = {} # websocket -> ClientQueue
+        self.published = 0
+        self.disconnected_slow = 0
+
+    def register(self, websocket) -> ClientQueue:
+        client = ClientQueue(websocket, self.queue_size, self.policy)
+        client.writer = asyncio.create_task(self._write(client))
+        self.clients[websocket] = client
+        return client
+
+    async def unregister(self, websocket):
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        client.closed = True
+        if client.writer is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+            try:
+                await client.writer
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def send(self, websocket, event: dict):
+        """Queues an event for one client only, in order with the broadcasts."""
+        client = self.clients.get(websocket)
+        if client is not None and not client.enqueue(json.dumps(event, default=str)):
+            self._disconnect_slow(client)
+
+    def publish(self, event: dict) -> int:
+        """Queues the event for every client. Never waits on a client; returns the number of clients."""
+        if not self.clients:
+            return 0
+        text = json.dumps(event, default=str)
+        self.published += 1
+        # Copied, since _disconnect_slow removes clients
+        for client in list(self.clients.values()):
+            if not client.enqueue(text):
+                self._disconnect_slow(client)
+        return len(self.clients)
+
+    def stats(self) -> dict:
+        clients = [client.stats() for client in self.clients.values()]
+        return {
+            "connected": len(clients),
+            "published": self.published,
+            "disconnected_slow": self.disconnected_slow,
+            "max_lag_seconds": max((client["lag_seconds"] for client in clients), default=0.0),
+            "clients": clients,
+        }
+
+    def _disconnect_slow(self, client: ClientQueue):
+        if client.closed:
+            return
+        client.closed = True # Stop queueing for it before the close task runs
+        self.disconnected_slow += 1
+        logger.warning(f"Disconnecting a WebSocket client that is {len(client.pending)} events behind.")
+        asyncio.create_task(self._close(client))
+
+    async def _write(self, client: ClientQueue):
+        try:
+            await client.run(self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.disconnected_slow += 1
+            logger.warning(f"WebSocket send blocked for more than {self.send_timeout}s; disconnecting the client.")
+            await self._close(client)
+        except Exception as e:
+            logger.info(f"WebSocket client gone while sending: {e}")
+            await self._close(client)
+
+    async def _close(self, client: ClientQueue):
+        await self.unregister(client.websocket)
+        try:
+            await client.websocket.close(code=1013) # Try again later
+        except Exception:
+            pass # Already closed
+
+
+broadcaster = WebSocketBroadcaster()
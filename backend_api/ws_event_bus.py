@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+from loguru import logger
+
+from backend_api.ws_broadcaster import broadcaster as default_broadcaster
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+WS_EVENTS_STREAM = os.getenv("WS_EVENTS_STREAM", "ws-events")
+WS_EVENTS_STREAM_MAXLEN = int(os.getenv("WS_EVENTS_STREAM_MAXLEN", "10000")) # events kept for resuming clients
+WS_REPLAY_LIMIT = int(os.getenv("WS_REPLAY_LIMIT", "1000")) # events replayed to one reconnecting client
+
+
+class WebSocketEventBus:
+    """
+    Shares WebSocket events between gateway workers and replicas through a
+    Redis stream.
+
+    publish() appends the event to the stream once. Every worker runs one run()
+    loop that reads the stream and hands each event, tagged with its stream ID
+    as "event_id", to its local broadcaster. A client that reconnects with the
+    last event_id it saw gets the events it missed replayed before the live
+    ones. If Redis is down, events are still delivered to this worker's clients.
+    """
+
+    def __init__(self, redis_client, broadcaster=default_broadcaster, stream: str = WS_EVENTS_STREAM,
+                 maxlen: int = WS_EVENTS_STREAM_MAXLEN, replay_limit: int = WS_REPLAY_LIMIT,
+                 block_ms: int = 5000, retry_delay: float = 1.0):
+        self.redis_client = redis_client
+        self.broadcaster = broadcaster
+        self.stream = stream
+        self.maxlen = maxlen
+        self.replay_limit = replay_limit
+        self.block_ms = block_ms
+        self.retry_delay = retry_delay
+        self.last_id = None # ID of the last event handed to the broadcaster
+
+    async def publish(self, event: dict):
+        try:
+            await self.redis_client.xadd(self.stream, {"event": json.dumps(event, default=str)},
+                                         maxlen=self.maxlen, approximate=True)
+        except (redis.RedisError, OSError) as e:
+            logger.warning(f"Event stream unavailable, delivering to local clients only: {e}")
+            self.broadcaster.publish(event)
+
+    async def run(self):
+        """Reads the stream forever and fans every event out to the local clients."""
+        while True:
+            try:
+                if self.last_id is None:
+                    self.last_id = await self._latest_id()
+                replies = await self.redis_client.xread({self.stream: self.last_id}, block=self.block_ms, count=500)
+                for _, entries in replies:
+                    for entry_id, fields in entries:
+                        self.last_id = _decode(entry_id)
+                        event = _event_or_none(entry_id, fields)
+                        if event is not None:
+                            self.broadcaster.publish(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The stream keeps the events, so reading resumes from last_id without a gap
+                logger.warning(f"Lost the event stream: {e}. Retrying in {self.retry_delay}s.")
+                await asyncio.sleep(self.retry_delay)
+
+    async def attach(self, websocket, last_event_id: Optional[str] = None):
+        """
+        Registers the client with the broadcaster. With last_event_id, first
+        queues the events after it that the client has missed, so it sees every
+        event exactly once and in order. Past replay_limit events it gets a
+        "resync_required" event instead of the rest, and so does a client whose
+        events were already trimmed from the stream.
+        """
+        missed = []
+        if last_event_id and self.last_id is not None:
+            after = last_event_id
+            try:
+                if await self._trimmed_since(last_event_id):
+                    raise _ResyncRequired
+                # Catch up to what this worker has already broadcast; the reader may move on meanwhile
+                while len(missed) < self.replay_limit:
+                    until = self.last_id
+                    entries = await self.redis_client.xrange(self.stream, min=f"({after}", max=until,
+                                                             count=self.replay_limit - len(missed))
+                    missed.extend(event for event in (_event_or_none(*entry) for entry in entries) if event is not None)
+                    after = _decode(entries[-1][0]) if entries else until
+                    if after == self.last_id:
+                        break
+                else:
+                    raise _ResyncRequired
+            except _ResyncRequired:
+                # Too far behind; the client has to reload its state (e.g. GET /logs)
+                missed.append({"type": "resync_required"})
+            except (redis.ResponseError, ValueError):
+                pass # Malformed last_event_id: no replay
+            except (redis.RedisError, OSError) as e:
+                logger.warning(f"Could not replay events after {last_event_id}: {e}")
+        # No await from here on, so no broadcast can slip in between the replay and registration
+        self.broadcaster.register(websocket)
+        for event in missed:
+            self.broadcaster.send(websocket, event)
+
+    async def _trimmed_since(self, last_event_id: str) -> bool:
+        """Whether MAXLEN trimming may have removed events after last_event_id."""
+        info = await self.redis_client.xinfo_stream(self.stream)
+        first_entry = info.get("first-entry")
+        if not first_entry or _parse_id(last_event_id) >= _parse_id(_decode(first_entry[0])):
+            return False
+        # Trimming removes the oldest entries, so anything older than the first one was removed.
+        # Redis < 7 does not report entries-added: assume the worst.
+        entries_added = info.get("entries-added")
+        return entries_added is None or entries_added > info.get("length", 0)
+
+    async def _latest_id(self) -> str:
+        entries = await self.redis_client.xrevrange(self.stream, count=1)
+        return _decode(entries[0][0]) if entries else "0-0"
+
+
+class _ResyncRequired(Exception):
+    pass
+
+
+def _parse_id(entry_id: str) -> tuple[int, int]:
+    milliseconds, _, sequence = entry_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _event(entry_id, fields: dict) -> dict:
+    event = json.loads(fields.get(b"event") or fields.get("event"))
+    event["event_id"] = _decode(entry_id)
+    return event
+
+
+def _event_or_none(entry_id, fields: dict) -> Optional[dict]:
+    """_event, or None for an entry that is not a JSON event, so one bad entry cannot stop the stream."""
+    try:
+        return _event(entry_id, fields)
+    except Exception as e:
+        logger.warning(f"Skipping malformed event {_decode(entry_id)}: {e}")
+        return None
+
+
+event_bus = WebSocketEventBus(redis_client=aioredis.Redis.from_url(REDIS_URL))
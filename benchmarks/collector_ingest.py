@@ -0,0 +1,75 @@
+"""
+Compares collector throughput for per-event ingest (/logs/ingest) against
+batched ingest (/logs/ingest/batch).
+
+Run against a live collector (RabbitMQ and the database must be up):
+
+    python benchmarks/collector_ingest.py --url http://localhost:8001 --events 5000 --batch-size 500
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+
+def make_events(count: int) -> list[dict]:
+    return [
+        {
+            "ip": f"203.0.113.{random.randint(1, 254)}",
+            "port": random.choice([21, 22, 23, 80, 443, 3306]),
+            "data": f"benchmark payload {i}",
+        }
+        for i in range(count)
+    ]
+
+
+async def run_per_event(client: httpx.AsyncClient, url: str, events: list[dict], concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(event):
+        async with semaphore:
+            response = await client.post(f"{url}/logs/ingest", json=event)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(event) for event in events))
+    return time.perf_counter() - start
+
+
+async def run_batched(client: httpx.AsyncClient, url: str, events: list[dict], batch_size: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    batches = [events[i:i + batch_size] for i in range(0, len(events), batch_size)]
+
+    async def send(batch):
+        async with semaphore:
+            response = await client.post(f"{url}/logs/ingest/batch", json=batch)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(batch) for batch in batches))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    async with httpx.AsyncClient(timeout=60) as client:
+        per_event = await run_per_event(client, args.url, events, args.concurrency)
+        batched = await run_batched(client, args.url, events, args.batch_size, args.concurrency)
+
+    print(f"events:     {args.events}")
+    print(f"per-event:  {per_event:8.2f}s  {args.events / per_event:10.0f} events/s")
+    print(f"batched:    {batched:8.2f}s  {args.events / batched:10.0f} events/s  (batch size {args.batch_size})")
+    print(f"speedup:    {per_event / batched:8.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Measures proof-of-work hash rates: the original loop (hexdigest of a freshly
+formatted string per nonce), the single-process pow_engine kernel (copied
+prefix state, raw digest comparison) and the kernel across a process pool.
+
+    python benchmarks/pow_hashrate.py
+    python benchmarks/pow_hashrate.py --difficulty 6 --workers 8 --blocks 3
+
+Each strategy searches proofs for the same chain of --blocks blocks and must
+find the same proofs; the rate counts every nonce up to the proof found.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blockchain_layer import pow_engine
+
+
+def original_find_proof(last_proof: int, difficulty: int) -> int:
+    target = "0" * difficulty
+    proof = 0
+    while not hashlib.sha256(f'{last_proof}{proof}'.encode()).hexdigest().startswith(target):
+        proof += 1
+    return proof
+
+
+def run(name: str, find, blocks: int, baseline: float = None):
+    last_proof, hashes, proofs = 100, 0, []
+    started = time.perf_counter()
+    for _ in range(blocks):
+        proof = find(last_proof)
+        proofs.append(proof)
+        hashes += proof + 1
+        last_proof = proof
+    elapsed = time.perf_counter() - started
+    rate = hashes / elapsed
+    speedup = f"  {rate / baseline:5.1f}x" if baseline else ""
+    print(f"  {name:<22} {rate / 1e6:8.2f} MH/s  {elapsed:7.2f}s{speedup}")
+    return rate, proofs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--difficulty", type=int, default=5, help="leading zero hex digits")
+    parser.add_argument("--blocks", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=pow_engine.POW_WORKERS)
+    args = parser.parse_args()
+
+    print(f"difficulty {args.difficulty}, {args.blocks} blocks")
+    baseline, expected = run("original", lambda p: original_find_proof(p, args.difficulty), args.blocks)
+    _, proofs = run("kernel", lambda p: pow_engine.find_proof(p, args.difficulty, workers=1), args.blocks, baseline)
+    assert proofs == expected, "kernel found different proofs"
+
+    pow_engine.POW_PARALLEL_MIN_DIFFICULTY = 0
+    pow_engine.find_proof(0, 1, workers=args.workers) # start the pool outside the measurement
+    _, proofs = run(f"kernel, {args.workers} processes",
+                    lambda p: pow_engine.find_proof(p, args.difficulty, workers=args.workers), args.blocks, baseline)
+    assert proofs == expected, "parallel search found different proofs"
+    pow_engine.shutdown()
+
+
+if __name__ == "__main__":
+    main()
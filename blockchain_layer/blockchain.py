@@ -2,23 +2,91 @@ import os
 import json
 import hashlib
 import datetime # Import datetime
+import threading
+import weakref
 from time import time
-from sqlalchemy.orm import Session
-from backend_api.database import Block # Import the Block model
+from typing import NamedTuple, Optional
+from sqlalchemy import event, func
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+from loguru import logger
+from backend_api.database import Block, ChainCheckpoint # Import the Block model
+from blockchain_layer.sealing import (BLOCKCHAIN_LEGACY_POW_UNTIL, POW_DEFAULT_DIFFICULTY, SealingStrategy, ProofOfWorkSealer,
+                                      create_sealer, verify_block)
 
 BLOCKCHAIN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blockchain.json")
+TIP_RETRIES = 5 # attempts to seal on top of a tip another writer keeps moving
+CHAIN_VERIFY_BATCH_SIZE = int(os.getenv("CHAIN_VERIFY_BATCH_SIZE", "1000")) # blocks fetched per round trip
+
+
+class ChainTip(NamedTuple):
+    """What the next block needs from the last one: its index, its hash (the next previous_hash) and its proof."""
+    index: int
+    hash: str
+    proof: int
+
+
+class SegmentResult(NamedTuple):
+    """A verified range of blocks: where signing starts and unsigned blocks end in it, and its last block's hash."""
+    first_signed: Optional[int]
+    last_unsigned: Optional[int]
+    last_hash: str
+
+
+class StaleChainTip(Exception):
+    """Another writer appended a block since the tip was cached; the block was not added."""
+
+
+# Committed tip per database engine, shared by every Blockchain of the process
+_tips = weakref.WeakKeyDictionary()
+_tips_lock = threading.Lock()
+_PENDING_TIP = "pending_chain_tip" # Session.info key for the tip of a block not yet committed
+
+
+def _publish_tip(bind, tip: ChainTip):
+    with _tips_lock:
+        current = _tips.get(bind)
+        if current is None or tip.index > current.index:
+            _tips[bind] = tip
+
+
+def reset_tip_cache(bind=None):
+    """Forgets the cached tip of one engine, or of all. Needed when blocks are deleted behind the cache's back."""
+    with _tips_lock:
+        if bind is None:
+            _tips.clear()
+        else:
+            _tips.pop(bind, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _promote_pending_tip(session):
+    pending = session.info.pop(_PENDING_TIP, None)
+    if pending is not None:
+        _publish_tip(*pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_tip(session):
+    session.info.pop(_PENDING_TIP, None)
 
 
 
 class Blockchain:
     """Manages the blockchain, including creating blocks, adding transactions, and handling persistence."""
 
-    def __init__(self, db: Session):
-        """Initializes a new Blockchain instance, ensuring a genesis block exists in the database."""
+    def __init__(self, db: Session, sealer: SealingStrategy = None):
+        """Initializes a new Blockchain instance, ensuring a genesis block exists in the database.
+
+        Args:
+            db (Session): The database session.
+            sealer (SealingStrategy, optional): Seals new blocks. Defaults to the BLOCKCHAIN_SEALER strategy.
+        """
         self.db = db
+        self.sealer = sealer
         self.current_transactions = []
-        # Ensure genesis block exists
-        if not self.db.query(Block).filter(Block.index == 1).first():
+        # Ensure genesis block exists; once the tip is cached this needs no query
+        if self.tip is None:
             self.new_block(proof=100, previous_hash='1') # Create genesis block
             self.db.commit() # Commit the genesis block
 
@@ -33,27 +101,72 @@ class Blockchain:
 
         Returns:
             Block: The new Block object.
+
+        Raises:
+            StaleChainTip: Another writer took the next index first. The cached tip is reloaded on the next use;
+                on SQLite the session's transaction has been rolled back.
+        """
+        return self._append(proof, previous_hash)
+
+    def seal_block(self) -> Block:
+        """Creates the next block from the current transactions and seals it with the sealing strategy.
+
+        Returns:
+            Block: The new, sealed Block object. Committing is left to the caller.
         """
-        last_block_obj = self.last_block # Get the last block from the database
+        sealer = self.sealer or default_sealer()
+        for attempt in range(TIP_RETRIES):
+            tip = self.tip
+            proof = sealer.find_proof(tip.proof if tip else 0)
+            try:
+                return self._append(proof, sealer=sealer)
+            except StaleChainTip:
+                if attempt == TIP_RETRIES - 1:
+                    raise
+
+    def _append(self, proof: int, previous_hash: str = None, sealer: SealingStrategy = None) -> Block:
+        """Adds the block after the cached tip. It is flushed at once, so a taken index is detected here."""
+        tip = self.tip
 
         # Calculate Merkle root of current transactions
         transaction_hashes = [self.hash(t) for t in self.current_transactions]
         merkle_root_hash = self.merkle_root(transaction_hashes) if transaction_hashes else None
 
         block_data = {
-            'index': (last_block_obj.index + 1) if last_block_obj else 1,
+            'index': (tip.index + 1) if tip else 1,
             'timestamp': datetime.datetime.fromtimestamp(time()), # Convert float timestamp to datetime object
-            'transactions': self.current_transactions,
+            'data': json.dumps(self.current_transactions), # The Block model stores the transactions as JSON
             'merkle_root': merkle_root_hash, # Add Merkle root to the block
             'proof': proof,
-            'previous_hash': previous_hash or (self.hash(last_block_obj.to_dict()) if last_block_obj else '1'),
-                                # Pass dictionary of last block to hash function
+            'previous_hash': previous_hash or (tip.hash if tip else '1'),
         }
-        
+        block_data['hash'] = self.content_hash(block_data)
+        if sealer is not None:
+            block_data['sealer'] = sealer.name
+            block_data['signature'] = sealer.sign(block_data['hash'])
+
         # Create a new Block object and add it to the session
         new_db_block = Block(**block_data)
-        self.db.add(new_db_block)
+        bind = self.db.get_bind()
+        # pysqlite's SAVEPOINT outside a transaction commits on release, so SQLite rolls back the whole session instead
+        use_savepoint = bind.dialect.name != "sqlite"
+        try:
+            if use_savepoint:
+                with self.db.begin_nested():
+                    self.db.add(new_db_block)
+            else:
+                self.db.add(new_db_block)
+                self.db.flush()
+        except IntegrityError as e:
+            # The index (or hash) is taken: someone else sealed on this tip
+            if not use_savepoint:
+                self.db.rollback()
+            self.db.info.pop(_PENDING_TIP, None)
+            reset_tip_cache(bind)
+            raise StaleChainTip(f"Block {block_data['index']} already exists") from e
         # self.db.commit() # Commit handled by the caller (app.py)
+        # Published to the other Blockchain instances once the caller commits
+        self.db.info[_PENDING_TIP] = (bind, ChainTip(new_db_block.index, self.hash(new_db_block.to_dict()), proof))
         # Reset the current list of transactions
         self.current_transactions = []
         return new_db_block
@@ -80,8 +193,8 @@ class Blockchain:
             'attack_type': attack_type,
             'confidence_score': confidence_score,
         })
-        last_block_obj = self.last_block
-        return (last_block_obj.index + 1) if last_block_obj else 1
+        tip = self.tip
+        return (tip.index + 1) if tip else 1
 
     @staticmethod
     def hash(block: dict) -> str:
@@ -97,11 +210,44 @@ class Blockchain:
         block_string = json.dumps(block, sort_keys=True).encode()
         return hashlib.sha256(block_string).hexdigest()
 
+    @staticmethod
+    def content_hash(block) -> str:
+        """The SHA-256 hash stored in Block.hash, over the block contents without hash and seal.
+
+        Args:
+            block (dict | Block): The block fields or a Block object.
+
+        Returns:
+            str: The SHA-256 hash of the block contents.
+        """
+        fields = ('index', 'timestamp', 'data', 'merkle_root', 'proof', 'previous_hash')
+        contents = {field: (block[field] if isinstance(block, dict) else getattr(block, field)) for field in fields}
+        contents['timestamp'] = contents['timestamp'].isoformat()
+        return Blockchain.hash(contents)
+
     @property
     def last_block(self) -> Block | None: # Returns a Block object or None
         """Returns the last Block in the database."""
         return self.db.query(Block).order_by(Block.index.desc()).first()
 
+    @property
+    def tip(self) -> ChainTip | None:
+        """The last block as a ChainTip: this session's uncommitted block, else the process-wide cache,
+        loaded from the database on a miss. None while the chain is empty."""
+        pending = self.db.info.get(_PENDING_TIP)
+        if pending is not None:
+            return pending[1]
+        bind = self.db.get_bind()
+        with _tips_lock:
+            tip = _tips.get(bind)
+        if tip is None:
+            last_block_obj = self.last_block
+            if last_block_obj is None:
+                return None
+            tip = ChainTip(last_block_obj.index, self.hash(last_block_obj.to_dict()), last_block_obj.proof)
+            _publish_tip(bind, tip)
+        return tip
+
     def proof_of_work(self, last_proof: int) -> int:
         """Simple Proof of Work Algorithm:
         - Find a number p' such that hash(pp') contains 4 leading zeroes
@@ -113,10 +259,7 @@ class Blockchain:
         Returns:
             int: The new proof.
         """
-        proof = 0
-        while self.valid_proof(last_proof, proof) is False:
-            proof += 1
-        return proof
+        return ProofOfWorkSealer().find_proof(last_proof)
 
     @staticmethod
     def valid_proof(last_proof: int, proof: int) -> bool:
@@ -129,9 +272,7 @@ class Blockchain:
         Returns:
             bool: True if correct, False otherwise.
         """
-        guess = f'{last_proof}{proof}'.encode()
-        guess_hash = hashlib.sha256(guess).hexdigest()
-        return guess_hash[:4] == "0000"
+        return ProofOfWorkSealer().valid_proof(last_proof, proof)
 
     @staticmethod
     def merkle_root(hashes):
@@ -142,21 +283,120 @@ class Blockchain:
             layer = [hashlib.sha256(layer[i] + layer[i+1]).digest() for i in range(0, len(layer), 2)]
         return layer[0].hex()
 
-    def is_chain_valid(self) -> bool:
-        """Determines if the entire blockchain is valid by checking hashes and proofs."""
-        blocks = self.db.query(Block).order_by(Block.index).all()
-        if not blocks: # An empty chain is technically valid, or handle as an error
-            return True
+    def is_chain_valid(self, full: bool = False) -> bool:
+        """Determines if the blockchain is valid by checking hashes and seals.
 
-        for i in range(1, len(blocks)):
-            block = blocks[i]
-            last_block = blocks[i-1]
+        Only the blocks after the last ChainCheckpoint are checked, and a new checkpoint
+        is recorded at the tip when they are valid, so each call costs as much as the
+        blocks sealed since the previous one. The checkpointed block itself must still
+        have its recorded hash, but the blocks before it are not read again: a block
+        edited behind the checkpoint is only detected with full=True.
 
-            # Check that the hash of the previous block is correct
-            if block.previous_hash != self.hash(last_block.to_dict()):
-                return False
+        Args:
+            full (bool): Ignore the checkpoints and verify the whole chain.
 
-            # Check that the Proof of Work is correct
-            if not self.valid_proof(last_block.proof, block.proof):
+        Returns:
+            bool: True if valid, False otherwise.
+        """
+        genesis = self.db.query(Block).order_by(Block.index).first()
+        if genesis is None: # An empty chain is technically valid, or handle as an error
+            return True
+
+        checkpoint = None if full else self.db.query(ChainCheckpoint).order_by(ChainCheckpoint.block_index.desc()).first()
+        if checkpoint is not None:
+            checkpoint_block = self.db.query(Block).filter(Block.index == checkpoint.block_index).first()
+            if checkpoint_block is None or self.hash(checkpoint_block.to_dict()) != checkpoint.block_hash:
                 return False
+            start_index, authority_sealed = checkpoint.block_index, checkpoint.authority_sealed
+        else:
+            start_index, authority_sealed = genesis.index, genesis.signature is not None
+        tip_index = self.db.query(func.max(Block.index)).scalar()
+        if tip_index == start_index:
+            return True
+
+        try:
+            sealer = self.sealer or default_sealer()
+            sealers = {sealer.kind: sealer} if sealer.kind != "pow" else {}
+        except RuntimeError: # No sealing key configured: signed blocks cannot be verified
+            sealer, sealers = None, {}
+        # Unless this node runs proof of work, unsigned blocks are only legitimate up to the configured cutoff
+        legacy_pow_until = None if sealer is not None and sealer.kind == "pow" else BLOCKCHAIN_LEGACY_POW_UNTIL
+        # A block's own sealer field must not lower the work it is checked against
+        pow_difficulty = sealer.difficulty if sealer is not None and sealer.kind == "pow" else POW_DEFAULT_DIFFICULTY
+
+        result = self._verify_segment(self.db, start_index, tip_index, sealers, legacy_pow_until, pow_difficulty)
+        if result is None:
+            return False
+
+        # Once blocks are signed, a proof-of-work block after them would be a forgery
+        first_signed, last_unsigned = result.first_signed, result.last_unsigned
+        if last_unsigned is not None and (authority_sealed or (first_signed is not None and last_unsigned > first_signed)):
+            return False
+
+        if _PENDING_TIP not in self.db.info: # never checkpoint a block this session may still roll back
+            self._record_checkpoint(tip_index, result.last_hash, authority_sealed or first_signed is not None)
         return True
+
+    def _verify_segment(self, db: Session, after: int, until: int, sealers: dict, legacy_pow_until: Optional[int] = None,
+                        pow_difficulty: int = POW_DEFAULT_DIFFICULTY):
+        """Checks blocks after+1 .. until against their predecessors, streaming them from the database.
+
+        Returns:
+            SegmentResult | None: None if a block is invalid or missing.
+        """
+        last_block = db.query(Block).filter(Block.index == after).first()
+        if last_block is None:
+            return None
+        last_hash = self.hash(last_block.to_dict())
+        first_signed = last_unsigned = None
+        blocks = (db.query(Block).filter(Block.index > after, Block.index <= until)
+                  .order_by(Block.index).yield_per(CHAIN_VERIFY_BATCH_SIZE))
+        for block in blocks:
+            # Indexes must follow each other, or a block was removed
+            if block.index != last_block.index + 1:
+                return None
+
+            # Check that the hash of the previous block is correct
+            if block.previous_hash != last_hash:
+                return None
+
+            # Sealed blocks must match their contents, or the seal would not cover the data
+            if block.sealer is not None and block.hash != self.content_hash(block):
+                return None
+
+            # Check that the proof of work or the signature is correct
+            if not verify_block(block, last_block, sealers, legacy_pow_until, pow_difficulty):
+                return None
+
+            if block.signature is not None:
+                first_signed = block.index if first_signed is None else first_signed
+            else:
+                last_unsigned = block.index
+            last_block, last_hash = block, self.hash(block.to_dict())
+        if last_block.index != until:
+            return None
+        return SegmentResult(first_signed, last_unsigned, last_hash)
+
+    def _record_checkpoint(self, block_index: int, block_hash: str, authority_sealed: bool):
+        # Its own session, so verifying never commits the caller's pending changes
+        db = sessionmaker(bind=self.db.get_bind())()
+        try:
+            db.add(ChainCheckpoint(block_index=block_index, block_hash=block_hash, authority_sealed=authority_sealed))
+            db.commit()
+        except IntegrityError:
+            db.rollback() # A concurrent verification checkpointed the same block
+        except OperationalError as e:
+            db.rollback() # The next verification walks these blocks again
+            logger.warning(f"Could not record chain checkpoint at block {block_index}: {e}")
+        finally:
+            db.close()
+
+
+_default_sealer = None
+
+def default_sealer() -> SealingStrategy:
+    """The BLOCKCHAIN_SEALER strategy, created on first use."""
+    global _default_sealer
+    if _default_sealer is None:
+        _default_sealer = create_sealer()
+    return _default_sealer
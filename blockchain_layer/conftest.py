@@ -2,6 +2,7 @@ import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from backend_api.database import Base, get_db
+from blockchain_layer.blockchain import reset_tip_cache
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
@@ -20,3 +21,4 @@ def db_session():
     finally:
         db.close()
         Base.metadata.drop_all(bind=engine)
+        reset_tip_cache(engine) # the blocks were dropped behind the cache
@@ -0,0 +1,122 @@
+"""Proof-of-work search.
+
+A proof p' for the previous proof p is valid when sha256(f"{p}{p'}") starts
+with `difficulty` zero hex digits, i.e. 4 * difficulty zero bits. The search
+hashes the prefix f"{p}" once and copies that state for every nonce, and
+checks the leading bits of the raw digest instead of formatting a hexdigest.
+
+From POW_PARALLEL_MIN_DIFFICULTY on, the nonce space is split into chunks
+that POW_WORKERS processes search in order. The lowest valid nonce wins, so
+the result is the same as a sequential search, and the workers still busy
+above it are told to stop. The pool and its stop event are shared, so
+parallel searches from several threads run one at a time.
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+POW_WORKERS = int(os.getenv("POW_WORKERS", str(_CPUS)))
+POW_PARALLEL_MIN_DIFFICULTY = int(os.getenv("POW_PARALLEL_MIN_DIFFICULTY", "6")) # below this a pool costs more than it saves
+POW_CHUNK_SIZE = int(os.getenv("POW_CHUNK_SIZE", "200000")) # nonces per task
+_CANCEL_CHECK_INTERVAL = 4096
+
+_pool = None
+_pool_workers = 0
+_cancel = None # set by the parent once the winning chunk is known
+_search_lock = threading.Lock() # held for a whole parallel search, so none can set _cancel under another
+
+
+def _target(difficulty: int):
+    """Zero bytes the digest must start with, and the bound for the next byte (256 when none is checked)."""
+    zero_bytes, rem_bits = divmod(4 * difficulty, 8)
+    return b"\0" * zero_bytes, 1 << (8 - rem_bits)
+
+
+def valid_proof(last_proof: int, proof: int, difficulty: int) -> bool:
+    digest = hashlib.sha256(f'{last_proof}{proof}'.encode()).digest()
+    zeros, bound = _target(difficulty)
+    n = len(zeros)
+    return digest[:n] == zeros and (bound == 256 or digest[n] < bound)
+
+
+def search(last_proof: int, start: int, stop: int, difficulty: int, cancel=None) -> Optional[int]:
+    """The lowest valid proof in [start, stop), or None if there is none or the search was cancelled."""
+    prefix = hashlib.sha256(str(last_proof).encode())
+    zeros, bound = _target(difficulty)
+    n = len(zeros)
+    check_next_byte = bound != 256
+    for proof in range(start, stop):
+        h = prefix.copy()
+        h.update(str(proof).encode())
+        digest = h.digest()
+        if digest[:n] == zeros and (not check_next_byte or digest[n] < bound):
+            return proof
+        if cancel is not None and proof % _CANCEL_CHECK_INTERVAL == 0 and cancel.is_set():
+            return None
+    return None
+
+
+def _init_worker(cancel):
+    global _cancel
+    _cancel = cancel
+
+
+def _search_chunk(last_proof: int, start: int, stop: int, difficulty: int) -> Optional[int]:
+    return search(last_proof, start, stop, difficulty, _cancel)
+
+
+def _get_pool(workers: int):
+    global _pool, _pool_workers, _cancel
+    if _pool is not None and _pool_workers != workers:
+        _pool.shutdown()
+        _pool = None
+    if _pool is None:
+        _cancel = multiprocessing.Event()
+        _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(_cancel,))
+        _pool_workers = workers
+    return _pool
+
+
+def find_proof(last_proof: int, difficulty: int, workers: int = POW_WORKERS, chunk_size: int = POW_CHUNK_SIZE) -> int:
+    """The lowest valid proof for last_proof, searched in parallel for high difficulties."""
+    if workers <= 1 or difficulty < POW_PARALLEL_MIN_DIFFICULTY:
+        start = 0
+        while True:
+            proof = search(last_proof, start, start + chunk_size, difficulty)
+            if proof is not None:
+                return proof
+            start += chunk_size
+
+    with _search_lock:
+        pool = _get_pool(workers)
+        _cancel.clear()
+        pending = [] # futures in nonce order, a few per worker so none sits idle
+        next_start = 0
+        try:
+            while True:
+                while len(pending) < 2 * workers:
+                    pending.append(pool.submit(_search_chunk, last_proof, next_start, next_start + chunk_size, difficulty))
+                    next_start += chunk_size
+                proof = pending.pop(0).result() # every lower chunk has already come up empty
+                if proof is not None:
+                    return proof
+        finally:
+            _cancel.set()
+            for future in pending:
+                future.cancel()
+            for future in pending:
+                if not future.cancelled():
+                    future.result() # drain, so a stale chunk cannot see the next search's cleared event
+
+
+def shutdown():
+    """Stops the worker processes, if any were started."""
+    global _pool
+    with _search_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
@@ -0,0 +1,184 @@
+"""Strategies for sealing ledger blocks.
+
+On a permissioned ledger, where every block is written by our own services,
+proof of work costs a CPU core per block and adds no security. An authority
+sealer instead signs the block hash with a key only the sealing services hold,
+which takes microseconds and is just as tamper-evident.
+
+BLOCKCHAIN_SEALER selects the strategy for new blocks:
+
+    hmac        HMAC-SHA256 with the key in /run/secrets/blockchain_sealer_key or
+                BLOCKCHAIN_SEALER_KEY (default; there is no fallback key)
+    ed25519     Ed25519 signature with the PEM private key in BLOCKCHAIN_SEALER_KEY_FILE;
+                verifiers only need the public key
+    pow         the original proof of work: 4 leading zero hex digits
+    pow:<n>     proof of work with n leading zero hex digits
+
+With an authority sealer, every block after BLOCKCHAIN_LEGACY_POW_UNTIL (the
+genesis block by default) must carry a valid signature. Anyone who can write
+to the database can mine proof of work, so an unsigned block is only accepted
+up to that index, which is configured with the sealers rather than read from
+the chain. Set it to the last block mined before switching from proof of work
+(`python -m backend_api.db_maintenance migrate` prints it).
+
+Proof-of-work blocks are checked at the difficulty this node seals with (the
+default 4 with an authority sealer), whatever difficulty the block claims.
+"""
+import base64
+import hashlib
+import hmac
+import os
+from typing import Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+
+from blockchain_layer import pow_engine
+
+BLOCKCHAIN_SEALER = os.getenv("BLOCKCHAIN_SEALER", "hmac")
+BLOCKCHAIN_SEALER_ID = os.getenv("BLOCKCHAIN_SEALER_ID", "node-1") # recorded in each block this node seals
+BLOCKCHAIN_SEALER_KEY_SECRET_FILE = "/run/secrets/blockchain_sealer_key"
+BLOCKCHAIN_LEGACY_POW_UNTIL = int(os.getenv("BLOCKCHAIN_LEGACY_POW_UNTIL", "1"))
+POW_DEFAULT_DIFFICULTY = 4
+
+
+class SealingStrategy:
+    """
+    Interface of the sealers. `name` ("<kind>" or "<kind>:<detail>") is stored
+    in Block.sealer to pick the verifier later.
+    """
+
+    kind = None
+    name = None
+
+    def find_proof(self, last_proof: int) -> int:
+        """The proof for the next block. Authority sealers do no work and return 0."""
+        return 0
+
+    def sign(self, block_hash: str) -> Optional[str]:
+        """The signature stored with the block, or None for proof of work."""
+        return None
+
+    def verify(self, block, last_block) -> bool:
+        raise NotImplementedError
+
+
+class ProofOfWorkSealer(SealingStrategy):
+    """
+    Finds p' such that sha256(f"{p}{p'}") starts with `difficulty` zero hex
+    digits, p being the previous block's proof. Difficulty 4 is the original
+    Blockchain.proof_of_work. The search itself is in pow_engine.
+    """
+
+    kind = "pow"
+
+    def __init__(self, difficulty: int = POW_DEFAULT_DIFFICULTY):
+        self.difficulty = difficulty
+        self.name = "pow" if difficulty == POW_DEFAULT_DIFFICULTY else f"pow:{difficulty}"
+
+    def valid_proof(self, last_proof: int, proof: int) -> bool:
+        return pow_engine.valid_proof(last_proof, proof, self.difficulty)
+
+    def find_proof(self, last_proof: int) -> int:
+        return pow_engine.find_proof(last_proof, self.difficulty)
+
+    def verify(self, block, last_block) -> bool:
+        return self.valid_proof(last_block.proof, block.proof)
+
+
+class HMACAuthoritySealer(SealingStrategy):
+    """Signs the block hash with a secret shared by the sealing and verifying services."""
+
+    kind = "hmac"
+
+    def __init__(self, key: bytes, sealer_id: str = BLOCKCHAIN_SEALER_ID):
+        self.key = key
+        self.name = f"hmac:{sealer_id}"
+
+    def sign(self, block_hash: str) -> str:
+        return hmac.new(self.key, block_hash.encode(), hashlib.sha256).hexdigest()
+
+    def verify(self, block, last_block) -> bool:
+        return block.signature is not None and hmac.compare_digest(self.sign(block.hash), block.signature)
+
+
+class Ed25519AuthoritySealer(SealingStrategy):
+    """Signs the block hash with an Ed25519 key. Without the private key it can only verify."""
+
+    kind = "ed25519"
+
+    def __init__(self, public_key: Ed25519PublicKey, private_key: Optional[Ed25519PrivateKey] = None,
+                 sealer_id: str = BLOCKCHAIN_SEALER_ID):
+        self.public_key = public_key
+        self.private_key = private_key
+        self.name = f"ed25519:{sealer_id}"
+
+    @classmethod
+    def from_private_pem(cls, pem: bytes, sealer_id: str = BLOCKCHAIN_SEALER_ID) -> "Ed25519AuthoritySealer":
+        private_key = serialization.load_pem_private_key(pem, password=None)
+        if not isinstance(private_key, Ed25519PrivateKey):
+            raise ValueError("BLOCKCHAIN_SEALER_KEY_FILE must hold an Ed25519 private key")
+        return cls(private_key.public_key(), private_key, sealer_id)
+
+    def sign(self, block_hash: str) -> str:
+        if self.private_key is None:
+            raise RuntimeError("This Ed25519 sealer has no private key and can only verify blocks")
+        return base64.b64encode(self.private_key.sign(block_hash.encode())).decode()
+
+    def verify(self, block, last_block) -> bool:
+        if block.signature is None:
+            return False
+        try:
+            self.public_key.verify(base64.b64decode(block.signature), block.hash.encode())
+            return True
+        except (InvalidSignature, ValueError):
+            return False
+
+
+def create_sealer(spec: str = BLOCKCHAIN_SEALER) -> SealingStrategy:
+    """Builds the sealer named by a BLOCKCHAIN_SEALER value."""
+    if spec == "pow" or spec.startswith("pow:"):
+        return ProofOfWorkSealer(int(spec.split(":", 1)[1]) if ":" in spec else POW_DEFAULT_DIFFICULTY)
+    if spec == "hmac":
+        if os.path.exists(BLOCKCHAIN_SEALER_KEY_SECRET_FILE):
+            with open(BLOCKCHAIN_SEALER_KEY_SECRET_FILE, "r") as f:
+                key = f.read().strip()
+        else:
+            key = os.getenv("BLOCKCHAIN_SEALER_KEY")
+        if not key:
+            raise RuntimeError(f"BLOCKCHAIN_SEALER=hmac needs a dedicated key in {BLOCKCHAIN_SEALER_KEY_SECRET_FILE} "
+                               "or BLOCKCHAIN_SEALER_KEY (or set BLOCKCHAIN_SEALER=pow to keep proof of work)")
+        return HMACAuthoritySealer(key.encode())
+    if spec == "ed25519":
+        key_file = os.getenv("BLOCKCHAIN_SEALER_KEY_FILE")
+        if not key_file:
+            raise RuntimeError("BLOCKCHAIN_SEALER=ed25519 needs BLOCKCHAIN_SEALER_KEY_FILE")
+        with open(key_file, "rb") as f:
+            return Ed25519AuthoritySealer.from_private_pem(f.read())
+    raise ValueError(f"Unknown BLOCKCHAIN_SEALER: {spec}")
+
+
+def verify_block(block, last_block, sealers: dict, legacy_pow_until: Optional[int] = None,
+                 min_pow_difficulty: int = POW_DEFAULT_DIFFICULTY) -> bool:
+    """
+    Checks the seal of `block` with the strategy recorded in block.sealer.
+    Blocks without a sealer predate sealing strategies and carry the original proof of work.
+    `sealers` maps kinds ("hmac", "ed25519") to the authority sealers this node can verify.
+    With legacy_pow_until set, blocks after that index must be sealed by one of them.
+    A proof-of-work block claiming less than min_pow_difficulty (e.g. "pow:0") is rejected.
+    """
+    kind = block.sealer.partition(":")[0] if block.sealer is not None else None
+    if legacy_pow_until is not None and block.index > legacy_pow_until and kind not in sealers:
+        return False
+    if block.sealer is None:
+        return ProofOfWorkSealer().verify(block, last_block)
+    kind, _, detail = block.sealer.partition(":")
+    if kind == "pow":
+        try:
+            difficulty = int(detail) if detail else POW_DEFAULT_DIFFICULTY
+        except ValueError:
+            return False
+        return difficulty >= min_pow_difficulty and ProofOfWorkSealer(difficulty).verify(block, last_block)
+    sealer = sealers.get(kind)
+    return sealer is not None and sealer.verify(block, last_block)
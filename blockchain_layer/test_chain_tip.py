@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend_api.database import Base, Block
+from blockchain_layer.blockchain import Blockchain
+from blockchain_layer.sealing import HMACAuthoritySealer
+
+SEALER = HMACAuthoritySealer(b"secret")
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'chain.db'}"
+    Base.metadata.create_all(bind=create_engine(url))
+    return url
+
+
+def open_session(engine):
+    return sessionmaker(bind=engine)()
+
+
+def count_selects(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement) if statement.startswith("SELECT") else None)
+    return statements
+
+
+def test_transactions_and_new_instances_do_not_query_the_tip(database_url):
+    engine = create_engine(database_url)
+    db = open_session(engine)
+    Blockchain(db, sealer=SEALER) # creates genesis and caches the tip
+
+    selects = count_selects(engine)
+    blockchain = Blockchain(db, sealer=SEALER)
+    assert blockchain.new_transaction("honeypot", "203.0.113.1", 1) == 2
+    assert blockchain.new_transaction("honeypot", "203.0.113.2", 1) == 2
+    assert selects == []
+
+    blockchain.seal_block()
+    db.commit()
+    assert Blockchain(db, sealer=SEALER).new_transaction("honeypot", "203.0.113.3", 1) == 3
+    assert blockchain.is_chain_valid()
+
+
+def test_rolled_back_block_does_not_move_the_tip(database_url):
+    db = open_session(create_engine(database_url))
+    blockchain = Blockchain(db, sealer=SEALER)
+    blockchain.seal_block()
+    assert blockchain.tip.index == 2 # this session sees its own block
+    db.rollback()
+
+    assert blockchain.tip.index == 1
+    blockchain.seal_block()
+    db.commit()
+    assert [block.index for block in db.query(Block).order_by(Block.index)] == [1, 2]
+    assert blockchain.is_chain_valid()
+
+
+def test_seal_retries_when_another_writer_moved_the_tip(database_url):
+    # Two engines stand in for two processes, each with its own cached tip
+    ours = open_session(create_engine(database_url))
+    theirs = open_session(create_engine(database_url))
+    our_chain = Blockchain(ours, sealer=SEALER)
+    their_chain = Blockchain(theirs, sealer=SEALER)
+    their_chain.seal_block()
+    theirs.commit()
+
+    assert our_chain.tip.index == 1 # stale
+    block = our_chain.seal_block()
+    ours.commit()
+    assert block.index == 3
+    assert block.previous_hash == Blockchain.hash(theirs.query(Block).filter(Block.index == 2).one().to_dict())
+    assert our_chain.is_chain_valid()
@@ -0,0 +1,107 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend_api.database import Base, Block, ChainCheckpoint
+from blockchain_layer import blockchain as blockchain_module
+from blockchain_layer.blockchain import Blockchain
+from blockchain_layer.sealing import HMACAuthoritySealer
+
+SEALER = HMACAuthoritySealer(b"secret")
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chain.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def seal(blockchain, blocks):
+    for i in range(blocks):
+        blockchain.new_transaction("honeypot", f"203.0.113.{i % 250}", 1)
+        blockchain.seal_block()
+        blockchain.db.commit()
+
+
+@pytest.fixture
+def loaded_blocks():
+    indexes = []
+    listener = lambda block, context: indexes.append(block.index)
+    event.listen(Block, "load", listener)
+    yield indexes
+    event.remove(Block, "load", listener)
+
+
+def test_verification_resumes_from_the_checkpoint(db, loaded_blocks):
+    blockchain = Blockchain(db, sealer=SEALER)
+    seal(blockchain, 5)
+    assert blockchain.is_chain_valid()
+    checkpoint = db.query(ChainCheckpoint).one()
+    assert checkpoint.block_index == 6 and checkpoint.authority_sealed
+
+    seal(blockchain, 2)
+    loaded_blocks.clear()
+    assert blockchain.is_chain_valid()
+    # Genesis, the checkpointed block and the new ones: blocks 2-5 are not read again
+    assert {7, 8} <= set(loaded_blocks) <= {1, 6, 7, 8}
+    assert [checkpoint.block_index for checkpoint in db.query(ChainCheckpoint).order_by(ChainCheckpoint.block_index)] == [6, 8]
+    assert blockchain.is_chain_valid() # nothing new
+
+
+def test_tampering_after_the_checkpoint_is_detected(db):
+    blockchain = Blockchain(db, sealer=SEALER)
+    seal(blockchain, 3)
+    assert blockchain.is_chain_valid()
+    seal(blockchain, 2)
+    db.query(Block).filter(Block.index == 5).update({"data": "[]"})
+    db.commit()
+    assert not blockchain.is_chain_valid()
+
+
+def test_rewritten_checkpoint_block_fails_and_full_verification_rechecks_everything(db):
+    blockchain = Blockchain(db, sealer=SEALER)
+    seal(blockchain, 3)
+    assert blockchain.is_chain_valid()
+
+    db.query(Block).filter(Block.index == 2).update({"data": "[]"})
+    db.commit()
+    assert blockchain.is_chain_valid() # before the checkpoint: only a full pass sees it
+    assert not blockchain.is_chain_valid(full=True)
+
+    db.query(Block).filter(Block.index == 4).update({"proof": 1})
+    db.commit()
+    assert not blockchain.is_chain_valid()
+
+
+def test_missing_block_is_detected(db):
+    blockchain = Blockchain(db, sealer=SEALER)
+    seal(blockchain, 4)
+    db.query(Block).filter(Block.index == 3).delete()
+    db.commit()
+    assert not blockchain.is_chain_valid()
+
+
+@pytest.mark.parametrize("tamper", [None, 7, 11])
+def test_blocks_are_streamed_in_batches(db, monkeypatch, tamper):
+    monkeypatch.setattr(blockchain_module, "CHAIN_VERIFY_BATCH_SIZE", 2)
+    blockchain = Blockchain(db, sealer=SEALER)
+    seal(blockchain, 12)
+    if tamper:
+        db.query(Block).filter(Block.index == tamper).update({"signature": None, "sealer": None})
+        db.commit()
+    assert blockchain.is_chain_valid() == (tamper is None)
+    assert (db.query(ChainCheckpoint).count() == 1) == (tamper is None)
+
+
+def test_uncommitted_block_is_verified(db, monkeypatch):
+    monkeypatch.setattr(blockchain_module, "CHAIN_VERIFY_BATCH_SIZE", 2)
+    blockchain = Blockchain(db, sealer=SEALER)
+    seal(blockchain, 6)
+    blockchain.new_transaction("honeypot", "203.0.113.250", 1)
+    blockchain.seal_block() # flushed, not committed
+    assert blockchain.is_chain_valid(full=True)
+    assert db.query(ChainCheckpoint).count() == 0
+    db.commit()
@@ -0,0 +1,58 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from blockchain_layer import pow_engine
+
+
+def hex_find_proof(last_proof, difficulty):
+    proof = 0
+    while not hashlib.sha256(f'{last_proof}{proof}'.encode()).hexdigest().startswith("0" * difficulty):
+        proof += 1
+    return proof
+
+
+@pytest.mark.parametrize("difficulty", [1, 2, 3])
+def test_valid_proof_matches_hex_prefix(difficulty):
+    for last_proof in (100, 35293):
+        for proof in range(3000):
+            expected = hashlib.sha256(f'{last_proof}{proof}'.encode()).hexdigest().startswith("0" * difficulty)
+            assert pow_engine.valid_proof(last_proof, proof, difficulty) == expected
+
+
+def test_sequential_search_finds_lowest_proof():
+    assert pow_engine.find_proof(100, 4, workers=1) == hex_find_proof(100, 4)
+
+
+def test_parallel_search_finds_lowest_proof(monkeypatch):
+    monkeypatch.setattr(pow_engine, "POW_PARALLEL_MIN_DIFFICULTY", 0)
+    try:
+        # Small chunks, so the proof lies past the first round of tasks
+        for last_proof in (100, 7):
+            assert pow_engine.find_proof(last_proof, 3, workers=2, chunk_size=500) == hex_find_proof(last_proof, 3)
+    finally:
+        pow_engine.shutdown()
+
+
+def test_concurrent_parallel_searches_find_lowest_proofs(monkeypatch):
+    monkeypatch.setattr(pow_engine, "POW_PARALLEL_MIN_DIFFICULTY", 0)
+    last_proofs = [100, 7, 35293, 12]
+    try:
+        # Chunks of _CANCEL_CHECK_INTERVAL nonces, so a search stopped by another would skip its proof
+        with ThreadPoolExecutor(max_workers=len(last_proofs)) as executor:
+            proofs = list(executor.map(lambda p: pow_engine.find_proof(p, 4, workers=2, chunk_size=4096), last_proofs))
+        assert proofs == [hex_find_proof(last_proof, 4) for last_proof in last_proofs]
+    finally:
+        pow_engine.shutdown()
+
+
+def test_pool_follows_the_requested_workers(monkeypatch):
+    monkeypatch.setattr(pow_engine, "POW_PARALLEL_MIN_DIFFICULTY", 0)
+    try:
+        pow_engine.find_proof(100, 2, workers=2)
+        assert pow_engine._pool._max_workers == 2
+        assert pow_engine.find_proof(100, 2, workers=3) == hex_find_proof(100, 2)
+        assert pow_engine._pool._max_workers == 3
+    finally:
+        pow_engine.shutdown()
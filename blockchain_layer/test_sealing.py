@@ -0,0 +1,131 @@
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from backend_api.database import Block
+from blockchain_layer import blockchain as blockchain_module, pow_engine
+from blockchain_layer.blockchain import Blockchain
+from blockchain_layer.sealing import (POW_DEFAULT_DIFFICULTY, Ed25519AuthoritySealer, HMACAuthoritySealer,
+                                      ProofOfWorkSealer, create_sealer, verify_block)
+
+
+def ed25519_sealer():
+    pem = Ed25519PrivateKey.generate().private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                     serialization.NoEncryption())
+    return Ed25519AuthoritySealer.from_private_pem(pem)
+
+
+def seal_chain(db_session, sealer, blocks=3):
+    blockchain = Blockchain(db_session, sealer=sealer)
+    for i in range(blocks):
+        blockchain.new_transaction("honeypot", f"203.0.113.{i}", 1)
+        blockchain.seal_block()
+        db_session.commit()
+    return blockchain
+
+
+@pytest.mark.parametrize("make_sealer", [lambda: HMACAuthoritySealer(b"secret"), ed25519_sealer,
+                                         lambda: ProofOfWorkSealer(difficulty=2)])
+def test_sealed_chain_verifies(db_session, make_sealer):
+    sealer = make_sealer()
+    blockchain = seal_chain(db_session, sealer)
+
+    tip = blockchain.last_block
+    assert tip.sealer == sealer.name
+    assert (tip.signature is None) == (sealer.kind == "pow")
+    assert blockchain.is_chain_valid()
+
+
+def test_tampered_block_is_rejected(db_session):
+    blockchain = seal_chain(db_session, HMACAuthoritySealer(b"secret"))
+    tip = blockchain.last_block
+    tip.data = '[{"sender": "honeypot", "recipient": "198.51.100.1", "amount": 1}]'
+    db_session.commit()
+    assert not blockchain.is_chain_valid()
+
+
+def test_wrong_key_is_rejected(db_session):
+    seal_chain(db_session, HMACAuthoritySealer(b"secret"))
+    assert not Blockchain(db_session, sealer=HMACAuthoritySealer(b"other")).is_chain_valid()
+
+
+def test_unsigned_block_after_signed_blocks_is_rejected(db_session):
+    seal_chain(db_session, HMACAuthoritySealer(b"secret"), blocks=1)
+    downgraded = Blockchain(db_session, sealer=ProofOfWorkSealer(difficulty=1))
+    downgraded.new_transaction("honeypot", "203.0.113.9", 1)
+    downgraded.new_block(downgraded.proof_of_work(downgraded.last_block.proof))
+    db_session.commit()
+    assert not Blockchain(db_session, sealer=HMACAuthoritySealer(b"secret")).is_chain_valid()
+
+
+def rewrite_as_proof_of_work(db_session, after: int):
+    """Replaces every block after `after` with forged, re-mined proof-of-work blocks: no key needed."""
+    blocks = db_session.query(Block).order_by(Block.index).all()
+    for last_block, block in zip(blocks, blocks[1:]):
+        if block.index > after:
+            block.data = '[{"sender": "honeypot", "recipient": "198.51.100.1", "amount": 1}]'
+            block.signature = block.sealer = None
+            block.proof = pow_engine.find_proof(last_block.proof, POW_DEFAULT_DIFFICULTY, workers=1)
+            block.previous_hash = Blockchain.hash(last_block.to_dict())
+            block.hash = Blockchain.content_hash(block)
+    db_session.commit()
+
+
+def test_signed_chain_rewritten_as_proof_of_work_is_rejected(db_session):
+    seal_chain(db_session, HMACAuthoritySealer(b"secret"))
+    rewrite_as_proof_of_work(db_session, after=1)
+    assert not Blockchain(db_session, sealer=HMACAuthoritySealer(b"secret")).is_chain_valid(full=True)
+
+
+def test_proof_of_work_blocks_are_accepted_up_to_the_legacy_cutoff(db_session, monkeypatch):
+    seal_chain(db_session, HMACAuthoritySealer(b"secret"), blocks=4)
+    rewrite_as_proof_of_work(db_session, after=1)
+    blockchain = Blockchain(db_session, sealer=HMACAuthoritySealer(b"secret"))
+    last_block = db_session.query(Block).filter(Block.index == 3).one()
+    for block in db_session.query(Block).filter(Block.index > 3).order_by(Block.index).all():
+        # Blocks 4 and 5 signed again with the key, on top of legacy blocks 2 and 3
+        block.previous_hash = Blockchain.hash(last_block.to_dict())
+        block.sealer = blockchain.sealer.name
+        block.hash = Blockchain.content_hash(block)
+        block.signature = blockchain.sealer.sign(block.hash)
+        last_block = block
+    db_session.commit()
+
+    assert not blockchain.is_chain_valid(full=True)
+    monkeypatch.setattr(blockchain_module, "BLOCKCHAIN_LEGACY_POW_UNTIL", 3)
+    assert blockchain.is_chain_valid(full=True)
+
+
+@pytest.mark.parametrize("claimed", ["pow:0", "pow:1", "pow:x"])
+def test_block_claiming_a_lower_difficulty_is_rejected(db_session, claimed):
+    blockchain = seal_chain(db_session, ProofOfWorkSealer(), blocks=1)
+    tip = blockchain.last_block
+    tip.proof, tip.sealer = 1, claimed # any proof passes at difficulty 0
+    tip.hash = Blockchain.content_hash(tip)
+    db_session.commit()
+    assert not Blockchain(db_session, sealer=ProofOfWorkSealer()).is_chain_valid(full=True)
+    assert not Blockchain(db_session, sealer=HMACAuthoritySealer(b"secret")).is_chain_valid(full=True)
+
+
+def test_verify_only_ed25519_sealer_checks_signatures(db_session):
+    sealer = ed25519_sealer()
+    blockchain = seal_chain(db_session, sealer, blocks=1)
+    verifier = Ed25519AuthoritySealer(sealer.public_key)
+    tip = blockchain.last_block
+    assert verify_block(tip, None, {"ed25519": verifier})
+    assert not verify_block(tip, None, {})
+    with pytest.raises(RuntimeError):
+        verifier.sign(tip.hash)
+
+
+def test_create_sealer(monkeypatch):
+    assert create_sealer("pow").difficulty == 4
+    assert create_sealer("pow:3").name == "pow:3"
+    monkeypatch.delenv("BLOCKCHAIN_SEALER_KEY", raising=False)
+    monkeypatch.setenv("SECRET_KEY", "not-a-sealing-key")
+    with pytest.raises(RuntimeError, match="BLOCKCHAIN_SEALER_KEY"):
+        create_sealer("hmac")
+    monkeypatch.setenv("BLOCKCHAIN_SEALER_KEY", "sealing-key")
+    assert create_sealer("hmac").key == b"sealing-key"
+    with pytest.raises(ValueError):
+        create_sealer("raft")
@@ -1,7 +1,45 @@
-from fastapi import FastAPI
+import ipaddress
+import os
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from ip_index import EnrichmentIndexes
 
 app = FastAPI()
 
+# Directory of *.idx files built with `python ip_index.py build`; the file
+# name (geo.idx, asn.idx, abuse.idx, ...) becomes the key in the response.
+ENRICHMENT_INDEX_DIR = os.getenv("ENRICHMENT_INDEX_DIR", "indexes")
+MAX_BATCH_SIZE = int(os.getenv("ENRICHMENT_MAX_BATCH_SIZE", "10000"))
+
+indexes = EnrichmentIndexes(ENRICHMENT_INDEX_DIR)
+
+class EnrichBatchRequest(BaseModel):
+    ips: list[str]
+
+def enrich_ip(ip: str) -> dict:
+    try:
+        ipaddress.ip_address(ip)
+    except ValueError:
+        return {"error": "invalid IP address"}
+    return indexes.enrich(ip)
+
+@app.on_event("shutdown")
+def shutdown_event():
+    indexes.close()
+
 @app.get("/")
 def read_root():
-    return {"Hello": "Enrichment Service"}
+    return {"Hello": "Enrichment Service", "feeds": sorted(indexes.indexes)}
+
+@app.get("/enrich/{ip}")
+def enrich(ip: str):
+    result = enrich_ip(ip)
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return {"ip": ip, **result}
+
+@app.post("/enrich/batch")
+def enrich_batch(request: EnrichBatchRequest):
+    if len(request.ips) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds the maximum of {MAX_BATCH_SIZE} IPs")
+    return {"results": {ip: enrich_ip(ip) for ip in request.ips}}
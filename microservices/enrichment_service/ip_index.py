@@ -0,0 +1,195 @@
+"""
+Compact on-disk IP range index for offline enrichment.
+
+An index file holds sorted, non-overlapping IP ranges for one feed (geo, ASN,
+abuse list, ...). Range bounds are stored as fixed-width big-endian integers
+(4 bytes for IPv4, 16 bytes for IPv6), so a lookup is a binary search over the
+memory-mapped file with no parsing and no network I/O.
+
+File layout (all integers little-endian unless noted):
+
+    header   magic b"PNIX", version u16, reserved u16,
+             v4_count u32, v6_count u32, records_offset u64, records_length u64
+    v4 table v4_count x (start u32 BE, end u32 BE, record u32)
+    v6 table v6_count x (start 16B BE, end 16B BE, record u32)
+    records  JSON array of the distinct record dicts
+
+Build an index from a CSV feed with either a `network` (CIDR) column or
+`start_ip`/`end_ip` columns; every other column becomes part of the record:
+
+    python ip_index.py build --csv geo.csv --out geo.idx
+    python ip_index.py lookup --index geo.idx 8.8.8.8
+"""
+import argparse
+import csv
+import ipaddress
+import json
+import mmap
+import os
+import struct
+
+MAGIC = b"PNIX"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIQQ")
+V4_ENTRY = struct.Struct(">II") # start, end; record id follows as <I
+V6_ENTRY_SIZE = 16 + 16 + 4
+V4_ENTRY_SIZE = V4_ENTRY.size + 4
+RECORD_ID = struct.Struct("<I")
+
+
+def _parse_range(row: dict):
+    if row.get("network"):
+        network = ipaddress.ip_network(row["network"].strip(), strict=False)
+        return network.version, int(network.network_address), int(network.broadcast_address)
+    start = ipaddress.ip_address(row["start_ip"].strip())
+    end = ipaddress.ip_address(row["end_ip"].strip())
+    if start.version != end.version or int(start) > int(end):
+        raise ValueError(f"Invalid range {start} - {end}")
+    return start.version, int(start), int(end)
+
+
+def build_index(rows, out_path: str) -> dict:
+    """
+    Writes an index file from an iterable of CSV-style dicts. Raises ValueError
+    on overlapping ranges, since a lookup must resolve to exactly one record.
+    """
+    records = []
+    record_ids = {}
+    ranges = {4: [], 6: []}
+    for row in rows:
+        version, start, end = _parse_range(row)
+        record = {key: value for key, value in row.items() if key not in ("network", "start_ip", "end_ip") and value not in (None, "")}
+        record_key = json.dumps(record, sort_keys=True)
+        if record_key not in record_ids:
+            record_ids[record_key] = len(records)
+            records.append(record)
+        ranges[version].append((start, end, record_ids[record_key]))
+
+    for version in (4, 6):
+        ranges[version].sort()
+        for previous, current in zip(ranges[version], ranges[version][1:]):
+            if current[0] <= previous[1]:
+                raise ValueError(f"Overlapping IPv{version} ranges starting at {ipaddress.ip_address(previous[0])} and {ipaddress.ip_address(current[0])}")
+
+    records_blob = json.dumps(records).encode()
+    v4_table = b"".join(V4_ENTRY.pack(start, end) + RECORD_ID.pack(record_id) for start, end, record_id in ranges[4])
+    v6_table = b"".join(start.to_bytes(16, "big") + end.to_bytes(16, "big") + RECORD_ID.pack(record_id) for start, end, record_id in ranges[6])
+    records_offset = HEADER.size + len(v4_table) + len(v6_table)
+
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(ranges[4]), len(ranges[6]), records_offset, len(records_blob)))
+        f.write(v4_table)
+        f.write(v6_table)
+        f.write(records_blob)
+    os.replace(tmp_path, out_path) # readers never see a half-written index
+    return {"ipv4_ranges": len(ranges[4]), "ipv6_ranges": len(ranges[6]), "records": len(records)}
+
+
+class IPRangeIndex:
+    """Read-only, memory-mapped view of an index file built by build_index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.v4_count, self.v6_count, records_offset, records_length = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} IP range index")
+        self._v4_offset = HEADER.size
+        self._v6_offset = self._v4_offset + self.v4_count * V4_ENTRY_SIZE
+        self.records = json.loads(self._mm[records_offset:records_offset + records_length])
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _v4_start(self, i: int) -> int:
+        return V4_ENTRY.unpack_from(self._mm, self._v4_offset + i * V4_ENTRY_SIZE)[0]
+
+    def _v6_start(self, i: int) -> bytes:
+        offset = self._v6_offset + i * V6_ENTRY_SIZE
+        return self._mm[offset:offset + 16]
+
+    def lookup(self, ip: str):
+        """Returns the record whose range contains `ip`, or None."""
+        address = ipaddress.ip_address(ip)
+        if address.version == 4:
+            i = self._rightmost_start_at_or_below(self._v4_start, self.v4_count, int(address))
+            if i < 0:
+                return None
+            offset = self._v4_offset + i * V4_ENTRY_SIZE
+            _, end = V4_ENTRY.unpack_from(self._mm, offset)
+            if int(address) > end:
+                return None
+            return self.records[RECORD_ID.unpack_from(self._mm, offset + V4_ENTRY.size)[0]]
+
+        packed = address.packed
+        i = self._rightmost_start_at_or_below(self._v6_start, self.v6_count, packed)
+        if i < 0:
+            return None
+        offset = self._v6_offset + i * V6_ENTRY_SIZE
+        if packed > self._mm[offset + 16:offset + 32]:
+            return None
+        return self.records[RECORD_ID.unpack_from(self._mm, offset + 32)[0]]
+
+    @staticmethod
+    def _rightmost_start_at_or_below(start_at, count: int, key) -> int:
+        # Big-endian fixed-width bytes compare in the same order as the integers
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if start_at(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1
+
+
+class EnrichmentIndexes:
+    """All index files in a directory, one per feed, keyed by file name without extension."""
+
+    def __init__(self, directory: str):
+        self.indexes = {}
+        if directory and os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".idx"):
+                    self.indexes[name[:-4]] = IPRangeIndex(os.path.join(directory, name))
+
+    def enrich(self, ip: str) -> dict:
+        """Merges the matching record of every feed, e.g. {"geo": {...}, "asn": {...}, "abuse": None}."""
+        return {feed: index.lookup(ip) for feed, index in self.indexes.items()}
+
+    def close(self):
+        for index in self.indexes.values():
+            index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query an offline IP range index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build an index from a CSV range feed")
+    build.add_argument("--csv", required=True, help="CSV with a 'network' column or 'start_ip'/'end_ip' columns")
+    build.add_argument("--out", required=True, help="Output index file, e.g. indexes/geo.idx")
+    lookup = subparsers.add_parser("lookup", help="Look an IP up in an index")
+    lookup.add_argument("--index", required=True)
+    lookup.add_argument("ip")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        with open(args.csv, newline="") as f:
+            stats = build_index(csv.DictReader(f), args.out)
+        print(f"Wrote {args.out}: {stats}")
+    else:
+        with IPRangeIndex(args.index) as index:
+            print(json.dumps(index.lookup(args.ip)))
+
+
+if __name__ == "__main__":
+    main()
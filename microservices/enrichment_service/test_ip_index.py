@@ -0,0 +1,49 @@
+import pytest
+from ip_index import build_index, IPRangeIndex, EnrichmentIndexes
+
+
+def test_lookup_ipv4_and_ipv6_ranges(tmp_path):
+    path = str(tmp_path / "geo.idx")
+    build_index([
+        {"network": "8.8.8.0/24", "country": "US", "asn": "15169"},
+        {"start_ip": "1.1.1.0", "end_ip": "1.1.1.255", "country": "AU", "asn": "13335"},
+        {"network": "2001:4860::/32", "country": "US", "asn": "15169"},
+    ], path)
+
+    with IPRangeIndex(path) as index:
+        assert index.lookup("8.8.8.8") == {"country": "US", "asn": "15169"}
+        assert index.lookup("1.1.1.1") == {"country": "AU", "asn": "13335"}
+        assert index.lookup("2001:4860:4860::8888") == {"country": "US", "asn": "15169"}
+        assert index.lookup("8.8.9.1") is None
+        assert index.lookup("0.0.0.1") is None
+        assert index.lookup("2001:db8::1") is None
+        # Identical records are stored once
+        assert len(index.records) == 2
+
+
+def test_range_boundaries(tmp_path):
+    path = str(tmp_path / "abuse.idx")
+    build_index([{"start_ip": "10.0.0.10", "end_ip": "10.0.0.20", "score": "90"}], path)
+
+    with IPRangeIndex(path) as index:
+        assert index.lookup("10.0.0.9") is None
+        assert index.lookup("10.0.0.10") == {"score": "90"}
+        assert index.lookup("10.0.0.20") == {"score": "90"}
+        assert index.lookup("10.0.0.21") is None
+
+
+def test_overlapping_ranges_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        build_index([{"network": "10.0.0.0/8"}, {"network": "10.1.0.0/16"}], str(tmp_path / "bad.idx"))
+
+
+def test_enrichment_merges_feeds(tmp_path):
+    build_index([{"network": "8.8.8.0/24", "country": "US"}], str(tmp_path / "geo.idx"))
+    build_index([{"network": "8.8.0.0/16", "asn": "15169"}], str(tmp_path / "asn.idx"))
+
+    indexes = EnrichmentIndexes(str(tmp_path))
+    try:
+        assert indexes.enrich("8.8.8.8") == {"asn": {"asn": "15169"}, "geo": {"country": "US"}}
+        assert indexes.enrich("8.8.1.1") == {"asn": {"asn": "15169"}, "geo": None}
+    finally:
+        indexes.close()
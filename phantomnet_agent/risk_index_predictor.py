@@ -15,6 +15,16 @@ class RiskIndexPredictor:
         self.telemetry_data.extend(new_data)
         print(f"Aggregated {len(new_data)} new telemetry data points. Total: {len(self.telemetry_data)}")
 
+    def aggregate_from_rollups(self, db, days: int = 30):
+        """
+        Loads daily attack counts for the last `days` days from the attack rollup
+        table, which costs one row per day instead of a scan of attack_logs.
+        """
+        from backend_api.rollups import attack_count_telemetry
+
+        until = datetime.datetime.utcnow()
+        self.aggregate_telemetry(attack_count_telemetry(db, until - datetime.timedelta(days=days), until, granularity="day"))
+
     def train_forecasting_model(self):
         """
         Placeholder for training a forecasting model (e.g., Prophet, Transformer-based Time Series).
@@ -1,10 +1,18 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 
-def screen_overview(events: List[Dict], campaign_clusters: List[Dict]) -> Dict:
+def screen_overview(events: List[Dict], campaign_clusters: List[Dict], rollup_overview: Optional[Dict] = None) -> Dict:
+    """
+    rollup_overview is the 24h summary from backend_api.rollups.overview (or
+    GET /analytics/overview). Without it the average covers only `events`.
+    """
     total_events = len(events)
     active_campaigns = len(campaign_clusters)
-    # Placeholder for average threat score
-    avg_threat_score = 75
+    if rollup_overview is not None:
+        avg_threat_score = rollup_overview["average_threat_score"]
+    elif events:
+        avg_threat_score = round(sum(event["threat_score"]["score"] for event in events) / len(events), 1)
+    else:
+        avg_threat_score = None
 
     latest_events = []
     for event in events[:10]: